@@ -0,0 +1,27 @@
+import pytest
+import twitter_data_json
+
+
+def _backend_del_trabajador():
+    return dict(twitter_data_json._backend)
+
+
+@pytest.fixture
+def paralelo(monkeypatch):
+    pytest.importorskip('mpi4py')
+    pytest.importorskip('orjson')
+    import twitter_data_analysis_parallel
+    # usar_backend cambia el estado del módulo; se restaura al terminar
+    monkeypatch.setattr(twitter_data_json, '_backend', dict(twitter_data_json._backend))
+    return twitter_data_analysis_parallel
+
+
+def test_pool_local_usa_el_backend_elegido(paralelo):
+    # Los procesos del pool arrancan con forkserver y no heredan el backend
+    # del proceso padre: lo tienen que elegir ellos con el mismo pedido
+    backend_json = ('orjson', False)
+    twitter_data_json.usar_backend(*backend_json)
+    with paralelo.crear_pool_local(2, backend_json) as ejecutor:
+        assert ejecutor._mp_context.get_start_method() == 'forkserver'
+        resultados = [ejecutor.submit(_backend_del_trabajador).result() for _ in range(4)]
+    assert resultados == [{'nombre': 'orjson', 'compatible': False}] * 4
@@ -0,0 +1,72 @@
+import bz2
+import random
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import twitter_data_bz2
+from twitter_data_bz2 import _rangos_de_bloques, _descomprimir_en_orden, leer_lineas_bz2_paralelo
+
+
+def _texto(lineas, semilla=0):
+    # Líneas de largo variable y poco comprimibles, para que con nivel 1
+    # (bloques de 100 KB sin comprimir) salgan varios bloques
+    generador = random.Random(semilla)
+    letras = 'abcdefghijklmnopqrstuvwxyz0123456789 {}":,'
+    return b'\n'.join(''.join(generador.choices(letras, k=generador.randint(0, 400))).encode('ascii')
+                      for _ in range(lineas)) + b'\n'
+
+
+def _lineas_esperadas(texto):
+    # Lo mismo que entrega el lector secuencial: líneas sin espacios en los
+    # extremos y sin las vacías
+    return [linea.strip() for linea in texto.split(b'\n') if linea.strip()]
+
+
+@pytest.fixture
+def ejecutor():
+    with ProcessPoolExecutor(2) as ejecutor:
+        yield ejecutor
+
+
+@pytest.fixture(autouse=True)
+def sin_tamano_minimo(monkeypatch):
+    # Los archivos de prueba son chicos: se reparte por bloques igual
+    monkeypatch.setattr(twitter_data_bz2, 'TAMANO_MINIMO_PARALELO', 0)
+
+
+def test_varios_bloques_igual_que_bz2(tmp_path, ejecutor):
+    texto = _texto(3000)
+    datos = bz2.compress(texto, compresslevel=1)
+    assert len(_rangos_de_bloques(datos)) > 3
+    ruta = tmp_path / 'varios.json.bz2'
+    ruta.write_bytes(datos)
+    assert list(leer_lineas_bz2_paralelo(str(ruta), ejecutor, 2)) == _lineas_esperadas(bz2.decompress(datos))
+
+
+def test_streams_concatenados(tmp_path, ejecutor):
+    # Como los archivos de pbzip2: varios streams seguidos, con líneas que
+    # quedan partidas entre uno y otro
+    texto = _texto(3000, semilla=1)
+    cortes = [0, 50001, 170003, 230000, len(texto)]
+    datos = b''.join(bz2.compress(texto[inicio:fin], compresslevel=1) for inicio, fin in zip(cortes, cortes[1:]))
+    ruta = tmp_path / 'streams.json.bz2'
+    ruta.write_bytes(datos)
+    assert list(leer_lineas_bz2_paralelo(str(ruta), ejecutor, 2)) == _lineas_esperadas(texto)
+
+
+def test_marca_falsa_dentro_de_un_bloque(ejecutor):
+    # Una marca que aparece por azar dentro de los datos comprimidos parte un
+    # bloque en dos rangos que no descomprimen solos: se tienen que volver a unir
+    texto = _texto(3000, semilla=2)
+    datos = bz2.compress(texto, compresslevel=1)
+    rangos = _rangos_de_bloques(datos)
+    inicio, fin = rangos[1]
+    medio = (inicio + fin) // 2
+    partidos = rangos[:1] + [(inicio, medio), (medio, fin)] + rangos[2:]
+    assert b''.join(_descomprimir_en_orden(datos, partidos, ejecutor, 4)) == texto
+
+
+def test_bloques_invalidos(ejecutor):
+    datos = bz2.compress(_texto(3000, semilla=3), compresslevel=1)
+    inicio, fin = _rangos_de_bloques(datos)[0]
+    with pytest.raises(OSError):
+        list(_descomprimir_en_orden(datos, [(inicio, (inicio + fin) // 2)], ejecutor, 2))
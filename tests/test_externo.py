@@ -0,0 +1,83 @@
+import pytest
+import twitter_data_externo
+from twitter_data_aggregates import agregar_tweets, usuarios_rt, usuarios_menciones, retweeters_por_autor
+from twitter_data_externo import AgregadoExterno
+from twitter_data_sintetico import generar_tweets
+
+PARAMETROS = {'tweets': 2000, 'usuarios': 300, 'retweets': 0.5, 'menciones': 0.5}
+# Presupuesto de unos pocos KB: casi cada combinar vuelca un run
+MEMORIA_MINIMA = 0.005
+
+
+@pytest.fixture
+def partes():
+    # Tweets de varios archivos, para combinar por partes como los scripts
+    return [list(generar_tweets(numero, PARAMETROS)) for numero in range(6)]
+
+
+@pytest.fixture(autouse=True)
+def mezcla_por_grupos(monkeypatch):
+    # Con pocos runs por mezcla también se prueba la mezcla en varios niveles
+    monkeypatch.setattr(twitter_data_externo, 'MAXIMO_RUNS_POR_MEZCLA', 3)
+
+
+def _en_memoria(partes):
+    retweet_data, mention_data = {}, {}
+    for tweets in partes:
+        agregar_tweets(tweets, retweet_data, mention_data)
+    return retweet_data, mention_data
+
+
+def test_igual_que_en_memoria(tmp_path, partes):
+    retweet_data, mention_data = _en_memoria(partes)
+    retweets = AgregadoExterno('retweets', str(tmp_path), MEMORIA_MINIMA)
+    menciones = AgregadoExterno('menciones', str(tmp_path), MEMORIA_MINIMA)
+    for tweets in partes:
+        rt_archivo, menciones_archivo = agregar_tweets(tweets)
+        retweets.combinar(rt_archivo)
+        menciones.combinar(menciones_archivo)
+    assert len(retweets.terminar()) > 3
+    assert list(usuarios_rt(retweets)) == list(usuarios_rt(retweet_data))
+    assert list(usuarios_menciones(menciones)) == list(usuarios_menciones(mention_data))
+    # La segunda lectura sale de los runs ya ordenados
+    assert list(usuarios_rt(retweets)) == list(usuarios_rt(retweet_data))
+    all_users, retweets_dict = retweeters_por_autor(retweet_data)
+    assert retweeters_por_autor(retweets) == (all_users, retweets_dict)
+    assert list(retweeters_por_autor(retweets)[1]) == list(retweets_dict)
+
+
+def test_runs_de_varios_procesos(tmp_path, partes):
+    # Como con MPI: cada proceso vuelca sus runs y el 0 los mezcla en orden de rank
+    retweet_data, mention_data = _en_memoria(partes)
+    runs_rt, runs_menciones = [], []
+    for rank in (2, 0, 1):
+        retweets = AgregadoExterno('retweets', str(tmp_path), MEMORIA_MINIMA, orden=(rank,))
+        menciones = AgregadoExterno('menciones', str(tmp_path), MEMORIA_MINIMA, orden=(rank,))
+        for tweets in partes[2 * rank:2 * rank + 2]:
+            rt_archivo, menciones_archivo = agregar_tweets(tweets)
+            retweets.combinar(rt_archivo)
+            menciones.combinar(menciones_archivo)
+        runs_rt.extend(retweets.terminar())
+        runs_menciones.extend(menciones.terminar())
+    retweets = AgregadoExterno.desde_runs('retweets', runs_rt, str(tmp_path), MEMORIA_MINIMA)
+    menciones = AgregadoExterno.desde_runs('menciones', runs_menciones, str(tmp_path), MEMORIA_MINIMA)
+    assert list(usuarios_rt(retweets)) == list(usuarios_rt(retweet_data))
+    assert list(usuarios_menciones(menciones)) == list(usuarios_menciones(mention_data))
+
+
+def test_sin_superar_el_presupuesto(tmp_path, partes):
+    # Con presupuesto de sobra no se escribe nada en disco
+    retweet_data, mention_data = _en_memoria(partes)
+    menciones = AgregadoExterno('menciones', str(tmp_path))
+    for tweets in partes:
+        menciones.combinar(agregar_tweets(tweets)[1])
+    assert list(usuarios_menciones(menciones)) == list(usuarios_menciones(mention_data))
+    assert not list(tmp_path.iterdir())
+
+
+def test_no_admite_datos_despues_de_leer(tmp_path, partes):
+    retweets = AgregadoExterno('retweets', str(tmp_path), MEMORIA_MINIMA)
+    retweets.combinar(agregar_tweets(partes[0])[0])
+    list(retweets.items())
+    with pytest.raises(ValueError):
+        retweets.combinar(agregar_tweets(partes[1])[0])
@@ -0,0 +1,77 @@
+import io
+import networkx as nx
+import pytest
+import twitter_data_grafos
+from twitter_data_grafos import escribir_gexf, grafo_rt, grafo_menciones, grafo_coretweets
+
+# Nombres con los caracteres que el XML tiene que escapar
+RARO = 'a&b<c>"d"\'e\tf\ng'
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def aristas(request, monkeypatch):
+    # aristas_unicas tiene una versión con numpy y otra sin
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(twitter_data_grafos, 'np', None)
+
+
+def _lineas(escribir):
+    salida = io.BytesIO()
+    escribir(salida)
+    # La línea <creator> lleva el nombre de quien escribe el archivo
+    return [linea for linea in salida.getvalue().decode('utf-8').splitlines() if '<creator>' not in linea]
+
+
+def _igual_que_networkx(grafo, G):
+    assert _lineas(lambda salida: escribir_gexf(grafo, salida)) == _lineas(lambda salida: nx.write_gexf(G, salida))
+
+
+def test_vacio(aristas):
+    _igual_que_networkx(grafo_rt({'retweets': []}), nx.DiGraph())
+    _igual_que_networkx(grafo_coretweets({'coretweets': []}), nx.DiGraph())
+
+
+def test_retweets(aristas):
+    rt_data = {'retweets': [
+        {'username': RARO, 'receivedRetweets': 3,
+         'tweets': [{'tweetId': '1', 'retweetedBy': ['x', 'y&z']}, {'tweetId': '2', 'retweetedBy': ['x']}]},
+        {'username': 'x', 'receivedRetweets': 1, 'tweets': [{'tweetId': '3', 'retweetedBy': [RARO]}]},
+        {'username': 'solo', 'receivedRetweets': 0, 'tweets': []},
+    ]}
+    G = nx.DiGraph()
+    for user_info in rt_data['retweets']:
+        G.add_node(user_info['username'], received_retweets=user_info['receivedRetweets'])
+        for tweet in user_info['tweets']:
+            for retweeter in tweet['retweetedBy']:
+                G.add_edge(retweeter, user_info['username'])
+    _igual_que_networkx(grafo_rt(rt_data), G)
+
+
+def test_menciones_sin_aislados(aristas):
+    mention_data = {'mentions': [
+        {'username': 'ana', 'receivedMentions': 2, 'mentions': [{'mentionBy': RARO, 'tweets': ['1', '2']}]},
+        {'username': 'aislado', 'receivedMentions': 0, 'mentions': []},
+        {'username': RARO, 'receivedMentions': 1, 'mentions': [{'mentionBy': 'ana', 'tweets': ['3']}]},
+    ]}
+    G = nx.DiGraph()
+    for user_mention in mention_data['mentions']:
+        G.add_node(user_mention['username'])
+        for mention in user_mention['mentions']:
+            G.add_edge(mention['mentionBy'], user_mention['username'])
+    G.remove_nodes_from(list(nx.isolates(G)))
+    _igual_que_networkx(grafo_menciones(mention_data), G)
+
+
+def test_aristas_repetidas_con_peso(aristas):
+    # Una arista repetida queda en la posición de la primera y con el peso de
+    # la última, como al volver a agregarla en networkx
+    pares = [('b', 'a', 2), ('a', RARO, 5), ('b', 'c', 1), ('b', 'a', 7), ('c', 'b', 3), ('a', RARO, 4)]
+    coretweets_data = {'coretweets': [
+        {'authors': {'u1': u1, 'u2': u2}, 'totalCoretweets': peso, 'retweeters': [f'r{i}' for i in range(peso)]}
+        for u1, u2, peso in pares]}
+    G = nx.DiGraph()
+    for u1, u2, peso in pares:
+        G.add_edge(u1, u2, weight=peso)
+    _igual_que_networkx(grafo_coretweets(coretweets_data), G)
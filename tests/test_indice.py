@@ -0,0 +1,62 @@
+import os
+import pytest
+from twitter_data_indice import abrir_indice, actualizar_indice, buscar_archivos
+
+
+def _crear(ruta):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, 'wb') as archivo:
+        archivo.write(b'BZh9')
+
+
+@pytest.fixture
+def datos(tmp_path):
+    # Un árbol con un enlace a un directorio de afuera, uno que vuelve a la
+    # raíz y uno a un archivo
+    raiz = tmp_path / 'datos'
+    for ruta in ('2016/06/01/10.json.bz2', '2016/06/02/11.json.bz2', 'sin_fecha.json.bz2', '2016/06/01/notas.txt'):
+        _crear(str(raiz / ruta))
+    _crear(str(tmp_path / 'afuera' / '2016-06-03.json.bz2'))
+    os.symlink(tmp_path / 'afuera', raiz / 'enlace_afuera')
+    os.symlink(raiz, raiz / '2016' / 'bucle')
+    os.symlink(raiz / '2016' / '06' / '01' / '10.json.bz2', raiz / 'enlace.json.bz2')
+    return str(raiz)
+
+
+def _os_walk(directorio):
+    # Lo que encuentra encontrar_archivos_json_bz2 sin --indice
+    return sorted(os.path.join(ruta_actual, archivo) for ruta_actual, _, archivos in os.walk(directorio)
+                  for archivo in archivos if archivo.endswith('.json.bz2'))
+
+
+def _indexados(conexion, directorio):
+    return sorted(ruta for ruta, _, _ in buscar_archivos(conexion, directorio))
+
+
+def test_igual_que_os_walk(tmp_path, datos):
+    conexion = abrir_indice(str(tmp_path / 'indice.sqlite'))
+    actualizar_indice(conexion, datos)
+    assert _indexados(conexion, datos) == _os_walk(datos)
+    assert len(_os_walk(datos)) == 4
+    # Al volver a actualizar se recorre lo guardado en el índice
+    actualizar_indice(conexion, datos)
+    assert _indexados(conexion, datos) == _os_walk(datos)
+
+
+def test_indice_que_seguia_los_enlaces(tmp_path, datos):
+    # Un índice de la versión 1 tenía los directorios detrás de los enlaces
+    ruta_indice = str(tmp_path / 'indice.sqlite')
+    conexion = abrir_indice(ruta_indice)
+    actualizar_indice(conexion, datos)
+    enlace = os.path.join(datos, 'enlace_afuera')
+    archivo = os.path.join(enlace, '2016-06-03.json.bz2')
+    conexion.execute("INSERT INTO directorios (ruta, padre, mtime) VALUES (?, ?, ?)",
+                     (enlace, datos, os.stat(enlace).st_mtime_ns))
+    conexion.execute("INSERT INTO archivos (ruta, directorio, fecha, tamano) VALUES (?, ?, '2016-06-03', 4)",
+                     (archivo, enlace))
+    conexion.execute("PRAGMA user_version = 1")
+    conexion.commit()
+    conexion.close()
+    conexion = abrir_indice(ruta_indice)
+    actualizar_indice(conexion, datos)
+    assert _indexados(conexion, datos) == _os_walk(datos)
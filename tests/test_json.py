@@ -0,0 +1,97 @@
+import json
+import pytest
+import twitter_data_json
+from twitter_data_json import EscritorListaJson, dumps, guardar_json, guardar_json_en_partes, leer_elementos, ruta_salida
+from twitter_data_sintetico import generar_tweets
+
+PARAMETROS = {'tweets': 200, 'usuarios': 50, 'retweets': 0.5, 'menciones': 0.5}
+# Números y caracteres de varios bytes que el fin de un bloque puede cortar
+VALORES = [-3.5, 12345678, 0, 1e20, -0.25e-3, True, None, 'ñandú', '🐦 tweet', {'a': [1, 2.5, {'b': 'ü'}]}, []]
+# Strings que cada biblioteca escapa a su manera, sin floats (ver _backend)
+TEXTOS = ['ñandú', 'ÑANDÚ 🐦', 'a"b', 'c\\d', 'e/f', 'tab\there', 'línea\nnueva', '\x00\x1f\x7f\x80', '\u2028\u2029',
+          '</script>', '\ufeff', '  dos espacios\\n  ']
+
+
+@pytest.fixture
+def orjson_compatible(monkeypatch):
+    pytest.importorskip('orjson')
+    monkeypatch.setattr(twitter_data_json, '_backend', dict(twitter_data_json._backend))
+    twitter_data_json.usar_backend('orjson', compatible=True)
+
+
+@pytest.fixture(params=[1, 7, 64])
+def bloques_chicos(request, monkeypatch):
+    # Con bloques de pocos bytes casi todos los elementos quedan partidos
+    # entre dos lecturas
+    monkeypatch.setattr(twitter_data_json, 'TAMANO_LECTURA', request.param)
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_arreglo_de_nivel_superior(tmp_path, bloques_chicos, indent):
+    tweets = list(generar_tweets(0, PARAMETROS))
+    ruta = str(tmp_path / 'merged_output.json')
+    guardar_json(tweets, ruta, indent=indent)
+    assert list(leer_elementos(ruta)) == tweets
+
+
+@pytest.mark.parametrize('ensure_ascii', [True, False])
+def test_valores_cortados(tmp_path, bloques_chicos, ensure_ascii):
+    ruta = str(tmp_path / 'valores.json')
+    guardar_json(VALORES, ruta, ensure_ascii=ensure_ascii)
+    assert list(leer_elementos(ruta)) == VALORES
+
+
+@pytest.mark.parametrize('compacto', [False, True])
+@pytest.mark.parametrize('compresion', [None, 'gz'])
+def test_por_clave(tmp_path, bloques_chicos, compacto, compresion):
+    # Como rt.json: {"retweets": [...]}, con o sin sangría y comprimido
+    ruta = str(tmp_path / 'rt.json')
+    guardar_json_en_partes('retweets', VALORES, ruta, indent=4, ensure_ascii=False, compacto=compacto,
+                           compresion=compresion)
+    assert list(leer_elementos(ruta_salida(ruta, compresion), 'retweets')) == VALORES
+
+
+def test_por_clave_vacio(tmp_path):
+    ruta = str(tmp_path / 'corrtw.json')
+    guardar_json_en_partes('coretweets', [], ruta, indent=4)
+    assert list(leer_elementos(ruta, 'coretweets')) == []
+
+
+def test_json_invalido(tmp_path, bloques_chicos):
+    ruta = tmp_path / 'invalido.json'
+    ruta.write_text('[1, 2, {"a": ]')
+    with pytest.raises(json.JSONDecodeError):
+        list(leer_elementos(str(ruta)))
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+@pytest.mark.parametrize('fragmento', [False, True])
+def test_escritor_igual_que_guardar_json(tmp_path, indent, fragmento):
+    # Escribir por partes (con algunas vacías) da lo mismo que escribir la
+    # lista completa de una vez
+    partes = [list(generar_tweets(numero, PARAMETROS))[:numero * 3] for numero in range(4)]
+    completa = [tweet for parte in partes for tweet in parte]
+    escritor = EscritorListaJson(str(tmp_path / 'partes.json'), indent=indent, fragmento=fragmento)
+    for parte in partes:
+        escritor.agregar(parte)
+    escritor.cerrar()
+    if fragmento:
+        twitter_data_json.guardar_fragmento_json(completa, str(tmp_path / 'completa.json'), indent=indent)
+    else:
+        guardar_json(completa, str(tmp_path / 'completa.json'), indent=indent)
+    assert (tmp_path / 'partes.json').read_bytes() == (tmp_path / 'completa.json').read_bytes()
+
+
+@pytest.mark.parametrize('indent', [None, 2, 4])
+@pytest.mark.parametrize('ensure_ascii', [True, False])
+def test_orjson_igual_que_json(orjson_compatible, indent, ensure_ascii):
+    # En modo compatible la salida de orjson es la misma que la del módulo json
+    datos = {
+        'retweets': [{'username': texto, 'receivedRetweets': numero, 'tweets': [{'tweetId': str(numero), 'retweetedBy': TEXTOS}]}
+                     for numero, texto in enumerate(TEXTOS)],
+        'ñ clave "rara"': {'vacío': [], 'vacíos': [{}, [], [[]], {'a': {}}]},
+        'números': [0, -1, 2 ** 53, True, False, None],
+    }
+    for valor in (datos, TEXTOS, [], {}, 'ñ'):
+        assert dumps(valor, indent=indent, ensure_ascii=ensure_ascii) == \
+            json.dumps(valor, indent=indent, ensure_ascii=ensure_ascii).encode('utf-8')
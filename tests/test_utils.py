@@ -0,0 +1,97 @@
+import json
+import pytest
+from twitter_data_filtro import filtrar_lineas
+from twitter_data_utils import compilar_prefiltro
+
+
+def _linea(hashtags, ensure_ascii=True, **campos):
+    # Línea cruda de un tweet con los hashtags dados en sus entidades
+    tweet = {
+        'created_at': 'Wed Jun 01 10:23:45 +0000 2016',
+        'id_str': '1',
+        'text': campos.pop('texto', 'hola'),
+        'user': {'id': 1, 'screen_name': campos.pop('usuario', 'alguien'), 'description': campos.pop('descripcion', '')},
+        'entities': {'hashtags': [{'text': hashtag, 'indices': [0, 1]} for hashtag in hashtags], 'user_mentions': []},
+    }
+    return json.dumps(tweet, ensure_ascii=ensure_ascii).encode('utf-8')
+
+
+def _pasa(hashtags_a_buscar, linea):
+    return compilar_prefiltro(hashtags_a_buscar).search(linea) is not None
+
+
+def _sin_perder_tweets(hashtags_a_buscar, lineas):
+    # El prefiltro no puede descartar ningún tweet que el filtro completo conserva
+    sin_prefiltro, _ = filtrar_lineas(lineas, hashtags_a_buscar, None, None)
+    con_prefiltro, _ = filtrar_lineas(lineas, hashtags_a_buscar, None, None, compilar_prefiltro(hashtags_a_buscar))
+    assert con_prefiltro == sin_prefiltro
+    return sin_prefiltro
+
+
+@pytest.mark.parametrize('hashtag', ['python', 'PYTHON', 'PyThOn', 'pYTHOn'])
+def test_mayusculas(hashtag):
+    linea = _linea([hashtag])
+    assert _pasa(['python'], linea)
+    assert len(_sin_perder_tweets(['python'], [linea])) == 1
+
+
+def test_otros_hashtags():
+    lineas = [_linea(['pythons']), _linea(['py']), _linea(['java', 'rust'])]
+    assert not any(_pasa(['python'], linea) for linea in lineas)
+    assert _sin_perder_tweets(['python'], lineas) == []
+
+
+@pytest.mark.parametrize('escape', [b'\\u0070ython', b'\\u0050YTHON', b'pyth\\u006Fn', b'PYTH\\u004fN'])
+def test_escapes_json(escape):
+    # Los escapes \uXXXX de letras ASCII, con dígitos en mayúscula o minúscula
+    linea = _linea(['python']).replace(b'"text": "python"', b'"text": "' + escape + b'"')
+    assert escape in linea
+    assert _pasa(['python'], linea)
+    assert len(_sin_perder_tweets(['python'], [linea])) == 1
+
+
+@pytest.mark.parametrize('ensure_ascii', [True, False])
+@pytest.mark.parametrize('hashtag', ['ñandú', 'ÑANDÚ', 'ÑandÚ'])
+def test_no_ascii(hashtag, ensure_ascii):
+    # En UTF-8 crudo o como ñ, y con las mayúsculas no ASCII
+    linea = _linea([hashtag], ensure_ascii=ensure_ascii)
+    assert _pasa(['ñandú'], linea)
+    assert len(_sin_perder_tweets(['ñandú'], [linea])) == 1
+
+
+@pytest.mark.parametrize('ensure_ascii', [True, False])
+def test_fuera_del_plano_basico(ensure_ascii):
+    # Con ensure_ascii los caracteres fuera del BMP van como par de surrogates
+    linea = _linea(['viva🐦'], ensure_ascii=ensure_ascii)
+    assert _pasa(['viva🐦'], linea)
+    assert not _pasa(['viva🐧'], linea)
+    assert len(_sin_perder_tweets(['viva🐦'], [linea])) == 1
+
+
+def test_signo_kelvin():
+    # El signo Kelvin (U+212A) pasa a minúsculas como 'k'
+    linea = _linea(['\u212aiwi'], ensure_ascii=False)
+    assert _pasa(['kiwi'], linea)
+    assert len(_sin_perder_tweets(['kiwi'], [linea])) == 1
+
+
+def test_en_otro_campo():
+    # El hashtag solo en el texto, el usuario o la descripción: el tweet no
+    # tiene ese hashtag en sus entidades y tampoco lo conserva el filtro
+    lineas = [_linea(['otro'], texto='#python'), _linea([], usuario='python'), _linea(['otro'], descripcion='python')]
+    assert not any(_pasa(['python'], linea) for linea in lineas)
+    assert _sin_perder_tweets(['python'], lineas) == []
+
+
+def test_texto_igual_al_hashtag():
+    # Un tweet cuyo texto es justo el hashtag pasa el prefiltro (es
+    # conservador) y lo descarta después el filtro completo
+    linea = _linea([], texto='python')
+    assert _pasa(['python'], linea)
+    assert _sin_perder_tweets(['python'], [linea]) == []
+
+
+def test_sin_prefiltro():
+    assert compilar_prefiltro([]) is None
+    # 'İ' pasa a minúsculas como dos caracteres: no se prefiltra
+    assert compilar_prefiltro(['i\u0307stanbul']) is None
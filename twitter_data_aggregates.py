@@ -0,0 +1,176 @@
+# Agregados de retweets y menciones construidos directamente a partir de los
+# tweets filtrados. Se pueden armar por partes (por archivo o por proceso) y
+# combinar después: combinar(a, b) da lo mismo que agregar los tweets de `a`
+# seguidos de los de `b`, incluido el orden de inserción de las claves.
+# Los nombres de usuario se internan: cada nombre queda una sola vez en
+# memoria y las listas de retweeters y las claves solo guardan referencias.
+import sys
+
+
+class Recorrido:
+    # Secuencia que se vuelve a generar cada vez que se recorre (por ejemplo,
+    # para escribir el JSON y después armar el grafo) en lugar de guardarse
+    # como lista
+    def __init__(self, funcion, datos):
+        self._funcion = funcion
+        self._datos = datos
+
+    def __iter__(self):
+        return iter(self._funcion(self._datos))
+
+
+def sumar_retweet(tweet, retweet_data):
+    # {usuario retuiteado: {'receivedRetweets': n, 'tweets': {id: {'retweetedBy': [...]}}}}
+    text = tweet.get('text')  # Obtener el texto del tweet
+    if text and text.startswith('RT @'):  # Verificar si hay texto y si indica un retweet
+        retweeted_user = sys.intern(text.split()[1][1:])  # Obtener el nombre del usuario retuiteado
+        retweeting_user = sys.intern(tweet['user']['screen_name'])
+        if 'retweeted_status' in tweet:
+            tweet_id = tweet['retweeted_status']['id_str']
+        else:
+            tweet_id = tweet['id_str']  # Si es un tweet original, usar su propio ID
+        if retweeted_user not in retweet_data:
+            retweet_data[retweeted_user] = {
+                'receivedRetweets': 0,
+                'tweets': {}
+            }
+        retweet_data[retweeted_user]['receivedRetweets'] += 1
+        if tweet_id not in retweet_data[retweeted_user]['tweets']:
+            retweet_data[retweeted_user]['tweets'][tweet_id] = {'retweetedBy': []}
+        retweet_data[retweeted_user]['tweets'][tweet_id]['retweetedBy'].append(retweeting_user)
+
+
+def agregar_retweets(tweets, retweet_data=None):
+    if retweet_data is None:
+        retweet_data = {}
+    for tweet in tweets:
+        sumar_retweet(tweet, retweet_data)
+    return retweet_data
+
+
+def combinar_retweets(retweet_data, otro):
+    for user, user_data in otro.items():
+        if user not in retweet_data:
+            retweet_data[user] = user_data
+            continue
+        retweet_data[user]['receivedRetweets'] += user_data['receivedRetweets']
+        tweets = retweet_data[user]['tweets']
+        for tweet_id, retweeted_by in user_data['tweets'].items():
+            if tweet_id in tweets:
+                tweets[tweet_id]['retweetedBy'].extend(retweeted_by['retweetedBy'])
+            else:
+                tweets[tweet_id] = retweeted_by
+    return retweet_data
+
+
+def sumar_menciones(tweet, mention_data):
+    # {usuario mencionado: {'receivedMentions': n, 'mentions': {quien menciona: [ids]}}}
+    # Las menciones de cada usuario van en un diccionario por quien menciona,
+    # que conserva el orden de la primera mención
+    user_mentioned = tweet.get('entities', {}).get('user_mentions')
+    if user_mentioned:  # Verificar si hay menciones en el tweet
+        mention_by_user = sys.intern(tweet['user']['screen_name'])
+        for mention in user_mentioned:
+            mentioned_user = sys.intern(mention['screen_name'])
+            tweet_id = tweet['id_str']
+            if mentioned_user not in mention_data:
+                mention_data[mentioned_user] = {
+                    'receivedMentions': 0,
+                    'mentions': {}
+                }
+            mention_data[mentioned_user]['receivedMentions'] += 1
+            mention_data[mentioned_user]['mentions'].setdefault(mention_by_user, []).append(tweet_id)
+
+
+def agregar_menciones(tweets, mention_data=None):
+    if mention_data is None:
+        mention_data = {}
+    for tweet in tweets:
+        sumar_menciones(tweet, mention_data)
+    return mention_data
+
+
+def combinar_menciones(mention_data, otro):
+    for user, user_data in otro.items():
+        if user not in mention_data:
+            mention_data[user] = user_data
+            continue
+        mention_data[user]['receivedMentions'] += user_data['receivedMentions']
+        mentions = mention_data[user]['mentions']
+        for mention_by_user, tweets in user_data['mentions'].items():
+            if mention_by_user in mentions:
+                mentions[mention_by_user].extend(tweets)
+            else:
+                mentions[mention_by_user] = tweets
+    return mention_data
+
+
+def agregar_tweets(tweets, retweet_data=None, mention_data=None):
+    # Arma los dos agregados recorriendo los tweets una sola vez
+    if retweet_data is None:
+        retweet_data = {}
+    if mention_data is None:
+        mention_data = {}
+    for tweet in tweets:
+        sumar_retweet(tweet, retweet_data)
+        sumar_menciones(tweet, mention_data)
+    return retweet_data, mention_data
+
+
+def usuarios_rt(retweet_data):
+    # Elementos de 'retweets' en rt.json, uno por uno
+    for user, user_data in retweet_data.items():
+        user_info = {
+            'username': user,
+            'receivedRetweets': user_data['receivedRetweets'],
+            'tweets': []
+        }
+        for tweet_id, retweeted_by in user_data['tweets'].items():
+            tweet_info = {
+                'tweetId': tweet_id,  # Corregido: Separar el formato del ID del tweet
+                'retweetedBy': retweeted_by['retweetedBy']
+            }
+            user_info['tweets'].append(tweet_info)
+        yield user_info
+
+
+def estructura_rt(retweet_data):
+    # Estructura de rt.json. Cada elemento se arma al recorrer la lista (con
+    # un agregado externo, de twitter_data_externo, se lee del disco).
+    return {'retweets': Recorrido(usuarios_rt, retweet_data)}
+
+
+def usuarios_menciones(mention_data):
+    # Elementos de 'mentions' en mencion.json, con los usuarios más mencionados
+    # primero. Un agregado externo ya entrega los usuarios en ese orden.
+    if isinstance(mention_data, dict):
+        sorted_mention_data = sorted(mention_data.items(), key=lambda x: x[1]['receivedMentions'], reverse=True)
+    else:
+        sorted_mention_data = mention_data.items()
+    for user, user_data in sorted_mention_data:
+        yield {
+            'username': user,
+            'receivedMentions': user_data['receivedMentions'],
+            'mentions': [{'mentionBy': mention_by, 'tweets': tweets} for mention_by, tweets in user_data['mentions'].items()]
+        }
+
+
+def estructura_menciones(mention_data):
+    # Estructura de mencion.json, con los usuarios más mencionados primero
+    return {'mentions': Recorrido(usuarios_menciones, mention_data)}
+
+
+def retweeters_por_autor(retweet_data):
+    # Conjunto de autores y retweeters de cada uno, armados en el mismo orden
+    # que al leerlos de rt.json para que los coretweets salgan iguales. Se
+    # recorre el agregado una sola vez (con un agregado externo es una lectura
+    # del disco).
+    all_users = set()
+    retweeters = {}
+    for user, user_data in retweet_data.items():
+        all_users.add(user)
+        retweeters[user] = set()
+        for retweeted_by in user_data['tweets'].values():
+            retweeters[user].update(retweeted_by['retweetedBy'])
+    retweets_dict = {user: retweeters.pop(user) for user in all_users}
+    return all_users, retweets_dict
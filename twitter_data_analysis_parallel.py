@@ -1,13 +1,30 @@
 import os
-import json
-import bz2
-import networkx as nx
 import getopt
 import sys
 import shutil
+import tempfile
 from datetime import datetime
 import time
+import heapq
+import multiprocessing
+from collections import deque
 from mpi4py import MPI
+from concurrent.futures import ProcessPoolExecutor
+from twitter_data_utils import parsear_opciones, compilar_prefiltro, reducir_en_arbol
+import twitter_data_json as json_backend
+from twitter_data_filtro import merged_output, merged_output_pipeline
+from twitter_data_grafos import grafo_rt, grafo_menciones, grafo_coretweets, guardar_gexf
+from twitter_data_columnar import (COLUMNAS_RT, COLUMNAS_MENCIONES, ruta_dataset, preparar_dataset, guardar_parte, es_dataset,
+                                   tweets_columnares, validar_formato)
+from twitter_data_cache import CACHE_POR_DEFECTO, TAMANO_MAXIMO_POR_DEFECTO, cargar_o_calcular
+from twitter_data_cache import estadisticas as estadisticas_cache
+from twitter_data_archivos import preparar_entrada, validar_modo_entrada
+from twitter_data_indice import INDICE_POR_DEFECTO, abrir_indice, actualizar_indice, buscar_archivos, registrar_tweets, tamanos_indexados
+from twitter_data_aggregates import (agregar_retweets, combinar_retweets, agregar_menciones, combinar_menciones, agregar_tweets,
+                                     estructura_rt, estructura_menciones, retweeters_por_autor)
+from twitter_data_coretweets import calcular_coretweets, limitar_fanout, coretweets_distribuidos, estructura_coretweets
+from twitter_data_externo import MEMORIA_POR_DEFECTO as MEMORIA_EXTERNA_POR_DEFECTO, AgregadoExterno
+from twitter_data_metricas import ComunicadorMedido, etapa, metricas, mostrar_metricas, guardar_metricas, activar_perfiles, guardar_perfiles
 
 
 
@@ -29,7 +46,7 @@ def obtener_fecha_desde_nombre(nombre_archivo):
     return '-'.join(partes_fecha)
 
 
-def encontrar_archivos(directorio_a_copiar,nombre_archivo_hashtags,fecha_inicial_str,fecha_final_str):
+def encontrar_archivos(directorio_a_copiar,nombre_archivo_hashtags,fecha_inicial_str,fecha_final_str,modo_entrada='copia',conexion_indice=None,origenes=None):
     directorio_raiz = '.'  
     directorio_absoluto = os.path.abspath(directorio_a_copiar)
     if os.path.exists(directorio_absoluto):
@@ -40,338 +57,259 @@ def encontrar_archivos(directorio_a_copiar,nombre_archivo_hashtags,fecha_inicial
         if fecha_final:
             fecha_final = '-'.join(fecha_final.split('-')[::-1])
         directorio_destino = os.path.join(directorio_raiz, 'datos_copiadosp')
-        try:
-            os.makedirs(directorio_destino)
-        except FileExistsError:
-            pass
-        archivos_json_bz2 = encontrar_archivos_json_bz2(directorio_absoluto, fecha_inicial, fecha_final)
-        for archivo in archivos_json_bz2:
-            nombre_archivo = os.path.basename(archivo)
-            nombre_sin_extension = os.path.splitext(nombre_archivo)[0]
-            extension = os.path.splitext(nombre_archivo)[1]
-            contador = 1
-            nuevo_nombre = nombre_archivo
-            while os.path.exists(os.path.join(directorio_destino, nuevo_nombre)):
-                nuevo_nombre = f"{nombre_sin_extension}_{contador}{extension}"
-                contador += 1
-            shutil.copy(archivo, os.path.join(directorio_destino, nuevo_nombre))
+        if conexion_indice is not None:
+            # Con --indice solo se vuelven a listar los directorios que cambiaron
+            # y el rango de fechas se resuelve con el índice
+            actualizar_indice(conexion_indice, directorio_absoluto)
+            fecha_inicial_iso = '-'.join(fecha_inicial_str.split('-')[::-1]) if fecha_inicial_str else None
+            fecha_final_iso = '-'.join(fecha_final_str.split('-')[::-1]) if fecha_final_str else None
+            encontrados = buscar_archivos(conexion_indice, directorio_absoluto, fecha_inicial_iso, fecha_final_iso)
+            archivos_json_bz2 = [ruta for ruta, tamano, tweets in encontrados]
+            print(f"Index: {len(encontrados)} files, {sum(tamano for ruta, tamano, tweets in encontrados) / 1e6:.1f} MB")
+        else:
+            archivos_json_bz2 = encontrar_archivos_json_bz2(directorio_absoluto, fecha_inicial, fecha_final)
+        return preparar_entrada(archivos_json_bz2, directorio_destino, modo_entrada, origenes)
     else:
         print("El directorio especificado no existe.")
+        return []
 
         
 
-def merged_output(archivo, hashtags_a_buscar, fecha_inicial, fecha_final):
-    tweets_data = []
-    with bz2.BZ2File(archivo, 'rb') as archivo_comprimido:
-        contenido_descomprimido = archivo_comprimido.read().decode('utf-8')
-        tweets = contenido_descomprimido.strip().split('\n')
-        for tweet in tweets:
-            try:
-                datos_tweet = json.loads(tweet)
-                fecha_tweet_str = datos_tweet.get("created_at", "")
-                if fecha_tweet_str:
-                    fecha_tweet = datetime.strptime(fecha_tweet_str, "%a %b %d %H:%M:%S +0000 %Y").date()
-                hashtags_del_tweet = [hashtag['text'].lower() for hashtag in datos_tweet.get("entities", {}).get("hashtags", [])]
-                if hashtags_a_buscar:
-                    tweet_contiene_hashtag = any(hashtag in hashtags_a_buscar for hashtag in hashtags_del_tweet)
-                    if not tweet_contiene_hashtag:
-                        continue
-                if fecha_inicial and fecha_final:
-                    if not (fecha_inicial <= fecha_tweet <= fecha_final):
-                        continue
-                tweet_filtrado = {
-                    "created_at": datos_tweet.get("created_at", None),
-                    "id_str": datos_tweet.get("id_str", None),
-                    "text": datos_tweet.get("text", None),
-                    "user": {
-                        "id": datos_tweet.get("user", {}).get("id", None),
-                        "name": datos_tweet.get("user", {}).get("name", None),
-                        "screen_name": datos_tweet.get("user", {}).get("screen_name", None),
-                        "location": datos_tweet.get("user", {}).get("location", None),
-                        "url": datos_tweet.get("user", {}).get("url", None),
-                        "description": datos_tweet.get("user", {}).get("description", None),
-                    },
-                    "place": {},
-                    "entities": {
-                        "hashtags": [],
-                        "urls": [],
-                        "user_mentions": []
-                    }
-                }
-                if "urls" in datos_tweet.get("entities", {}):
-                    for url_info in datos_tweet["entities"]["urls"]:
-                        url_entry = {
-                            "url": url_info.get("url", None),
-                            "unwound": {
-                                "url": url_info.get("unwound", {}).get("url", None),
-                                "title": url_info.get("unwound", {}).get("title", None),
-                            }
-                        }
-                        tweet_filtrado["entities"]["urls"].append(url_entry)
-                if "user_mentions" in datos_tweet.get("entities", {}):
-                    for mention_info in datos_tweet["entities"]["user_mentions"]:
-                        mention_entry = {
-                            "id": mention_info.get("id", None),
-                            "name": mention_info.get("name", None),
-                            "screen_name": mention_info.get("screen_name", None),
-                        }
-                        tweet_filtrado["entities"]["user_mentions"].append(mention_entry)
-                if "hashtags" in datos_tweet.get("entities", {}):
-                    for hashtag_info in datos_tweet["entities"]["hashtags"]:
-                        hashtag_entry = {
-                            "text": hashtag_info.get("text", None),
-                        }
-                        tweet_filtrado["entities"]["hashtags"].append(hashtag_entry)
-                tweets_data.append(tweet_filtrado)
-            except json.JSONDecodeError as e:
-                print(f"Error decoding JSON in file {archivo}: {e}")
-    return tweets_data
-        
-
-def crearRT(archivo_salida):
-    # Cargar el archivo JSON
-    with open(archivo_salida, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-    # Diccionario para almacenar los retweets por usuario
-    retweet_data = {}
-    # Procesar los retweets para construir la estructura de datos
-    for tweet in data:
-        text = tweet.get('text')  # Obtener el texto del tweet
-        if text and text.startswith('RT @'):  # Verificar si hay texto y si indica un retweet
-            retweeted_user = text.split()[1][1:]  # Obtener el nombre del usuario retuiteado
-            retweeting_user = tweet['user']['screen_name']
-            if 'retweeted_status' in tweet:
-                tweet_id = tweet['retweeted_status']['id_str']
-            else:
-                tweet_id = tweet['id_str']  # Si es un tweet original, usar su propio ID
-            if retweeted_user not in retweet_data:
-                retweet_data[retweeted_user] = {
-                    'receivedRetweets': 0,
-                    'tweets': {}
-                }
-            retweet_data[retweeted_user]['receivedRetweets'] += 1
-            if tweet_id not in retweet_data[retweeted_user]['tweets']:
-                retweet_data[retweeted_user]['tweets'][tweet_id] = {'retweetedBy': []}
-            retweet_data[retweeted_user]['tweets'][tweet_id]['retweetedBy'].append(retweeting_user)
+def crearRT(archivo_salida, retweet_data=None, guardar=True, compacto=False, compresion=None):
+    if retweet_data is None and es_dataset(archivo_salida):
+        # Del dataset columnar solo se leen las columnas necesarias
+        retweet_data = agregar_retweets(tweets_columnares(archivo_salida, COLUMNAS_RT))
+    if retweet_data is None:
+        # Diccionario para almacenar los retweets por usuario, leyendo los
+        # tweets del archivo JSON de a uno
+        retweet_data = agregar_retweets(json_backend.leer_elementos(archivo_salida))
     # Crear la estructura final del JSON
-    final_retweets = []
-    for user, user_data in retweet_data.items():
-        user_info = {
-            'username': user,
-            'receivedRetweets': user_data['receivedRetweets'],
-            'tweets': []
-        }
-        for tweet_id, retweeted_by in user_data['tweets'].items():
-            tweet_info = {
-                'tweetId': tweet_id,  # Corregido: Separar el formato del ID del tweet
-                'retweetedBy': retweeted_by['retweetedBy']
-            }
-            user_info['tweets'].append(tweet_info)
-        final_retweets.append(user_info)
-
-    final_json = {'retweets': final_retweets}
-    # Guardar el JSON en el archivo rt.json
-    with open('rtp.json', 'w', encoding='utf-8') as outfile:
-        json.dump(final_json, outfile, indent=4, ensure_ascii=False)
-    return 'rtp.json'
-
-
-def crearGrafoRT(archivo_rtjson):
-    # Cargar el archivo JSON de retweets
-    with open(archivo_rtjson, 'r', encoding='utf-8') as file:
-        rt_data = json.load(file)
-    # Crear un grafo dirigido
-    G = nx.DiGraph()
-    # Procesar los retweets para construir el grafo
-    for user_info in rt_data['retweets']:
-        username = user_info['username']
-        received_retweets = user_info['receivedRetweets']
-        # Añadir nodo de usuario al grafo
-        G.add_node(username, received_retweets=received_retweets)
-        # Si hay tweets retuiteados por el usuario
-        if 'tweets' in user_info:
-            for tweet in user_info['tweets']:
-                tweet_id = tweet['tweetId']
-                retweeted_by = tweet['retweetedBy']
-                # Conectar usuarios que retuitearon el mismo tweet
-                for retweeter in retweeted_by:
-                    G.add_edge(retweeter, username)
+    final_json = estructura_rt(retweet_data)
+    if guardar:
+        # Guardar el JSON en el archivo rt.json, de a un usuario
+        json_backend.guardar_json_en_partes('retweets', final_json['retweets'], 'rtp.json', indent=4, ensure_ascii=False,
+                                            compacto=compacto, compresion=compresion)
+    return final_json
+
+
+def crearGrafoRT(archivo_rtjson, rt_data=None, comprimir=False):
+    if rt_data is None:
+        # Los usuarios del archivo JSON de retweets se leen de a uno mientras
+        # se arma el grafo
+        rt_data = {'retweets': json_backend.leer_elementos(archivo_rtjson, 'retweets')}
+    # Construir el grafo como lista de aristas compacta
+    grafo = grafo_rt(rt_data)
     # Guardar el grafo en formato GEXF
-    nx.write_gexf(G, 'rtp.gexf')
-
-def crearMencion(archivo_salida):
-    # Cargar el archivo JSON
-    with open(archivo_salida, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-    # Diccionario para almacenar las menciones por usuario
-    mention_data = {}
-    # Procesar los tweets en busca de menciones
-    for tweet in data:
-        user_mentioned = tweet.get('entities', {}).get('user_mentions')
-        if user_mentioned:  # Verificar si hay menciones en el tweet
-            for mention in user_mentioned:
-                mentioned_user = mention['screen_name']
-                mention_by_user = tweet['user']['screen_name']
-                tweet_id = tweet['id_str']
-
-                if mentioned_user not in mention_data:
-                    mention_data[mentioned_user] = {
-                        'receivedMentions': 0,
-                        'mentions': []
-                    }
-                mention_data[mentioned_user]['receivedMentions'] += 1
-
-                mention_info = {
-                    'mentionBy': mention_by_user,
-                    'tweets': [tweet_id]
-                }
-                # Si ya hay menciones previas del usuario
-                existing_mentions = mention_data[mentioned_user]['mentions']
-                user_mention = next((item for item in existing_mentions if item['mentionBy'] == mention_by_user), None)
-                if user_mention:
-                    user_mention['tweets'].append(tweet_id)
-                else:
-                    mention_data[mentioned_user]['mentions'].append(mention_info)
-    # Ordenar los usuarios por el total de menciones recibidas
-    sorted_mention_data = sorted(mention_data.items(), key=lambda x: x[1]['receivedMentions'], reverse=True)
+    guardar_gexf(grafo, 'rtp.gexf', comprimir)
+
+def crearMencion(archivo_salida, mention_data=None, guardar=True, compacto=False, compresion=None):
+    if mention_data is None and es_dataset(archivo_salida):
+        # Del dataset columnar solo se leen las columnas necesarias
+        mention_data = agregar_menciones(tweets_columnares(archivo_salida, COLUMNAS_MENCIONES))
+    if mention_data is None:
+        # Diccionario para almacenar las menciones por usuario, leyendo los
+        # tweets del archivo JSON de a uno
+        mention_data = agregar_menciones(json_backend.leer_elementos(archivo_salida))
     # Crear la estructura final del JSON
-    final_mentions = []
-    for user, user_data in sorted_mention_data:
-        mentions_info = {
-            'username': user,
-            'receivedMentions': user_data['receivedMentions'],
-            'mentions': user_data['mentions']
-        }
-        final_mentions.append(mentions_info)
-    final_json = {'mentions': final_mentions}
-    # Guardar el JSON en el archivo mencion.json
-    with open('mencionp.json', 'w', encoding='utf-8') as outfile:
-        json.dump(final_json, outfile, indent=4, ensure_ascii=False)
-    return 'mencionp.json'
-
-
-def crearGrafoMencion(arhivo_mencion):
-    # Cargar los datos desde el archivo mencion.json
-    with open(arhivo_mencion, 'r', encoding='utf-8') as file:
-        mention_data = json.load(file)
-    # Crear un grafo dirigido
-    mention_graph = nx.DiGraph()
-    # Iterar sobre cada usuario y sus menciones
-    for user_mention in mention_data['mentions']:
-        username = user_mention['username']
-        mentions = user_mention['mentions']
-        # Agregar nodos al grafo
-        mention_graph.add_node(username)
-        # Agregar las menciones como aristas
-        for mention in mentions:
-            mention_by = mention['mentionBy']
-            mention_graph.add_edge(mention_by, username)
-    # Verificar si el grafo tiene componentes conectados (usuarios no mencionados)
-    isolated_nodes = list(nx.isolates(mention_graph))
-    # Eliminar usuarios no mencionados
-    mention_graph.remove_nodes_from(isolated_nodes)
+    final_json = estructura_menciones(mention_data)
+    if guardar:
+        # Guardar el JSON en el archivo mencion.json, de a un usuario
+        json_backend.guardar_json_en_partes('mentions', final_json['mentions'], 'mencionp.json', indent=4, ensure_ascii=False,
+                                            compacto=compacto, compresion=compresion)
+    return final_json
+
+
+def crearGrafoMencion(arhivo_mencion, mention_data=None, comprimir=False):
+    if mention_data is None:
+        # Los usuarios de mencion.json se leen de a uno mientras se arma el grafo
+        mention_data = {'mentions': json_backend.leer_elementos(arhivo_mencion, 'mentions')}
+    # Construir el grafo sin los usuarios no mencionados
+    mention_graph = grafo_menciones(mention_data)
     # Exportar el grafo a un archivo GEXF
-    nx.write_gexf(mention_graph, 'mencionp.gexf')
+    guardar_gexf(mention_graph, 'mencionp.gexf', comprimir)
 
 
 
 
 
-def crearCRT(archivo_rtjson):
-        # Cargar el archivo JSON
-    with open(archivo_rtjson, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-    # Crear una lista de todos los usuarios presentes
-    all_users = set()
-    for retweet_info in data['retweets']:
-        all_users.add(retweet_info['username'])
-    # Crear un diccionario para mantener un registro de quién retuiteó a quién
-    retweets_dict = {user: set() for user in all_users}
-
-    # Llenar el diccionario con los retweets por cada usuario
-    for retweet_info in data['retweets']:
-        username = retweet_info['username']
-        tweets = retweet_info.get('tweets', {})
-        # Comprobar si 'tweets' es una lista o un diccionario
-        if isinstance(tweets, list):
-            for tweet in tweets:
-                retweeted_by = tweet.get('retweetedBy', [])
-                retweets_dict[username].update(retweeted_by)
-        else:
-            for tweet_id, retweeted_by in tweets.items():
-                retweets_dict[username].update(retweeted_by['retweetedBy'])
+def crearCRT(archivo_rtjson, motor_crt='auto', max_fanout_crt=None, top_crt=None, comm=None, retweet_data=None, guardar=True,
+             compacto=False, compresion=None):
+    distribuido = comm is not None and comm.Get_size() > 1
+    if distribuido and comm.Get_rank() != 0:
+        # Los demás procesos solo calculan su parte de los pares de autores
+        coretweets_distribuidos(comm, None, None, motor_crt, top_crt)
+        return None
+    if retweet_data is not None:
+        # Los retweeters de cada autor salen directo de los agregados en memoria
+        all_users, retweets_dict = retweeters_por_autor(retweet_data)
+    else:
+        # Leer los usuarios del archivo JSON de a uno, en una sola pasada:
+        # todos los usuarios presentes y quién retuiteó a cada uno
+        all_users = set()
+        retweeters = {}
+        for retweet_info in json_backend.leer_elementos(archivo_rtjson, 'retweets'):
+            username = retweet_info['username']
+            all_users.add(username)
+            retweeters.setdefault(username, set())
+            tweets = retweet_info.get('tweets', {})
+            # Comprobar si 'tweets' es una lista o un diccionario
+            if isinstance(tweets, list):
+                for tweet in tweets:
+                    retweeted_by = tweet.get('retweetedBy', [])
+                    retweeters[username].update(retweeted_by)
+            else:
+                for tweet_id, retweeted_by in tweets.items():
+                    retweeters[username].update(retweeted_by['retweetedBy'])
+        # El diccionario sigue el orden del conjunto de usuarios, como al
+        # armarlo después de leer el archivo completo
+        retweets_dict = {user: retweeters.pop(user) for user in all_users}
     # Encontrar usuarios comunes que retuitearon a cualquier par de usuarios
-    usuarios_comunes_por_par = {}
-    for user1 in all_users:
-        for user2 in all_users:
-            if user1 != user2:
-                common_retweeters = retweets_dict[user1].intersection(retweets_dict[user2])
-                if len(common_retweeters) > 0:
-                    usuarios_comunes_por_par[(user1, user2)] = list(common_retweeters)
-    # Crear una lista de coretweets en el formato requerido
-    coretweets_list = []
-    for usuarios, retweeters in usuarios_comunes_por_par.items():
-        coretweet = {
-            "authors": {
-                "u1": usuarios[0],
-                "u2": usuarios[1]
-            },
-            "totalCoretweets": len(retweeters),
-            "retweeters": retweeters
-        }
-        coretweets_list.append(coretweet)
-    # Ordenar los coretweets de mayor a menor por el total de retweeters
-    coretweets_list = sorted(coretweets_list, key=lambda x: x['totalCoretweets'], reverse=True)
+    if distribuido:
+        # Los pares se reparten entre los procesos según el autor user1
+        if max_fanout_crt:
+            retweets_dict = limitar_fanout(retweets_dict, max_fanout_crt)
+        pares = coretweets_distribuidos(comm, retweets_dict, list(all_users), motor_crt, top_crt)
+    else:
+        pares = calcular_coretweets(retweets_dict, all_users, motor_crt, max_fanout_crt)
+        if top_crt:
+            # Solo se conservan los pares con más coretweets, sin armar la lista completa
+            pares = heapq.nlargest(top_crt, pares, key=lambda par: len(par[1]))
     # Crear un diccionario con la lista de coretweets
-    coretweets_dict = {"coretweets": coretweets_list}
-    # Guardar los datos en un archivo corrtw.json
-    with open('corrtwp.json', 'w', encoding='utf-8') as file:
-        json.dump(coretweets_dict, file, indent=4)
-    return "corrtwp.json"
-
-
-def crearGrafoCRT(archivo_corrtwp):
-    # Cargar los datos de coretweets desde corrtw.json
-    with open(archivo_corrtwp, 'r', encoding='utf-8') as file:
-        coretweets_data = json.load(file)
-    # Crear un grafo dirigido
-    G = nx.DiGraph()
-    # Agregar nodos y aristas al grafo
-    for coretweet in coretweets_data['coretweets']:
-        u1 = coretweet['authors']['u1']
-        u2 = coretweet['authors']['u2']
-        retweeters = coretweet['retweeters']
-        G.add_edge(u1, u2, weight=len(retweeters))
+    coretweets_dict = estructura_coretweets(pares)
+    if guardar:
+        # Guardar los datos en un archivo corrtw.json
+        json_backend.guardar_json_en_partes('coretweets', coretweets_dict['coretweets'], 'corrtwp.json', indent=4,
+                                            compacto=compacto, compresion=compresion)
+    return coretweets_dict
+
+
+def crearGrafoCRT(archivo_corrtwp, coretweets_data=None, comprimir=False):
+    if coretweets_data is None:
+        # Los pares de corrtw.json se leen de a uno mientras se arma el grafo
+        coretweets_data = {'coretweets': json_backend.leer_elementos(archivo_corrtwp, 'coretweets')}
+    # Construir el grafo con el peso de cada par de autores
+    grafo = grafo_coretweets(coretweets_data)
     # Exportar el grafo a un archivo corrtw.gexf
-    nx.write_gexf(G, 'corrtwp.gexf')
+    guardar_gexf(grafo, 'corrtwp.gexf', comprimir)
 
 
 
+def crear_pool_local(trabajadores, backend_json=('auto', True)):
+    # Pool de procesos de --pbz2 y --pipeline. Muchas implementaciones de MPI
+    # no admiten fork() después de MPI_Init, así que el pool arranca con
+    # forkserver (o spawn donde no existe). Sus procesos importan este script:
+    # con MPI4PY_RC_INITIALIZE=false mpi4py no inicializa MPI en ellos, que si
+    # no intentarían sumarse al trabajo con el rank del proceso padre. Tampoco
+    # heredan el backend JSON elegido, así que cada uno lo elige al arrancar.
+    os.environ['MPI4PY_RC_INITIALIZE'] = 'false'
+    metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(trabajadores, mp_context=multiprocessing.get_context(metodo),
+                               initializer=json_backend.usar_backend, initargs=backend_json)
+
+
+# Etiquetas del planificador, por debajo de las de reducir_en_arbol
+TAG_PEDIDO = 1
+TAG_TAREA = 2
+
+
+def repartir_archivos(comm, tareas, procesar):
+    # Planificador maestro/trabajador: el proceso 0 tiene las tareas
+    # (indice, archivo) ordenadas de mayor a menor tamaño y entrega la siguiente
+    # a cada proceso que pide trabajo. Entre pedido y pedido el proceso 0
+    # procesa el archivo más chico que queda, así no deja su núcleo sin uso y
+    # las respuestas no se demoran mucho.
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    resultados = {}
+    carga = {'archivos': 0, 'bytes': 0, 'ocupado': 0.0}
+
+    def ejecutar(tarea):
+        inicio = time.time()
+        resultados[tarea[0]] = procesar(*tarea)
+        carga['ocupado'] += time.time() - inicio
+        carga['archivos'] += 1
+        carga['bytes'] += os.path.getsize(tarea[1])
+
+    if rank == 0:
+        pendientes = deque(tareas)
+        activos = size - 1
+        estado = MPI.Status()
+        while activos > 0 or pendientes:
+            # Atender los pedidos que ya llegaron, o esperar uno si no queda nada por hacer
+            while activos > 0 and (not pendientes or comm.Iprobe(source=MPI.ANY_SOURCE, tag=TAG_PEDIDO)):
+                comm.recv(source=MPI.ANY_SOURCE, tag=TAG_PEDIDO, status=estado)
+                if pendientes:
+                    comm.send(pendientes.popleft(), dest=estado.Get_source(), tag=TAG_TAREA)
+                else:
+                    comm.send(None, dest=estado.Get_source(), tag=TAG_TAREA)
+                    activos -= 1
+            if pendientes:
+                ejecutar(pendientes.pop())
+    else:
+        while True:
+            comm.send(None, dest=0, tag=TAG_PEDIDO)
+            tarea = comm.recv(source=0, tag=TAG_TAREA)
+            if tarea is None:
+                break
+            ejecutar(tarea)
+    return resultados, carga
+
+
+def mostrar_carga(cargas):
+    # Tiempo ocupado y ocioso de cada proceso durante el filtrado. Se cuenta como
+    # ocioso todo el tiempo en que el proceso no estaba procesando archivos
+    # hasta que terminó el último proceso.
+    total = max(carga['total'] for carga in cargas)
+    for rank, carga in enumerate(cargas):
+        print(f"Rank {rank}: {carga['archivos']} files, {carga['bytes'] / 1e6:.1f} MB, "
+              f"busy {carga['ocupado']:.2f} s, idle {total - carga['ocupado']:.2f} s")
+
+
+def abortar_en_error(tipo, valor, traza):
+    # Una excepción sin atrapar en un proceso (por ejemplo una opción inválida
+    # en el 0, que es el único que lee las opciones) dejaría a los demás
+    # esperando en la siguiente operación colectiva: se muestra y se termina
+    # todo el trabajo MPI
+    sys.__excepthook__(tipo, valor, traza)
+    sys.stderr.flush()
+    MPI.COMM_WORLD.Abort(1)
+
+
 if __name__ == "__main__":
-    comm = MPI.COMM_WORLD
+    sys.excepthook = abortar_en_error
+    # Con el comunicador medido cada proceso registra el tiempo de sus
+    # operaciones MPI (incluida la espera a los demás)
+    comm = ComunicadorMedido(MPI.COMM_WORLD)
     rank = comm.Get_rank()
     size = comm.Get_size()
     
     
+    archivo_salida = "merged_outputp.json" 
     if rank == 0:
-        archivo_salida = "merged_outputp.json" 
-        directorio = "./datos_copiadosp/"
         argv = sys.argv[1:]
-        opts = []
-        i = 0
-        while i < len(argv):
-            argumento = argv[i]
-            valor = argv[i + 1] if i + 1 < len(argv) else ''
-            if argumento.startswith('--'):
-                opts.append((argumento, ''))
-            else:
-                if argumento.startswith('-') and not valor.startswith('-'):
-                    opts.append((argumento, valor))
-                    i += 2
-                    continue
-                elif argumento.startswith('-') and valor.startswith('-') and not valor.startswith('--'):
-                    pass
-                i += 1
+        trabajadores_bz2 = 1
+        trabajadores_pipeline = 1
+        backend_json = ('auto', True)
+        motor_crt = 'auto'
+        max_fanout_crt = None
+        top_crt = None
+        dinamico = False
+        modo_entrada = 'copia'
+        indice_archivos = None
+        cache = None
+        columnar = None
+        gexf_gz = False
+        archivo_metricas = None
+        perfilador = None
+        memoria_externa = None
+        directorio_externo = None
+        json_compacto = False
+        compresion_json = None
+        # Con --en-memoria los datos pasan de una etapa a otra sin escribirse
+        # y solo se guardan los JSON pedidos con --jrt, --jm y --jcrt
+        en_memoria = False
+        json_pedidos = {'rt': False, 'mencion': False, 'crt': False}
+        opts = parsear_opciones(argv)
         for opt, arg in opts:
             if opt == '-d':
                 directorio_a_copiar = arg
@@ -387,14 +325,61 @@ if __name__ == "__main__":
                 print('Generate retweet graph')
             if opt == '--jrt':
                 print('Generate retweet json')
+                json_pedidos['rt'] = True
             if opt == '--gm':
                 print('Generate mention graph')
             if opt == '--jm':
                 print('Generate mention json')
+                json_pedidos['mencion'] = True
             if opt == '--gcrt':
                 print('Generate coretweet graph')
             if opt == '--jcrt':
                 print('Generate coretweet json')
+                json_pedidos['crt'] = True
+            if opt == '--pbz2':
+                trabajadores_bz2 = int(arg) if arg else os.cpu_count()
+            if opt == '--pipeline':
+                trabajadores_pipeline = int(arg) if arg else 2
+            if opt == '--json':
+                backend_json = (arg or 'auto', backend_json[1])
+            if opt == '--json-rapido':
+                backend_json = (backend_json[0], False)
+            if opt == '--crt':
+                motor_crt = arg or 'auto'
+            if opt == '--crt-fanout':
+                max_fanout_crt = int(arg)
+            if opt == '--crt-top':
+                top_crt = int(arg)
+            if opt == '--dinamico':
+                dinamico = True
+            if opt == '--en-memoria':
+                en_memoria = True
+            if opt == '--entrada':
+                modo_entrada = validar_modo_entrada(arg or 'copia')
+            if opt == '--indice':
+                indice_archivos = arg or INDICE_POR_DEFECTO
+            if opt == '--cache':
+                cache = (arg or CACHE_POR_DEFECTO, cache[1] if cache else TAMANO_MAXIMO_POR_DEFECTO)
+            if opt == '--cache-max':
+                cache = (cache[0] if cache else CACHE_POR_DEFECTO, int(float(arg) * 1024 ** 2))
+            if opt == '--columnar':
+                columnar = validar_formato(arg or 'parquet')
+            if opt == '--gexf-gz':
+                gexf_gz = True
+            if opt == '--metricas':
+                archivo_metricas = arg or 'metricasp.json'
+            if opt == '--profile':
+                perfilador = arg or 'cprofile'
+            if opt == '--externo':
+                memoria_externa = float(arg) if arg else MEMORIA_EXTERNA_POR_DEFECTO
+            if opt == '--externo-dir':
+                directorio_externo = arg
+            if opt == '--json-compacto':
+                json_compacto = True
+            if opt == '--json-comprimido':
+                compresion_json = json_backend.validar_compresion(arg or 'gz')
+        if not en_memoria:
+            json_pedidos = {'rt': True, 'mencion': True, 'crt': True}
         if fecha_inicial_str:
             # Separar el día, mes y año
             dia_ini, mes_ini, anio_ini = map(int, fecha_inicial_str.split('-'))
@@ -411,7 +396,10 @@ if __name__ == "__main__":
             fecha_final_str = f"{dia_fin:02d}-{mes_fin:02d}-{anio_fin}"
 
         tiempo_inicioT = time.time()
-        encontrar_archivos(directorio_a_copiar,nombre_archivo_hashtags,fecha_inicial_str,fecha_final_str)
+        conexion_indice = abrir_indice(indice_archivos) if indice_archivos else None
+        origenes = {}
+        with etapa('entrada'):
+            archivos_a_procesar = encontrar_archivos(directorio_a_copiar,nombre_archivo_hashtags,fecha_inicial_str,fecha_final_str,modo_entrada,conexion_indice,origenes)
 
         # Proceso principal
         if nombre_archivo_hashtags:
@@ -426,45 +414,248 @@ if __name__ == "__main__":
             fecha_inicial = datetime.strptime(fecha_inicial_str, "%d-%m-%Y").date()
         if fecha_final_str:
             fecha_final = datetime.strptime(fecha_final_str, "%d-%m-%Y").date()
-        archivos_a_procesar = [os.path.join(directorio, archivo) for archivo in os.listdir(directorio) if archivo.endswith(".bz2")]
         # Dividir archivos entre procesos
         chunks = [archivos_a_procesar[i::size] for i in range(size)]
+        carpeta_externa = None
+        if memoria_externa:
+            # Con --externo cada proceso vuelca sus agregados en esta carpeta,
+            # que tiene que ser compartida (por defecto, en el directorio actual)
+            carpeta_externa = os.path.abspath(tempfile.mkdtemp(prefix='agregados_', dir=directorio_externo or '.'))
     else:
         hashtags_a_buscar = None
         fecha_inicial = None
         fecha_final = None
         chunks = None
+        trabajadores_bz2 = None
+        trabajadores_pipeline = None
+        backend_json = None
+        motor_crt = None
+        max_fanout_crt = None
+        top_crt = None
+        dinamico = None
+        en_memoria = None
+        json_pedidos = None
+        cache = None
+        origenes = None
+        columnar = None
+        perfilador = None
+        memoria_externa = None
+        carpeta_externa = None
+        json_compacto = None
+        compresion_json = None
     
+    # Las opciones se validan en el proceso 0 al leerlas; si algo falla,
+    # abortar_en_error termina todos los procesos
+    perfilador = comm.bcast(perfilador, root=0)
+    if perfilador:
+        activar_perfiles(perfilador, f".rank{rank}")
+    json_compacto, compresion_json = comm.bcast((json_compacto, compresion_json), root=0)
     hashtags_a_buscar = comm.bcast(hashtags_a_buscar, root=0)
     fecha_inicial = comm.bcast(fecha_inicial, root=0)
     fecha_final = comm.bcast(fecha_final, root=0)
-    archivos_a_procesar = comm.scatter(chunks, root=0)
-    tweets_data = []
-
-    for archivo in archivos_a_procesar:
-        tweets_data.extend(merged_output(archivo, hashtags_a_buscar, fecha_inicial, fecha_final))
-    # Recopilar resultados en el proceso 0
-    all_tweets_data = comm.gather(tweets_data, root=0)
+    trabajadores_bz2, trabajadores_pipeline = comm.bcast((trabajadores_bz2, trabajadores_pipeline), root=0)
+    backend_json = comm.bcast(backend_json, root=0)
+    motor_crt, max_fanout_crt, top_crt = comm.bcast((motor_crt, max_fanout_crt, top_crt), root=0)
+    if rank == 0 and columnar and not en_memoria:
+        # Con --columnar cada proceso escribe sus partes en merged_outputp.parquet
+        # (o .arrow) en lugar de merged_outputp.json
+        preparar_dataset(ruta_dataset(archivo_salida, columnar))
+    dinamico, en_memoria, columnar = comm.bcast((dinamico, en_memoria, columnar), root=0)
+    cache = comm.bcast(cache, root=0)
+    memoria_externa, carpeta_externa = comm.bcast((memoria_externa, carpeta_externa), root=0)
+    if cache:
+        # La caché se busca por el archivo original, no por su copia
+        origenes = comm.bcast(origenes, root=0)
+    elif rank != 0:
+        origenes = {}
+    nombre_backend = json_backend.usar_backend(*backend_json)
     if rank == 0:
-        # Consolidar datos en el proceso principal y escribir en el archivo de salida
-        merged_tweets = []
-        for data in all_tweets_data:
-            merged_tweets.extend(data)
-        with open(archivo_salida, 'w', encoding='utf-8') as archivo_salida:
-            json.dump(merged_tweets, archivo_salida, ensure_ascii=False, indent=2)
-        #comm.Barrier()
-            
-
+        print(f"JSON backend: {nombre_backend}")
+    prefiltro = compilar_prefiltro(hashtags_a_buscar)
+
+    # Con --pbz2 cada proceso reparte los bloques de sus archivos en un pool
+    # local. Con --pipeline un hilo de cada proceso descomprime sus archivos y
+    # el pool local filtra los lotes de líneas ya leídos.
+    filtrar = merged_output
+    trabajadores_locales = trabajadores_bz2
+    if trabajadores_pipeline > 1:
+        filtrar = merged_output_pipeline
+        trabajadores_locales = trabajadores_pipeline
+    ejecutor_local = crear_pool_local(trabajadores_locales, backend_json) if trabajadores_locales > 1 else None
+    # Líneas leídas de cada archivo, para el índice
+    lineas_por_archivo = {}
+    def guardar_tweets(tweets, numero):
+        # Parte `numero` de merged_outputp.json o del dataset columnar
+        if columnar:
+            guardar_parte(tweets, ruta_dataset(archivo_salida, columnar), numero, columnar)
+        else:
+            json_backend.guardar_fragmento_json(tweets, f"{archivo_salida}.{numero}", ensure_ascii=False, indent=2)
+
+    inicio_filtrado = time.time()
+    if dinamico:
+        # El proceso 0 entrega los archivos de a uno, del más grande al más chico
+        tareas = None
+        if rank == 0:
+            # Con --indice los tamaños salen del índice en lugar de consultar el disco
+            tamanos = tamanos_indexados(conexion_indice, origenes.values()) if conexion_indice else {}
+            tareas = sorted(enumerate(archivos_a_procesar), key=lambda tarea: tamanos.get(origenes.get(tarea[1])) or os.path.getsize(tarea[1]), reverse=True)
+
+        def procesar_archivo(indice, archivo):
+            with etapa('filtrado') as registro:
+                tweets = cargar_o_calcular(
+                    cache, origenes.get(archivo, archivo), hashtags_a_buscar, fecha_inicial, fecha_final,
+                    lambda: filtrar(archivo, hashtags_a_buscar, fecha_inicial, fecha_final, ejecutor_local, trabajadores_locales, prefiltro, lineas_por_archivo))
+                registro['tweets'] += len(tweets)
+                registro['bytes'] += os.path.getsize(archivo)
+            if not en_memoria:
+                with etapa('escritura_merged') as registro:
+                    guardar_tweets(tweets, indice)
+                    registro['tweets'] += len(tweets)
+            with etapa('agregacion'):
+                parcial = agregar_tweets(tweets)
+                if memoria_externa:
+                    # Con --externo los agregados de cada archivo se vuelcan
+                    # como runs propios, ordenados por el número de archivo
+                    return tuple(AgregadoExterno(tipo, carpeta_externa, memoria_externa, orden=(indice,)).combinar(datos).terminar()
+                                 for tipo, datos in zip(('retweets', 'menciones'), parcial))
+                return parcial
+
+        parciales, carga = repartir_archivos(comm, tareas, procesar_archivo)
+        # Los agregados de cada archivo se combinan en el orden original de los
+        # archivos, así el resultado no depende de qué proceso tomó cada uno
+        with etapa('combinacion'):
+            parciales = reducir_en_arbol(comm, parciales, lambda a, b: {**a, **b})
+            if rank == 0 and memoria_externa:
+                retweet_data = AgregadoExterno.desde_runs('retweets', [run for runs in parciales.values() for run in runs[0]],
+                                                          carpeta_externa, memoria_externa)
+                mention_data = AgregadoExterno.desde_runs('menciones', [run for runs in parciales.values() for run in runs[1]],
+                                                          carpeta_externa, memoria_externa)
+            elif rank == 0:
+                retweet_data = {}
+                mention_data = {}
+                for indice in sorted(parciales):
+                    combinar_retweets(retweet_data, parciales[indice][0])
+                    combinar_menciones(mention_data, parciales[indice][1])
+            del parciales
+        if rank == 0:
+            fragmentos = [f"{archivo_salida}.{indice}" for indice in range(len(archivos_a_procesar))]
+    else:
+        archivos_a_procesar = comm.scatter(chunks, root=0)
+        # Cada proceso escribe su parte de merged_outputp.json a medida que
+        # filtra cada archivo, sin juntar los tweets en memoria
+        escritor_merged = None
+        if not en_memoria and not columnar:
+            escritor_merged = json_backend.EscritorListaJson(f"{archivo_salida}.{rank}", indent=2, ensure_ascii=False,
+                                                             fragmento=True)
+        retweet_data = {}
+        mention_data = {}
+        if memoria_externa:
+            retweet_data = AgregadoExterno('retweets', carpeta_externa, memoria_externa, orden=(rank,))
+            mention_data = AgregadoExterno('menciones', carpeta_externa, memoria_externa, orden=(rank,))
+        carga = {'archivos': len(archivos_a_procesar), 'bytes': 0, 'ocupado': 0.0}
+        for numero, archivo in enumerate(archivos_a_procesar):
+            carga['bytes'] += os.path.getsize(archivo)
+            # Con --cache los tweets filtrados de cada archivo se reutilizan
+            # mientras no cambien el archivo original ni los filtros
+            with etapa('filtrado') as registro:
+                tweets = cargar_o_calcular(
+                    cache, origenes.get(archivo, archivo), hashtags_a_buscar, fecha_inicial, fecha_final,
+                    lambda: filtrar(archivo, hashtags_a_buscar, fecha_inicial, fecha_final, ejecutor_local, trabajadores_locales, prefiltro, lineas_por_archivo))
+                registro['tweets'] += len(tweets)
+                registro['bytes'] += os.path.getsize(archivo)
+            # Cada proceso arma sus agregados parciales de retweets y menciones,
+            # en lugar de enviar todos los tweets al 0
+            with etapa('agregacion'):
+                if memoria_externa:
+                    rt_archivo, menciones_archivo = agregar_tweets(tweets)
+                    retweet_data.combinar(rt_archivo)
+                    mention_data.combinar(menciones_archivo)
+                else:
+                    agregar_tweets(tweets, retweet_data, mention_data)
+            if not en_memoria:
+                with etapa('escritura_merged') as registro:
+                    if columnar:
+                        # Las partes del dataset van en orden de rank y de archivo
+                        guardar_parte(tweets, ruta_dataset(archivo_salida, columnar), (rank, numero), columnar)
+                    else:
+                        escritor_merged.agregar(tweets)
+                    registro['tweets'] += len(tweets)
+            del tweets
+        if escritor_merged:
+            escritor_merged.cerrar()
+        carga['ocupado'] = time.time() - inicio_filtrado
+        # Combinar los agregados en árbol; el proceso 0 recibe el resultado en orden de rank
+        with etapa('combinacion'):
+            if memoria_externa:
+                # Con --externo solo viajan al proceso 0 las rutas de los runs
+                # de cada proceso, que se mezclan en orden de rank
+                runs = comm.gather((retweet_data.terminar(), mention_data.terminar()), root=0)
+                if rank == 0:
+                    retweet_data = AgregadoExterno.desde_runs('retweets', [run for propios in runs for run in propios[0]],
+                                                              carpeta_externa, memoria_externa)
+                    mention_data = AgregadoExterno.desde_runs('menciones', [run for propios in runs for run in propios[1]],
+                                                              carpeta_externa, memoria_externa)
+                del runs
+            else:
+                retweet_data = reducir_en_arbol(comm, retweet_data, combinar_retweets)
+                mention_data = reducir_en_arbol(comm, mention_data, combinar_menciones)
+        fragmentos = [f"{archivo_salida}.{r}" for r in range(size)]
+    carga['total'] = time.time() - inicio_filtrado
+    carga['lineas'] = lineas_por_archivo
+    carga['cache'] = dict(estadisticas_cache)
+    if ejecutor_local:
+        ejecutor_local.shutdown()
+    cargas = comm.gather(carga, root=0)
+    if rank == 0:
+        mostrar_carga(cargas)
+        if cache:
+            print(f"Cache: {sum(carga['cache']['aciertos'] for carga in cargas)} hits, "
+                  f"{sum(carga['cache']['fallos'] for carga in cargas)} misses")
+        if conexion_indice is not None:
+            registrar_tweets(conexion_indice, {origenes[ruta]: cantidad for carga in cargas
+                                               for ruta, cantidad in carga['lineas'].items() if ruta in origenes})
+            conexion_indice.close()
+        if not en_memoria and not columnar:
+            # Unir las partes de cada proceso en el archivo de salida
+            with etapa('escritura_merged'):
+                json_backend.unir_fragmentos_json(fragmentos, archivo_salida, indent=2)
+                for fragmento in fragmentos:
+                    os.remove(fragmento)
 
         archivo_merged = "merged_outputp.json" 
+        if columnar:
+            archivo_merged = ruta_dataset(archivo_merged, columnar)
+        archivo_rt = json_backend.ruta_salida('rtp.json', compresion_json)
+        archivo_mencion = json_backend.ruta_salida('mencionp.json', compresion_json)
+        archivo_corrtw = json_backend.ruta_salida('corrtwp.json', compresion_json)
+
+        # Los agregados y las estructuras finales pasan en memoria a los grafos;
+        # los JSON intermedios solo se escriben si corresponde
+        with etapa('rt'):
+            rt_data = crearRT(archivo_merged, retweet_data, json_pedidos['rt'], json_compacto, compresion_json)
+        with etapa('grafo_rt'):
+            crearGrafoRT(archivo_rt, rt_data, gexf_gz)
+        del rt_data
+        with etapa('menciones'):
+            mention_data = crearMencion(archivo_merged, mention_data, json_pedidos['mencion'], json_compacto, compresion_json)
+        with etapa('grafo_menciones'):
+            crearGrafoMencion(archivo_mencion, mention_data, gexf_gz)
+        del mention_data
+    else:
+        retweet_data = None
+        json_pedidos = {'crt': False}
+        archivo_rt = None
 
-            
-        archivo_rtjson = crearRT(archivo_merged)
-        crearGrafoRT(archivo_rtjson)
-        archivo_mencion = crearMencion(archivo_merged)
-        crearGrafoMencion(archivo_mencion)
-        archivo_corrtw = crearCRT(archivo_rtjson)
-        crearGrafoCRT(archivo_corrtw)
+    # Todos los procesos participan en el cálculo de los coretweets
+    with etapa('coretweets'):
+        coretweets_data = crearCRT(archivo_rt, motor_crt, max_fanout_crt, top_crt, comm, retweet_data, json_pedidos['crt'],
+                                   json_compacto, compresion_json)
+
+    if rank == 0:
+        with etapa('grafo_coretweets'):
+            crearGrafoCRT(archivo_corrtw, coretweets_data, gexf_gz)
+        if memoria_externa:
+            shutil.rmtree(carpeta_externa)
 
 
 
@@ -472,5 +663,17 @@ if __name__ == "__main__":
         tiempo_transcurridoT = tiempo_finT - tiempo_inicioT
         print(f"Time: {tiempo_transcurridoT} seconds")
 
+    # Con --metricas o --profile el proceso 0 junta las métricas de todos y
+    # muestra el resumen; cada proceso guarda sus propios perfiles
+    archivo_metricas = comm.bcast(archivo_metricas if rank == 0 else None, root=0)
+    if archivo_metricas or perfilador:
+        por_rank = comm.gather(metricas(), root=0)
+        if rank == 0:
+            mostrar_metricas(por_rank)
+            if archivo_metricas:
+                guardar_metricas(archivo_metricas, por_rank, script='parallel', argv=sys.argv[1:], procesos=size,
+                                 total=tiempo_transcurridoT)
+        guardar_perfiles()
+
 
 
@@ -1,12 +1,25 @@
 import os
-import json
-import bz2
-import networkx as nx
 import getopt
 import sys
 import shutil
+import tempfile
 import time
+import heapq
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from twitter_data_utils import parsear_opciones, compilar_prefiltro
+import twitter_data_json as json_backend
+from twitter_data_filtro import merged_output, filtrar_en_orden
+from twitter_data_grafos import grafo_rt, grafo_menciones, grafo_coretweets, guardar_gexf
+from twitter_data_columnar import ruta_dataset, preparar_dataset, guardar_parte, validar_formato
+from twitter_data_cache import CACHE_POR_DEFECTO, TAMANO_MAXIMO_POR_DEFECTO, cargar_o_calcular
+from twitter_data_cache import estadisticas as estadisticas_cache
+from twitter_data_archivos import preparar_entrada, validar_modo_entrada
+from twitter_data_indice import INDICE_POR_DEFECTO, abrir_indice, actualizar_indice, buscar_archivos, registrar_tweets
+from twitter_data_aggregates import agregar_tweets, combinar_retweets, combinar_menciones, estructura_rt, estructura_menciones, retweeters_por_autor
+from twitter_data_coretweets import calcular_coretweets, estructura_coretweets
+from twitter_data_externo import MEMORIA_POR_DEFECTO as MEMORIA_EXTERNA_POR_DEFECTO, AgregadoExterno
+from twitter_data_metricas import etapa, metricas, mostrar_metricas, guardar_metricas, activar_perfiles, guardar_perfiles
 
 def encontrar_archivos_json_bz2(directorio, fecha_inicial=None, fecha_final=None):
     archivos_encontrados = []
@@ -30,23 +43,30 @@ def main(argv):
     nombre_archivo_hashtags = ''
     fecha_inicial_str = ''
     fecha_final_str = ''
-    opts = []
-
-    i = 0
-    while i < len(argv):
-        argumento = argv[i]
-        valor = argv[i + 1] if i + 1 < len(argv) else ''
-        if argumento.startswith('--'):
-            opts.append((argumento, ''))
-        else:
-            if argumento.startswith('-') and not valor.startswith('-'):
-                opts.append((argumento, valor))
-                i += 2
-                continue
-            elif argumento.startswith('-') and valor.startswith('-') and not valor.startswith('--'):
-                pass
-            i += 1
-    
+    trabajadores_bz2 = 1
+    trabajadores = 1
+    archivo_metricas = None
+    perfilador = None
+    backend_json = 'auto'
+    json_compatible = True
+    motor_crt = 'auto'
+    max_fanout_crt = None
+    top_crt = None
+    modo_entrada = 'copia'
+    indice_archivos = None
+    cache = None
+    columnar = None
+    gexf_gz = False
+    memoria_externa = None
+    directorio_externo = None
+    json_compacto = False
+    compresion_json = None
+    # Con --en-memoria no se escribe merged_output.json y solo se guardan
+    # los JSON pedidos con --jrt, --jm y --jcrt
+    en_memoria = False
+    json_pedidos = {'rt': False, 'mencion': False, 'crt': False}
+    opts = parsear_opciones(argv)
+
     for opt, arg in opts:
         if opt == '-d':
             directorio_a_copiar = arg
@@ -62,14 +82,62 @@ def main(argv):
             print('Generate retweet graph')
         if opt == '--jrt':
             print('Generate retweet json')
+            json_pedidos['rt'] = True
         if opt == '--gm':
             print('Generate mention graph')
         if opt == '--jm':
             print('Generate mention json')
+            json_pedidos['mencion'] = True
         if opt == '--gcrt':
             print('Generate coretweet graph')
         if opt == '--jcrt':
             print('Generate coretweet json')
+            json_pedidos['crt'] = True
+        if opt == '--pbz2':
+            trabajadores_bz2 = int(arg) if arg else os.cpu_count()
+        if opt == '--json':
+            backend_json = arg or 'auto'
+        if opt == '--json-rapido':
+            json_compatible = False
+        if opt == '--crt':
+            motor_crt = arg or 'auto'
+        if opt == '--crt-fanout':
+            max_fanout_crt = int(arg)
+        if opt == '--crt-top':
+            top_crt = int(arg)
+        if opt == '--en-memoria':
+            en_memoria = True
+        if opt == '--entrada':
+            modo_entrada = validar_modo_entrada(arg or 'copia')
+        if opt == '--indice':
+            indice_archivos = arg or INDICE_POR_DEFECTO
+        if opt == '--cache':
+            cache = (arg or CACHE_POR_DEFECTO, cache[1] if cache else TAMANO_MAXIMO_POR_DEFECTO)
+        if opt == '--cache-max':
+            cache = (cache[0] if cache else CACHE_POR_DEFECTO, int(float(arg) * 1024 ** 2))
+        if opt == '--columnar':
+            columnar = validar_formato(arg or 'parquet')
+        if opt == '--gexf-gz':
+            gexf_gz = True
+        if opt == '--workers':
+            trabajadores = int(arg) if arg else os.cpu_count()
+        if opt == '--metricas':
+            archivo_metricas = arg or 'metricas.json'
+        if opt == '--profile':
+            perfilador = arg or 'cprofile'
+        if opt == '--externo':
+            memoria_externa = float(arg) if arg else MEMORIA_EXTERNA_POR_DEFECTO
+        if opt == '--externo-dir':
+            directorio_externo = arg
+        if opt == '--json-compacto':
+            json_compacto = True
+        if opt == '--json-comprimido':
+            compresion_json = json_backend.validar_compresion(arg or 'gz')
+    if perfilador:
+        activar_perfiles(perfilador)
+    if not en_memoria:
+        json_pedidos = {'rt': True, 'mencion': True, 'crt': True}
+    print(f"JSON backend: {json_backend.usar_backend(backend_json, json_compatible)}")
     
     if fecha_inicial_str:
         # Separar el día, mes y año
@@ -108,32 +176,36 @@ def main(argv):
             if not nombre_archivo_hashtags.endswith('.txt'):
                 nombre_archivo_hashtags += '.txt'
                 
-        # Crear el directorio de destino
         directorio_destino = os.path.join(directorio_raiz, 'datos_copiados')
-        if not os.path.exists(directorio_destino):
-            os.makedirs(directorio_destino)
-
-        # Encontrar archivos .json.bz2 en el directorio ingresado por el usuario según las fechas proporcionadas
-        archivos_json_bz2 = encontrar_archivos_json_bz2(directorio_absoluto, fecha_inicial, fecha_final)
-
-        # Copiar archivos al directorio de destino
-        for archivo in archivos_json_bz2:
-            nombre_archivo = os.path.basename(archivo)
-            nombre_sin_extension = os.path.splitext(nombre_archivo)[0]
-            extension = os.path.splitext(nombre_archivo)[1]
-
-            # Verificar si el archivo ya existe en el directorio destino
-            contador = 1
-            nuevo_nombre = nombre_archivo
-            while os.path.exists(os.path.join(directorio_destino, nuevo_nombre)):
-                nuevo_nombre = f"{nombre_sin_extension}_{contador}{extension}"
-                contador += 1
-
-            shutil.copy(archivo, os.path.join(directorio_destino, nuevo_nombre))
+
+        with etapa('busqueda'):
+            # Encontrar archivos .json.bz2 en el directorio ingresado por el usuario según las fechas proporcionadas
+            if indice_archivos:
+                # Con --indice solo se vuelven a listar los directorios que cambiaron
+                # y el rango de fechas se resuelve con el índice
+                conexion_indice = abrir_indice(indice_archivos)
+                actualizar_indice(conexion_indice, directorio_absoluto)
+                fecha_inicial_iso = '-'.join(fecha_inicial_str.split('-')[::-1]) if fecha_inicial_str else None
+                fecha_final_iso = '-'.join(fecha_final_str.split('-')[::-1]) if fecha_final_str else None
+                encontrados = buscar_archivos(conexion_indice, directorio_absoluto, fecha_inicial_iso, fecha_final_iso)
+                archivos_json_bz2 = [ruta for ruta, tamano, tweets in encontrados]
+                tamanos = {ruta: tamano for ruta, tamano, tweets in encontrados}
+                tweets_conocidos = [tweets for ruta, tamano, tweets in encontrados if tweets is not None]
+                print(f"Index: {len(encontrados)} files, {sum(tamanos.values()) / 1e6:.1f} MB"
+                      + (f", {sum(tweets_conocidos)} lines in {len(tweets_conocidos)} files already read" if tweets_conocidos else ""))
+            else:
+                archivos_json_bz2 = encontrar_archivos_json_bz2(directorio_absoluto, fecha_inicial, fecha_final)
+
+        # Copiar o enlazar los archivos en el directorio de destino, o usarlos en su lugar
+        origenes = {}
+        with etapa('copia') as registro:
+            archivos_a_procesar = preparar_entrada(archivos_json_bz2, directorio_destino, modo_entrada, origenes)
+            registro['bytes'] += sum(os.path.getsize(ruta) for ruta in archivos_json_bz2)
     else:
         print("El directorio especificado no existe.")
+        archivos_a_procesar = []
+        indice_archivos = None
 
-    directorio = "./datos_copiados/"
     archivo_salida = "merged_output.json"
     archivo_hashtags =  nombre_archivo_hashtags
 
@@ -143,7 +215,24 @@ def main(argv):
         with open(archivo_hashtags, 'r') as file:
             hashtags_a_buscar = [line.strip() for line in file.readlines()]
 
-    tweets_data = []
+    # Los tweets filtrados de cada archivo se escriben apenas se tienen, así
+    # no se juntan en memoria: merged_output.json se arma por partes o, con
+    # --columnar, se escribe una parte del dataset por archivo
+    escritor_merged = None
+    if not en_memoria and columnar:
+        ruta_columnar = ruta_dataset(archivo_salida, columnar)
+        preparar_dataset(ruta_columnar)
+    elif not en_memoria:
+        escritor_merged = json_backend.EscritorListaJson(archivo_salida, indent=2, ensure_ascii=False)
+    # Los agregados de retweets y menciones se arman en la misma pasada del filtrado
+    retweet_data = {}
+    mention_data = {}
+    if memoria_externa:
+        # Con --externo los agregados que superan el presupuesto de memoria se
+        # vuelcan a disco y se mezclan al final
+        carpeta_externa = tempfile.mkdtemp(prefix='agregados_', dir=directorio_externo)
+        retweet_data = AgregadoExterno('retweets', carpeta_externa, memoria_externa)
+        mention_data = AgregadoExterno('menciones', carpeta_externa, memoria_externa)
 
     # Convertir las fechas ingresadas a un formato adecuado si fueron ingresadas
     if fecha_inicial_str:
@@ -151,346 +240,164 @@ def main(argv):
     if fecha_final_str:
         fecha_final = datetime.strptime(fecha_final_str, "%d-%m-%Y").date()
 
-    for archivo_bz2 in os.listdir(directorio):
-        if archivo_bz2.endswith(".bz2"):
-            ruta_archivo = os.path.join(directorio, archivo_bz2)
-
-            with bz2.BZ2File(ruta_archivo, 'rb') as archivo_comprimido:
-                contenido_descomprimido = archivo_comprimido.read().decode('utf-8')
-                tweets = contenido_descomprimido.strip().split('\n')
-
-                for tweet in tweets:
-                    try:
-                        datos_tweet = json.loads(tweet)
-
-                        # Convertir la fecha del tweet al formato deseado
-                        fecha_tweet_str = datos_tweet.get("created_at", "")
-                        if fecha_tweet_str:
-                            fecha_tweet = datetime.strptime(fecha_tweet_str, "%a %b %d %H:%M:%S +0000 %Y").date()
-
-                        # Verificar si el tweet contiene al menos uno de los hashtags buscados
-                        hashtags_del_tweet = [hashtag['text'].lower() for hashtag in datos_tweet.get("entities", {}).get("hashtags", [])]
-
-                        # Verificar si el tweet contiene al menos uno de los hashtags buscados en minúsculas
-                        if hashtags_a_buscar:
-                            tweet_contiene_hashtag = any(hashtag in hashtags_a_buscar for hashtag in hashtags_del_tweet)
-                            if not tweet_contiene_hashtag:
-                                continue  # Si no contiene ninguno de los hashtags, pasar al siguiente tweet
-
-                        # Verificar si la fecha del tweet está dentro del rango especificado
-                        if fecha_inicial and fecha_final:
-                            if not (fecha_inicial <= fecha_tweet <= fecha_final):
-                                continue  # Si la fecha está fuera del rango, pasar al siguiente tweet
-
-
-                        tweet_filtrado = {
-                            "created_at": datos_tweet.get("created_at", None),
-                            "id_str": datos_tweet.get("id_str", None),
-                            "text": datos_tweet.get("text", None),
-                            "user": {
-                                "id": datos_tweet.get("user", {}).get("id", None),
-                                "name": datos_tweet.get("user", {}).get("name", None),
-                                "screen_name": datos_tweet.get("user", {}).get("screen_name", None),
-                                "location": datos_tweet.get("user", {}).get("location", None),
-                                "url": datos_tweet.get("user", {}).get("url", None),
-                                "description": datos_tweet.get("user", {}).get("description", None),
-                            },
-                            "place": {},
-                            "entities": {
-                                "hashtags": [],
-                                "urls": [],
-                                "user_mentions": []
-                            }
-                        }
-
-                        if "urls" in datos_tweet.get("entities", {}):
-                            for url_info in datos_tweet["entities"]["urls"]:
-                                url_entry = {
-                                    "url": url_info.get("url", None),
-                                    "unwound": {
-                                        "url": url_info.get("unwound", {}).get("url", None),
-                                        "title": url_info.get("unwound", {}).get("title", None),
-                                    }
-                                }
-                                tweet_filtrado["entities"]["urls"].append(url_entry)
-
-                        if "user_mentions" in datos_tweet.get("entities", {}):
-                            for mention_info in datos_tweet["entities"]["user_mentions"]:
-                                mention_entry = {
-                                    "id": mention_info.get("id", None),
-                                    "name": mention_info.get("name", None),
-                                    "screen_name": mention_info.get("screen_name", None),
-                                }
-                                tweet_filtrado["entities"]["user_mentions"].append(mention_entry)
-
-                        # Extraer hashtags
-                        if "hashtags" in datos_tweet.get("entities", {}):
-                            for hashtag_info in datos_tweet["entities"]["hashtags"]:
-                                hashtag_entry = {
-                                    "text": hashtag_info.get("text", None),
-                                }
-                                tweet_filtrado["entities"]["hashtags"].append(hashtag_entry)
-
-                        tweets_data.append(tweet_filtrado)
-
-                    except json.JSONDecodeError as e:
-                        print(f"Error decoding JSON in file {ruta_archivo}: {e}")
-
-    with open(archivo_salida, 'w', encoding='utf-8') as archivo_salida:
-        json.dump(tweets_data, archivo_salida, ensure_ascii=False, indent=2)
-
-    # Cargar el archivo JSON
-    with open('merged_output.json', 'r', encoding='utf-8') as file:
-        data = json.load(file)
-
-    # Diccionario para almacenar los retweets por usuario
-    retweet_data = {}
-
-    # Procesar los retweets para construir la estructura de datos
-    for tweet in data:
-        text = tweet.get('text')  # Obtener el texto del tweet
-        if text and text.startswith('RT @'):  # Verificar si hay texto y si indica un retweet
-            retweeted_user = text.split()[1][1:]  # Obtener el nombre del usuario retuiteado
-            retweeting_user = tweet['user']['screen_name']
-
-            if 'retweeted_status' in tweet:
-                tweet_id = tweet['retweeted_status']['id_str']
-            else:
-                tweet_id = tweet['id_str']  # Si es un tweet original, usar su propio ID
-
-            if retweeted_user not in retweet_data:
-                retweet_data[retweeted_user] = {
-                    'receivedRetweets': 0,
-                    'tweets': {}
-                }
-
-            retweet_data[retweeted_user]['receivedRetweets'] += 1
-
-            if tweet_id not in retweet_data[retweeted_user]['tweets']:
-                retweet_data[retweeted_user]['tweets'][tweet_id] = {'retweetedBy': []}
-
-            retweet_data[retweeted_user]['tweets'][tweet_id]['retweetedBy'].append(retweeting_user)
-
-    # Crear la estructura final del JSON
-    final_retweets = []
-
-    for user, user_data in retweet_data.items():
-        user_info = {
-            'username': user,
-            'receivedRetweets': user_data['receivedRetweets'],
-            'tweets': []
-        }
-        for tweet_id, retweeted_by in user_data['tweets'].items():
-            tweet_info = {
-                'tweetId': tweet_id,  # Corregido: Separar el formato del ID del tweet
-                'retweetedBy': retweeted_by['retweetedBy']
-            }
-            user_info['tweets'].append(tweet_info)
-        final_retweets.append(user_info)
-
-    final_json = {'retweets': final_retweets}
-
-    # Guardar el JSON en el archivo rt.json
-    with open('rt.json', 'w', encoding='utf-8') as outfile:
-        json.dump(final_json, outfile, indent=4, ensure_ascii=False)
-
-    # Cargar el archivo JSON de retweets
-    with open('rt.json', 'r', encoding='utf-8') as file:
-        rt_data = json.load(file)
-
-    # Crear un grafo dirigido
-    G = nx.DiGraph()
-
-    # Procesar los retweets para construir el grafo
-    for user_info in rt_data['retweets']:
-        username = user_info['username']
-        received_retweets = user_info['receivedRetweets']
-
-        # Añadir nodo de usuario al grafo
-        G.add_node(username, received_retweets=received_retweets)
-
-        # Si hay tweets retuiteados por el usuario
-        if 'tweets' in user_info:
-            for tweet in user_info['tweets']:
-                tweet_id = tweet['tweetId']
-                retweeted_by = tweet['retweetedBy']
-
-                # Conectar usuarios que retuitearon el mismo tweet
-                for retweeter in retweeted_by:
-                    G.add_edge(retweeter, username)
-
-    # Guardar el grafo en formato GEXF
-    nx.write_gexf(G, 'rt.gexf')
-
-
-
+    # Prefiltro sobre los bytes crudos para no decodificar tweets sin hashtags buscados
+    prefiltro = compilar_prefiltro(hashtags_a_buscar)
+
+    # Con --pbz2 los bloques de cada archivo se descomprimen en varios procesos
+    ejecutor_bz2 = ProcessPoolExecutor(trabajadores_bz2) if trabajadores_bz2 > 1 and trabajadores == 1 else None
+
+    # Líneas leídas de cada archivo procesado, para el índice
+    lineas_por_archivo = {}
+    if indice_archivos:
+        bytes_totales = sum(tamanos.get(origenes.get(ruta), 0) for ruta in archivos_a_procesar) or 1
+        bytes_leidos = 0
+
+    ejecutor = None
+    if trabajadores > 1:
+        # Con --workers cada archivo se filtra y se agrega en un proceso del
+        # pool; los resultados llegan en el orden de los archivos y se combinan
+        # aquí, así la salida es la misma que en un solo proceso. Los procesos
+        # eligen el mismo backend JSON al arrancar: con spawn o forkserver no
+        # heredan el que se eligió en este
+        ejecutor = ProcessPoolExecutor(trabajadores, initializer=json_backend.usar_backend,
+                                       initargs=(backend_json, json_compatible))
+        resultados = filtrar_en_orden(ejecutor, (
+            (ruta_archivo, origenes.get(ruta_archivo, ruta_archivo), hashtags_a_buscar, fecha_inicial, fecha_final,
+             prefiltro, cache, not en_memoria)
+            for ruta_archivo in archivos_a_procesar if ruta_archivo.endswith(".bz2")), 2 * trabajadores)
+
+    for numero, ruta_archivo in enumerate(archivos_a_procesar, 1):
+        if ruta_archivo.endswith(".bz2") and ejecutor:
+            with etapa('filtrado') as registro:
+                tweets_archivo, rt_archivo, menciones_archivo, leidas = next(resultados)
+                registro['tweets'] += len(tweets_archivo or ())
+                registro['bytes'] += os.path.getsize(ruta_archivo)
+            with etapa('agregacion'):
+                if memoria_externa:
+                    retweet_data.combinar(rt_archivo)
+                    mention_data.combinar(menciones_archivo)
+                else:
+                    combinar_retweets(retweet_data, rt_archivo)
+                    combinar_menciones(mention_data, menciones_archivo)
+            if leidas is not None:
+                lineas_por_archivo[ruta_archivo] = leidas
+            if cache:
+                estadisticas_cache['fallos' if leidas is not None else 'aciertos'] += 1
+        elif ruta_archivo.endswith(".bz2"):
+            # Con --cache los tweets filtrados de cada archivo se reutilizan
+            # mientras no cambien el archivo original ni los filtros
+            with etapa('filtrado') as registro:
+                tweets_archivo = cargar_o_calcular(
+                    cache, origenes.get(ruta_archivo, ruta_archivo), hashtags_a_buscar, fecha_inicial, fecha_final,
+                    lambda: merged_output(ruta_archivo, hashtags_a_buscar, fecha_inicial, fecha_final,
+                                          ejecutor_bz2, trabajadores_bz2, prefiltro, lineas_por_archivo))
+                registro['tweets'] += len(tweets_archivo)
+                registro['bytes'] += os.path.getsize(ruta_archivo)
+            # Los agregados de retweets y menciones se arman en la misma pasada
+            with etapa('agregacion'):
+                if memoria_externa:
+                    # Cada archivo se agrega aparte y se suma al agregado externo
+                    rt_archivo, menciones_archivo = agregar_tweets(tweets_archivo)
+                    retweet_data.combinar(rt_archivo)
+                    mention_data.combinar(menciones_archivo)
+                else:
+                    agregar_tweets(tweets_archivo, retweet_data, mention_data)
+        else:
+            continue
+        if not en_memoria:
+            with etapa('escritura_merged') as registro:
+                if columnar:
+                    guardar_parte(tweets_archivo, ruta_columnar, numero, columnar)
+                else:
+                    escritor_merged.agregar(tweets_archivo)
+                registro['tweets'] += len(tweets_archivo)
+        if indice_archivos:
+            bytes_leidos += tamanos.get(origenes.get(ruta_archivo), 0)
+            leidas = lineas_por_archivo.get(ruta_archivo)
+            print(f"[{numero}/{len(archivos_a_procesar)}] {os.path.basename(ruta_archivo)}: "
+                  f"{'cached' if leidas is None else f'{leidas} lines'}, {bytes_leidos / bytes_totales:.0%} of input")
 
+    if ejecutor_bz2:
+        ejecutor_bz2.shutdown()
+    if ejecutor:
+        ejecutor.shutdown()
+    if cache:
+        print(f"Cache: {estadisticas_cache['aciertos']} hits, {estadisticas_cache['fallos']} misses")
+    if indice_archivos:
+        registrar_tweets(conexion_indice, {origenes[ruta]: cantidad for ruta, cantidad in lineas_por_archivo.items() if ruta in origenes})
+        conexion_indice.close()
 
-    # Cargar el archivo JSON
-    with open('merged_output.json', 'r', encoding='utf-8') as file:
-        data = json.load(file)
+    if escritor_merged:
+        with etapa('escritura_merged'):
+            escritor_merged.cerrar()
 
-    # Diccionario para almacenar las menciones por usuario
-    mention_data = {}
+    with etapa('rt'):
+        # Crear la estructura final del JSON
+        rt_data = estructura_rt(retweet_data)
 
-    # Procesar los tweets en busca de menciones
-    for tweet in data:
-        user_mentioned = tweet.get('entities', {}).get('user_mentions')
-        if user_mentioned:  # Verificar si hay menciones en el tweet
-            for mention in user_mentioned:
-                mentioned_user = mention['screen_name']
-                mention_by_user = tweet['user']['screen_name']
-                tweet_id = tweet['id_str']
-
-                if mentioned_user not in mention_data:
-                    mention_data[mentioned_user] = {
-                        'receivedMentions': 0,
-                        'mentions': []
-                    }
-
-                mention_data[mentioned_user]['receivedMentions'] += 1
-
-                mention_info = {
-                    'mentionBy': mention_by_user,
-                    'tweets': [tweet_id]
-                }
-
-                # Si ya hay menciones previas del usuario
-                existing_mentions = mention_data[mentioned_user]['mentions']
-                user_mention = next((item for item in existing_mentions if item['mentionBy'] == mention_by_user), None)
-                if user_mention:
-                    user_mention['tweets'].append(tweet_id)
-                else:
-                    mention_data[mentioned_user]['mentions'].append(mention_info)
-
-    # Ordenar los usuarios por el total de menciones recibidas
-    sorted_mention_data = sorted(mention_data.items(), key=lambda x: x[1]['receivedMentions'], reverse=True)
+        if json_pedidos['rt']:
+            # Guardar el JSON en el archivo rt.json, de a un usuario
+            json_backend.guardar_json_en_partes('retweets', rt_data['retweets'], 'rt.json', indent=4, ensure_ascii=False,
+                                                compacto=json_compacto, compresion=compresion_json)
 
-    # Crear la estructura final del JSON
-    final_mentions = []
+    with etapa('grafo_rt'):
+        # Construir el grafo como lista de aristas compacta
+        G = grafo_rt(rt_data)
 
-    for user, user_data in sorted_mention_data:
-        mentions_info = {
-            'username': user,
-            'receivedMentions': user_data['receivedMentions'],
-            'mentions': user_data['mentions']
-        }
-        final_mentions.append(mentions_info)
+        # Guardar el grafo en formato GEXF
+        guardar_gexf(G, 'rt.gexf', gexf_gz)
 
-    final_json = {'mentions': final_mentions}
 
-    # Guardar el JSON en el archivo mencion.json
-    with open('mencion.json', 'w', encoding='utf-8') as outfile:
-        json.dump(final_json, outfile, indent=4, ensure_ascii=False)
 
-    # Cargar los datos desde el archivo mencion.json
-    with open('mencion.json', 'r', encoding='utf-8') as file:
-        mention_data = json.load(file)
 
-    # Crear un grafo dirigido
-    mention_graph = nx.DiGraph()
 
-    # Iterar sobre cada usuario y sus menciones
-    for user_mention in mention_data['mentions']:
-        username = user_mention['username']
-        mentions = user_mention['mentions']
+    with etapa('menciones'):
+        # Crear la estructura final del JSON, con los usuarios más mencionados primero
+        mention_data = estructura_menciones(mention_data)
 
-        # Agregar nodos al grafo
-        mention_graph.add_node(username)
+        if json_pedidos['mencion']:
+            # Guardar el JSON en el archivo mencion.json, de a un usuario
+            json_backend.guardar_json_en_partes('mentions', mention_data['mentions'], 'mencion.json', indent=4, ensure_ascii=False,
+                                                compacto=json_compacto, compresion=compresion_json)
 
-        # Agregar las menciones como aristas
-        for mention in mentions:
-            mention_by = mention['mentionBy']
-            mention_graph.add_edge(mention_by, username)
+    with etapa('grafo_menciones'):
+        # Construir el grafo sin los usuarios no mencionados
+        mention_graph = grafo_menciones(mention_data)
 
-    # Verificar si el grafo tiene componentes conectados (usuarios no mencionados)
-    isolated_nodes = list(nx.isolates(mention_graph))
+        # Exportar el grafo a un archivo GEXF
+        guardar_gexf(mention_graph, 'mencion.gexf', gexf_gz)
 
-    # Eliminar usuarios no mencionados
-    mention_graph.remove_nodes_from(isolated_nodes)
 
-    # Exportar el grafo a un archivo GEXF
-    nx.write_gexf(mention_graph, 'mencion.gexf')
 
 
 
+    with etapa('coretweets'):
+        # Usuarios presentes y quién retuiteó a cada uno
+        all_users, retweets_dict = retweeters_por_autor(retweet_data)
 
+        # Encontrar usuarios comunes que retuitearon a cualquier par de usuarios
+        pares = calcular_coretweets(retweets_dict, all_users, motor_crt, max_fanout_crt)
+        if top_crt:
+            # Solo se conservan los pares con más coretweets, sin armar la lista completa
+            pares = heapq.nlargest(top_crt, pares, key=lambda par: len(par[1]))
 
-    # Cargar el archivo JSON
-    with open('rt.json', 'r', encoding='utf-8') as file:
-        data = json.load(file)
+        # Crear un diccionario con la lista de coretweets, de mayor a menor
+        coretweets_data = estructura_coretweets(pares)
 
-    # Crear una lista de todos los usuarios presentes
-    all_users = set()
-    for retweet_info in data['retweets']:
-        all_users.add(retweet_info['username'])
+        if json_pedidos['crt']:
+            # Guardar los datos en un archivo corrtw.json
+            json_backend.guardar_json_en_partes('coretweets', coretweets_data['coretweets'], 'corrtw.json', indent=4,
+                                                compacto=json_compacto, compresion=compresion_json)
 
-    # Crear un diccionario para mantener un registro de quién retuiteó a quién
-    retweets_dict = {user: set() for user in all_users}
+    with etapa('grafo_coretweets'):
+        # Construir el grafo con el peso de cada par de autores
+        G = grafo_coretweets(coretweets_data)
 
-    # Llenar el diccionario con los retweets por cada usuario
-    for retweet_info in data['retweets']:
-        username = retweet_info['username']
-        tweets = retweet_info.get('tweets', {})
+        # Exportar el grafo a un archivo corrtw.gexf
+        guardar_gexf(G, 'corrtw.gexf', gexf_gz)
 
-        # Comprobar si 'tweets' es una lista o un diccionario
-        if isinstance(tweets, list):
-            for tweet in tweets:
-                retweeted_by = tweet.get('retweetedBy', [])
-                retweets_dict[username].update(retweeted_by)
-        else:
-            for tweet_id, retweeted_by in tweets.items():
-                retweets_dict[username].update(retweeted_by['retweetedBy'])
-
-    # Encontrar usuarios comunes que retuitearon a cualquier par de usuarios
-    usuarios_comunes_por_par = {}
-    for user1 in all_users:
-        for user2 in all_users:
-            if user1 != user2:
-                common_retweeters = retweets_dict[user1].intersection(retweets_dict[user2])
-                if len(common_retweeters) > 0:
-                    usuarios_comunes_por_par[(user1, user2)] = list(common_retweeters)
-
-    # Crear una lista de coretweets en el formato requerido
-    coretweets_list = []
-    for usuarios, retweeters in usuarios_comunes_por_par.items():
-        coretweet = {
-            "authors": {
-                "u1": usuarios[0],
-                "u2": usuarios[1]
-            },
-            "totalCoretweets": len(retweeters),
-            "retweeters": retweeters
-        }
-        coretweets_list.append(coretweet)
-
-    # Ordenar los coretweets de mayor a menor por el total de retweeters
-    coretweets_list = sorted(coretweets_list, key=lambda x: x['totalCoretweets'], reverse=True)
-
-    # Crear un diccionario con la lista de coretweets
-    coretweets_dict = {"coretweets": coretweets_list}
-
-    # Guardar los datos en un archivo corrtw.json
-    with open('corrtw.json', 'w', encoding='utf-8') as file:
-        json.dump(coretweets_dict, file, indent=4)
-
-    # Cargar los datos de coretweets desde corrtw.json
-    with open('corrtw.json', 'r', encoding='utf-8') as file:
-        coretweets_data = json.load(file)
-
-    # Crear un grafo dirigido
-    G = nx.DiGraph()
-
-    # Agregar nodos y aristas al grafo
-    for coretweet in coretweets_data['coretweets']:
-        u1 = coretweet['authors']['u1']
-        u2 = coretweet['authors']['u2']
-        retweeters = coretweet['retweeters']
-
-        G.add_edge(u1, u2, weight=len(retweeters))
-
-    # Exportar el grafo a un archivo corrtw.gexf
-    nx.write_gexf(G, 'corrtw.gexf')
+    if memoria_externa:
+        shutil.rmtree(carpeta_externa)
 
     carpeta_a_eliminar = os.path.join(directorio_destino)
     if os.path.exists(carpeta_a_eliminar):
@@ -500,6 +407,13 @@ def main(argv):
     tiempo_transcurridoT = tiempo_finT - tiempo_inicioT
     print(f"Time: {tiempo_transcurridoT} seconds")
 
+    if archivo_metricas or perfilador:
+        por_rank = [metricas()]
+        mostrar_metricas(por_rank)
+        if archivo_metricas:
+            guardar_metricas(archivo_metricas, por_rank, script='sequential', argv=argv, total=tiempo_transcurridoT)
+        guardar_perfiles()
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+import os
+import shutil
+
+# Cómo se preparan los archivos de entrada antes de procesarlos:
+# copia: se copian al directorio de destino (comportamiento original)
+# directo: se leen en su lugar, sin copiar nada
+# simbolico / duro: se crean enlaces simbólicos o duros en el directorio de destino
+MODOS_ENTRADA = ('copia', 'directo', 'simbolico', 'duro')
+
+
+def validar_modo_entrada(modo):
+    if modo not in MODOS_ENTRADA:
+        raise ValueError(f"Unknown input mode: {modo} (expected one of {', '.join(MODOS_ENTRADA)})")
+    return modo
+
+
+def _enlazar(archivo, destino, modo):
+    if modo == 'copia':
+        shutil.copy(archivo, destino)
+    elif modo == 'simbolico':
+        os.symlink(os.path.abspath(archivo), destino)
+    else:
+        try:
+            os.link(archivo, destino)
+        except OSError:
+            # Los enlaces duros no cruzan sistemas de archivos
+            os.symlink(os.path.abspath(archivo), destino)
+
+
+def preparar_entrada(archivos, directorio_destino, modo='copia', origenes=None):
+    # Devuelve las rutas a procesar. En los modos con directorio de destino se
+    # procesa todo lo que haya en él, en el orden del directorio, como antes.
+    # Si se pasa `origenes`, se completa con {ruta a procesar: ruta original}.
+    validar_modo_entrada(modo)
+    if modo == 'directo':
+        # Cada ruta es única, así que no hace falta renombrar nada
+        if origenes is not None:
+            origenes.update((archivo, archivo) for archivo in archivos)
+        return list(archivos)
+    os.makedirs(directorio_destino, exist_ok=True)
+    # Los nombres ocupados se llevan en memoria en lugar de consultar el disco
+    # con os.path.exists por cada intento
+    usados = set(os.listdir(directorio_destino))
+    for archivo in archivos:
+        nombre_archivo = os.path.basename(archivo)
+        nombre_sin_extension, extension = os.path.splitext(nombre_archivo)
+        contador = 1
+        nuevo_nombre = nombre_archivo
+        while nuevo_nombre in usados:
+            nuevo_nombre = f"{nombre_sin_extension}_{contador}{extension}"
+            contador += 1
+        usados.add(nuevo_nombre)
+        destino = os.path.join(directorio_destino, nuevo_nombre)
+        _enlazar(archivo, destino, modo)
+        if origenes is not None:
+            origenes[destino] = archivo
+    return [os.path.join(directorio_destino, archivo) for archivo in os.listdir(directorio_destino) if archivo.endswith(".bz2")]
@@ -0,0 +1,213 @@
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from twitter_data_utils import parsear_opciones
+from twitter_data_sintetico import PARAMETROS_POR_DEFECTO, generar_archivos
+from twitter_data_archivos import validar_modo_entrada
+
+# Mide por separado cada etapa del script paralelo (encontrar_archivos,
+# merged_output, crearRT, crearMencion, crearCRT y cada crearGrafo*) sobre
+# archivos sintéticos, a varias escalas y cantidades de procesos MPI, y
+# guarda los tiempos en JSON para comparar versiones.
+#
+# python twitter_data_benchmark.py [-t 1000,10000] [-r 1,2,4] [-a 24]
+#     [-o benchmark.json] [--datos benchmark_datos] [--repeticiones 1]
+#     [--mpi "mpiexec"] [--entrada copia] [parámetros del generador: -u, -s,
+#     --hashtags, --retweets, --menciones, --semilla]
+#
+# Cada medición corre en un proceso aparte (mpiexec -n R python
+# twitter_data_benchmark.py --medir <datos> ...). Los datos de cada escala se
+# generan una vez y se reutilizan mientras no cambien los parámetros. La
+# etapa encontrar_archivos incluye la copia (o los enlaces) de los archivos
+# según --entrada, como en una corrida normal.
+
+ETAPAS = ['encontrar_archivos', 'merged_output', 'crearRT', 'crearGrafoRT',
+          'crearMencion', 'crearGrafoMencion', 'crearCRT', 'crearGrafoCRT']
+
+
+def medir_etapas(directorio, ruta_hashtags, comm, modo_entrada='copia'):
+    # Corre las etapas como el script paralelo y devuelve (en el proceso 0)
+    # los segundos de cada una. Los archivos intermedios (y las copias de la
+    # entrada) se escriben en el directorio actual.
+    import twitter_data_analysis_parallel as paralelo
+    import twitter_data_json as json_backend
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    json_backend.usar_backend()
+    tiempos = {}
+    resultados = {}
+
+    def etapa(nombre, funcion, todos=False):
+        # Con todos=False solo trabaja el proceso 0; el tiempo incluye la
+        # espera al más lento
+        comm.Barrier()
+        inicio = time.perf_counter()
+        if todos or rank == 0:
+            resultados[nombre] = funcion()
+        comm.Barrier()
+        tiempos[nombre] = time.perf_counter() - inicio
+
+    with open(ruta_hashtags) as archivo:
+        hashtags_a_buscar = [linea.strip() for linea in archivo if linea.strip()]
+    prefiltro = paralelo.compilar_prefiltro(hashtags_a_buscar)
+
+    etapa('encontrar_archivos', lambda: paralelo.encontrar_archivos(directorio, ruta_hashtags, '', '', modo_entrada))
+    archivos = resultados.get('encontrar_archivos')
+    chunks = [archivos[i::size] for i in range(size)] if rank == 0 else None
+    propios = comm.scatter(chunks, root=0)
+
+    def filtrar():
+        tweets = []
+        for archivo in propios:
+            tweets.extend(paralelo.merged_output(archivo, hashtags_a_buscar, None, None, prefiltro=prefiltro))
+        return tweets
+
+    etapa('merged_output', filtrar, todos=True)
+    partes = comm.gather(resultados['merged_output'], root=0)
+    if rank == 0:
+        tweets = [tweet for parte in partes for tweet in parte]
+        json_backend.guardar_json(tweets, 'merged_outputp.json', ensure_ascii=False, indent=2)
+        resultados['tweets_filtrados'] = len(tweets)
+        del tweets
+    del partes, resultados['merged_output']
+
+    etapa('crearRT', lambda: paralelo.crearRT('merged_outputp.json'))
+    etapa('crearGrafoRT', lambda: paralelo.crearGrafoRT('rtp.json', resultados['crearRT']))
+    etapa('crearMencion', lambda: paralelo.crearMencion('merged_outputp.json'))
+    etapa('crearGrafoMencion', lambda: paralelo.crearGrafoMencion('mencionp.json', resultados['crearMencion']))
+    etapa('crearCRT', lambda: paralelo.crearCRT('rtp.json', comm=comm), todos=True)
+    etapa('crearGrafoCRT', lambda: paralelo.crearGrafoCRT('corrtwp.json', resultados['crearCRT']))
+    if rank == 0:
+        return {
+            'archivos': len(archivos),
+            'entrada': modo_entrada,
+            'bytes': sum(os.path.getsize(archivo) for archivo in archivos),
+            'tweets_filtrados': resultados['tweets_filtrados'],
+            'coretweets': sum(1 for _ in resultados['crearCRT']['coretweets']),
+            'etapas': tiempos,
+        }
+    return None
+
+
+def preparar_datos(directorio, parametros):
+    # Genera los archivos de una escala salvo que ya estén con los mismos parámetros
+    ruta_parametros = os.path.join(directorio, 'parametros.json')
+    if os.path.exists(ruta_parametros):
+        with open(ruta_parametros) as archivo:
+            if json.load(archivo) == parametros:
+                return os.path.join(directorio, 'hashtags.txt')
+    for nombre in os.listdir(directorio) if os.path.isdir(directorio) else []:
+        if nombre.endswith('.json.bz2'):
+            os.remove(os.path.join(directorio, nombre))
+    ruta_hashtags = generar_archivos(directorio, parametros)
+    with open(ruta_parametros, 'w') as archivo:
+        json.dump(parametros, archivo)
+    return ruta_hashtags
+
+
+def version_codigo():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def correr_medicion(lanzador, ranks, directorio, modo_entrada='copia'):
+    # Una medición en un proceso (o grupo MPI) nuevo; devuelve su resultado
+    with tempfile.TemporaryDirectory() as trabajo:
+        ruta_resultado = os.path.join(trabajo, 'resultado.json')
+        comando = [sys.executable, os.path.abspath(__file__), '--medir', os.path.abspath(directorio),
+                   '--resultado', ruta_resultado, '--entrada', modo_entrada]
+        if ranks > 1 or lanzador:
+            comando = shlex.split(lanzador or 'mpiexec') + ['-n', str(ranks)] + comando
+        subprocess.run(comando, cwd=trabajo, check=True, stdout=subprocess.DEVNULL)
+        with open(ruta_resultado) as archivo:
+            return json.load(archivo)
+
+
+def main(argv):
+    escalas = [1000, 10000]
+    cantidades_ranks = [1, 2, 4]
+    salida = 'benchmark.json'
+    datos = 'benchmark_datos'
+    repeticiones = 1
+    lanzador = ''
+    modo_entrada = 'copia'
+    parametros = dict(PARAMETROS_POR_DEFECTO)
+    medir = None
+    ruta_resultado = None
+    for opt, arg in parsear_opciones(argv):
+        if opt == '-t':
+            escalas = [int(escala) for escala in arg.split(',')]
+        if opt == '-r':
+            cantidades_ranks = [int(ranks) for ranks in arg.split(',')]
+        if opt == '-a':
+            parametros['archivos'] = int(arg)
+        if opt == '-u':
+            parametros['usuarios'] = int(arg)
+        if opt == '-s':
+            parametros['sesgo'] = float(arg)
+        if opt in ('--hashtags', '--retweets', '--menciones'):
+            parametros[opt[2:]] = float(arg)
+        if opt == '--semilla':
+            parametros['semilla'] = int(arg)
+        if opt == '-o':
+            salida = arg
+        if opt == '--datos':
+            datos = arg
+        if opt == '--repeticiones':
+            repeticiones = int(arg)
+        if opt == '--mpi':
+            lanzador = arg
+        if opt == '--entrada':
+            modo_entrada = arg or 'copia'
+        if opt == '--medir':
+            medir = arg
+        if opt == '--resultado':
+            ruta_resultado = arg
+
+    validar_modo_entrada(modo_entrada)
+
+    if medir:
+        from mpi4py import MPI
+        resultado = medir_etapas(medir, os.path.join(medir, 'hashtags.txt'), MPI.COMM_WORLD, modo_entrada)
+        if resultado is not None:
+            with open(ruta_resultado, 'w') as archivo:
+                json.dump(resultado, archivo)
+        return
+
+    reporte = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'version': version_codigo(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'parametros': {clave: valor for clave, valor in parametros.items() if clave != 'tweets'},
+        'entrada': modo_entrada,
+        'resultados': [],
+    }
+    print(f"{'tweets/file':>11} {'ranks':>5} " + ' '.join(f"{etapa:>18}" for etapa in ETAPAS))
+    for escala in escalas:
+        directorio = os.path.join(datos, f"t{escala}")
+        preparar_datos(directorio, {**parametros, 'tweets': escala})
+        for ranks in cantidades_ranks:
+            mediciones = [correr_medicion(lanzador, ranks, directorio, modo_entrada) for _ in range(repeticiones)]
+            # De varias repeticiones se queda el menor tiempo de cada etapa
+            resultado = mediciones[0]
+            resultado['etapas'] = {etapa: min(m['etapas'][etapa] for m in mediciones) for etapa in ETAPAS}
+            reporte['resultados'].append({'tweets_por_archivo': escala, 'ranks': ranks, **resultado})
+            print(f"{escala:>11} {ranks:>5} " + ' '.join(f"{resultado['etapas'][etapa]:>18.3f}" for etapa in ETAPAS))
+            # Se guarda después de cada medición para no perder lo medido si algo falla
+            with open(salida, 'w') as archivo:
+                json.dump(reporte, archivo, indent=2)
+    print(f"Results written to {salida}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
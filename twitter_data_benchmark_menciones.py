@@ -0,0 +1,111 @@
+import random
+import sys
+import time
+from twitter_data_utils import parsear_opciones
+from twitter_data_aggregates import agregar_menciones, usuarios_menciones
+
+# Compara el agregado de menciones original (busca a quien menciona
+# recorriendo la lista de menciones del usuario) con el actual (diccionario
+# por quien menciona) sobre tweets sintéticos donde pocas cuentas reciben
+# casi todas las menciones. Con el original el tiempo por mención crece con
+# la cantidad de menciones; con el actual se mantiene constante.
+#
+# python twitter_data_benchmark_menciones.py [-n 10000,20000,40000,80000]
+#     [-s 1.2] [-u 50000] [--sin-original]
+
+
+def tweets_sinteticos(cantidad, usuarios=50000, sesgo=1.2, semilla=0):
+    # Los mencionados siguen una ley de Zipf con exponente `sesgo`; quien
+    # menciona sale de forma uniforme de `usuarios` cuentas
+    generador = random.Random(semilla)
+    pesos = [1 / (rango + 1) ** sesgo for rango in range(usuarios)]
+    mencionados = generador.choices(range(usuarios), weights=pesos, k=cantidad)
+    tweets = []
+    for numero, mencionado in enumerate(mencionados):
+        tweets.append({
+            'id_str': str(numero),
+            'user': {'screen_name': f"user{generador.randrange(usuarios)}"},
+            'entities': {'user_mentions': [{'screen_name': f"user{mencionado}"}]},
+        })
+    return tweets
+
+
+def menciones_original(data):
+    # Versión original de crearMencion (sin la lectura ni la escritura del JSON)
+    mention_data = {}
+    for tweet in data:
+        user_mentioned = tweet.get('entities', {}).get('user_mentions')
+        if user_mentioned:
+            for mention in user_mentioned:
+                mentioned_user = mention['screen_name']
+                mention_by_user = tweet['user']['screen_name']
+                tweet_id = tweet['id_str']
+                if mentioned_user not in mention_data:
+                    mention_data[mentioned_user] = {
+                        'receivedMentions': 0,
+                        'mentions': []
+                    }
+                mention_data[mentioned_user]['receivedMentions'] += 1
+                mention_info = {
+                    'mentionBy': mention_by_user,
+                    'tweets': [tweet_id]
+                }
+                existing_mentions = mention_data[mentioned_user]['mentions']
+                user_mention = next((item for item in existing_mentions if item['mentionBy'] == mention_by_user), None)
+                if user_mention:
+                    user_mention['tweets'].append(tweet_id)
+                else:
+                    mention_data[mentioned_user]['mentions'].append(mention_info)
+    sorted_mention_data = sorted(mention_data.items(), key=lambda x: x[1]['receivedMentions'], reverse=True)
+    final_mentions = []
+    for user, user_data in sorted_mention_data:
+        final_mentions.append({
+            'username': user,
+            'receivedMentions': user_data['receivedMentions'],
+            'mentions': user_data['mentions']
+        })
+    return {'mentions': final_mentions}
+
+
+def menciones_actual(data):
+    return {'mentions': list(usuarios_menciones(agregar_menciones(data)))}
+
+
+def medir(funcion, data):
+    inicio = time.perf_counter()
+    resultado = funcion(data)
+    return time.perf_counter() - inicio, resultado
+
+
+def main(argv):
+    cantidades = [10000, 20000, 40000, 80000]
+    sesgo = 1.2
+    usuarios = 50000
+    con_original = True
+    for opt, arg in parsear_opciones(argv):
+        if opt == '-n':
+            cantidades = [int(cantidad) for cantidad in arg.split(',')]
+        if opt == '-s':
+            sesgo = float(arg)
+        if opt == '-u':
+            usuarios = int(arg)
+        if opt == '--sin-original':
+            con_original = False
+
+    print(f"{'tweets':>10} {'top mentioners':>15} {'original (s)':>13} {'us/mention':>11} {'dict (s)':>10} {'us/mention':>11}")
+    for cantidad in cantidades:
+        data = tweets_sinteticos(cantidad, usuarios, sesgo)
+        tiempo_actual, actual = medir(menciones_actual, data)
+        mas_mencionado = len(actual['mentions'][0]['mentions']) if actual['mentions'] else 0
+        columnas_original = f"{'-':>13} {'-':>11}"
+        if con_original:
+            tiempo_original, original = medir(menciones_original, data)
+            if original != actual:
+                raise ValueError(f"Different mention output for {cantidad} tweets")
+            columnas_original = f"{tiempo_original:>13.3f} {tiempo_original / cantidad * 1e6:>11.2f}"
+        print(f"{cantidad:>10} {mas_mencionado:>15} {columnas_original} "
+              f"{tiempo_actual:>10.3f} {tiempo_actual / cantidad * 1e6:>11.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
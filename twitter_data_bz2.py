@@ -0,0 +1,130 @@
+import bz2
+import mmap
+import os
+from collections import deque
+from twitter_data_utils import leer_lineas
+
+# Marcas de 48 bits de bzip2: inicio de bloque (pi) y fin de stream (sqrt(pi))
+MAGIA_BLOQUE = 0x314159265359
+MAGIA_FIN = 0x177245385090
+# Por debajo de este tamaño (comprimido) no vale la pena repartir bloques
+TAMANO_MINIMO_PARALELO = 4 * 1024 * 1024
+
+
+def _patrones(magia):
+    # Para cada desplazamiento de bit (0-7) se guardan los bytes completos que
+    # ocupa la marca, que son los que se pueden buscar con find()
+    patrones = []
+    for desplazamiento in range(8):
+        ventana = (magia << (8 - desplazamiento)).to_bytes(7, 'big')
+        if desplazamiento == 0:
+            patrones.append((desplazamiento, ventana[:6], 0))
+        else:
+            patrones.append((desplazamiento, ventana[1:6], 1))
+    return patrones
+
+
+def _leer_bits(datos, posicion_bit, cantidad):
+    inicio = posicion_bit // 8
+    fin = (posicion_bit + cantidad + 7) // 8
+    valor = int.from_bytes(datos[inicio:fin], 'big')
+    sobrantes = fin * 8 - (posicion_bit + cantidad)
+    return (valor >> sobrantes) & ((1 << cantidad) - 1)
+
+
+def buscar_marcas(datos, magia):
+    # Devuelve las posiciones (en bits) donde aparece la marca de 48 bits
+    posiciones = []
+    total_bits = len(datos) * 8
+    for desplazamiento, patron, adelanto in _patrones(magia):
+        indice = datos.find(patron)
+        while indice != -1:
+            posicion_bit = (indice - adelanto) * 8 + desplazamiento
+            if posicion_bit >= 0 and posicion_bit + 48 <= total_bits:
+                if _leer_bits(datos, posicion_bit, 48) == magia:
+                    posiciones.append(posicion_bit)
+            indice = datos.find(patron, indice + 1)
+    return sorted(posiciones)
+
+
+def _rangos_de_bloques(datos):
+    # Cada bloque va desde su marca hasta la siguiente marca de bloque o de fin
+    bloques = buscar_marcas(datos, MAGIA_BLOQUE)
+    fines = buscar_marcas(datos, MAGIA_FIN)
+    marcas = sorted(set(bloques) | set(fines))
+    siguiente = {marca: marcas[i + 1] for i, marca in enumerate(marcas[:-1])}
+    return [(inicio, siguiente[inicio]) for inicio in bloques if inicio in siguiente]
+
+
+def _descomprimir_bloque(tarea):
+    # Arma un stream bzip2 válido con un único bloque y lo descomprime.
+    # Con un solo bloque el CRC combinado del stream es el CRC del bloque.
+    datos, desplazamiento, cantidad_bits = tarea
+    bits = int.from_bytes(datos, 'big')
+    bits >>= len(datos) * 8 - desplazamiento - cantidad_bits
+    bits &= (1 << cantidad_bits) - 1
+    crc = (bits >> (cantidad_bits - 80)) & 0xFFFFFFFF
+    stream = (((bits << 48) | MAGIA_FIN) << 32) | crc
+    total_bits = cantidad_bits + 80
+    relleno = -total_bits % 8
+    stream <<= relleno
+    return bz2.decompress(b'BZh9' + stream.to_bytes((total_bits + relleno) // 8, 'big'))
+
+
+def _tarea(datos, inicio, fin):
+    return (bytes(datos[inicio // 8:(fin + 7) // 8]), inicio % 8, fin - inicio)
+
+
+def _descomprimir_en_orden(datos, rangos, ejecutor, en_vuelo):
+    # Entrega el contenido de cada bloque en orden, manteniendo como máximo
+    # `en_vuelo` bloques pendientes para no acumular resultados en memoria
+    pendientes = deque()
+    siguiente = 0
+    i = 0
+    while i < len(rangos):
+        while siguiente < len(rangos) and len(pendientes) < en_vuelo:
+            inicio, fin = rangos[siguiente]
+            pendientes.append(ejecutor.submit(_descomprimir_bloque, _tarea(datos, inicio, fin)))
+            siguiente += 1
+        futuro = pendientes.popleft()
+        try:
+            yield futuro.result()
+            i += 1
+            continue
+        except (OSError, ValueError, EOFError):
+            pass
+        # La marca pudo aparecer por azar dentro de los datos comprimidos: se
+        # une el bloque con los siguientes hasta que descomprima correctamente
+        for j in range(i + 1, len(rangos)):
+            try:
+                contenido = _descomprimir_bloque(_tarea(datos, rangos[i][0], rangos[j][1]))
+            except (OSError, ValueError, EOFError):
+                continue
+            for _ in range(j - i):
+                if pendientes:
+                    pendientes.popleft().cancel()
+                else:
+                    siguiente += 1
+            yield contenido
+            i = j + 1
+            break
+        else:
+            raise OSError("Invalid bz2 block structure")
+
+
+def leer_lineas_bz2_paralelo(ruta_archivo, ejecutor=None, trabajadores=1):
+    # Descomprime los bloques del archivo en paralelo y vuelve a unir las
+    # líneas que quedaron partidas entre un bloque y el siguiente
+    if ejecutor is None or os.path.getsize(ruta_archivo) < TAMANO_MINIMO_PARALELO:
+        with bz2.BZ2File(ruta_archivo, 'rb') as archivo_comprimido:
+            yield from leer_lineas(archivo_comprimido)
+        return
+
+    with open(ruta_archivo, 'rb') as archivo, mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+        rangos = _rangos_de_bloques(datos)
+        resto = b''
+        for contenido in _descomprimir_en_orden(datos, rangos, ejecutor, 2 * max(trabajadores, 1)):
+            lineas = (resto + contenido).split(b'\n')
+            resto = lineas.pop()
+            yield from leer_lineas(lineas)
+        yield from leer_lineas([resto])
@@ -0,0 +1,109 @@
+# Caché en disco de los tweets filtrados de cada archivo. La clave combina la
+# identidad del archivo original (ruta, tamaño y mtime) con los filtros
+# (hashtags y fechas), así una corrida con un día más o un hashtag distinto
+# solo procesa los archivos nuevos o los que cambiaron. Cada entrada es un
+# pickle; el mtime de la entrada marca su último uso y, al pasar el tamaño
+# máximo, se borran las usadas hace más tiempo.
+import hashlib
+import os
+import pickle
+import tempfile
+
+CACHE_POR_DEFECTO = 'cache_filtrado'
+TAMANO_MAXIMO_POR_DEFECTO = 2 * 1024 ** 3
+# Cambiar si cambia el formato de los tweets filtrados
+VERSION_CACHE = 1
+EXTENSION = '.pkl'
+
+# Aciertos y fallos del proceso actual
+estadisticas = {'aciertos': 0, 'fallos': 0}
+# Tamaño estimado de cada directorio de caché, para no recorrerlo en cada escritura
+_tamanos = {}
+
+
+def clave_cache(archivo, hashtags_a_buscar, fecha_inicial, fecha_final):
+    estado = os.stat(archivo)
+    partes = (VERSION_CACHE, os.path.realpath(archivo), estado.st_size, estado.st_mtime_ns,
+              sorted(set(hashtags_a_buscar)), str(fecha_inicial), str(fecha_final))
+    return hashlib.sha256(repr(partes).encode('utf-8')).hexdigest()
+
+
+def leer_cache(directorio, clave):
+    ruta = os.path.join(directorio, clave + EXTENSION)
+    try:
+        with open(ruta, 'rb') as entrada:
+            datos = pickle.load(entrada)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError):
+        # Entrada dañada (por ejemplo una corrida que se cortó): se descarta
+        return None
+    try:
+        os.utime(ruta)
+    except OSError:
+        pass
+    return datos
+
+
+def guardar_cache(directorio, clave, datos, tamano_maximo=TAMANO_MAXIMO_POR_DEFECTO):
+    os.makedirs(directorio, exist_ok=True)
+    # Se escribe en un temporal y se renombra para que otro proceso nunca lea
+    # una entrada a medio escribir
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as salida:
+        pickle.dump(datos, salida, protocol=pickle.HIGHEST_PROTOCOL)
+    ruta = os.path.join(directorio, clave + EXTENSION)
+    os.replace(temporal, ruta)
+    if directorio not in _tamanos:
+        _tamanos[directorio] = recortar_cache(directorio, tamano_maximo)
+    else:
+        _tamanos[directorio] += os.path.getsize(ruta)
+        if _tamanos[directorio] > tamano_maximo:
+            _tamanos[directorio] = recortar_cache(directorio, tamano_maximo)
+
+
+def recortar_cache(directorio, tamano_maximo):
+    # Borra las entradas usadas hace más tiempo hasta quedar dentro del límite
+    # y devuelve el tamaño que queda
+    entradas = []
+    total = 0
+    with os.scandir(directorio) as contenido:
+        for entrada in contenido:
+            if entrada.name.endswith(EXTENSION):
+                try:
+                    estado = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                entradas.append((estado.st_mtime_ns, estado.st_size, entrada.path))
+                total += estado.st_size
+    entradas.sort()
+    for mtime, tamano, ruta in entradas:
+        if total <= tamano_maximo:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            # Otro proceso la borró primero
+            pass
+        total -= tamano
+    return total
+
+
+def cargar_o_calcular(cache, archivo, hashtags_a_buscar, fecha_inicial, fecha_final, calcular):
+    # cache es (directorio, tamaño máximo en bytes) o None para no usarla;
+    # calcular() devuelve los tweets filtrados de `archivo` cuando no están
+    if cache is None:
+        return calcular()
+    directorio, tamano_maximo = cache
+    if directorio not in _tamanos and os.path.isdir(directorio):
+        # Al empezar se aplica el límite, por si bajó desde la corrida anterior
+        _tamanos[directorio] = recortar_cache(directorio, tamano_maximo)
+    clave = clave_cache(archivo, hashtags_a_buscar, fecha_inicial, fecha_final)
+    datos = leer_cache(directorio, clave)
+    if datos is not None:
+        estadisticas['aciertos'] += 1
+        return datos
+    estadisticas['fallos'] += 1
+    datos = calcular()
+    guardar_cache(directorio, clave, datos, tamano_maximo)
+    return datos
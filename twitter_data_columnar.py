@@ -0,0 +1,127 @@
+# Versión columnar de los tweets filtrados (alternativa a merged_output.json).
+# Es un directorio con una parte por archivo o por proceso, en formato Arrow
+# IPC (se lee con memory map) o Parquet (comprimido, por grupos de filas). Las
+# etapas siguientes leen solo las columnas que usan.
+import os
+import shutil
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+FORMATOS = ('parquet', 'arrow')
+EXTENSIONES = {'parquet': '.parquet', 'arrow': '.arrow'}
+FILAS_POR_GRUPO = 64 * 1024
+
+# Columnas que necesita cada etapa
+COLUMNAS_RT = ['id_str', 'text', 'user_screen_name']
+COLUMNAS_MENCIONES = ['id_str', 'user_screen_name', 'mention_screen_names']
+
+if pa is not None:
+    ESQUEMA = pa.schema([
+        ('created_at', pa.string()),
+        ('id_str', pa.string()),
+        ('text', pa.string()),
+        ('user_id', pa.int64()),
+        ('user_name', pa.string()),
+        ('user_screen_name', pa.string()),
+        ('hashtags', pa.list_(pa.string())),
+        ('mention_screen_names', pa.list_(pa.string())),
+    ])
+
+
+def validar_formato(formato):
+    if formato not in FORMATOS:
+        raise ValueError(f"Unknown columnar format: {formato} (expected one of {', '.join(FORMATOS)})")
+    if pa is None:
+        raise ValueError("The columnar output requires pyarrow")
+    return formato
+
+
+def ruta_dataset(archivo_salida, formato):
+    # merged_output.json -> merged_output.parquet (directorio)
+    validar_formato(formato)
+    return os.path.splitext(archivo_salida)[0] + EXTENSIONES[formato]
+
+
+def preparar_dataset(ruta):
+    # Vacía el directorio de una corrida anterior antes de escribir las partes
+    if os.path.isdir(ruta):
+        shutil.rmtree(ruta)
+    elif os.path.exists(ruta):
+        os.remove(ruta)
+    os.makedirs(ruta)
+
+
+def tabla_de_tweets(tweets):
+    columnas = {nombre: [] for nombre in ESQUEMA.names}
+    for tweet in tweets:
+        user = tweet.get('user') or {}
+        entities = tweet.get('entities') or {}
+        columnas['created_at'].append(tweet.get('created_at'))
+        columnas['id_str'].append(tweet.get('id_str'))
+        columnas['text'].append(tweet.get('text'))
+        columnas['user_id'].append(user.get('id'))
+        columnas['user_name'].append(user.get('name'))
+        columnas['user_screen_name'].append(user.get('screen_name'))
+        columnas['hashtags'].append([hashtag['text'] for hashtag in entities.get('hashtags', [])])
+        columnas['mention_screen_names'].append([mention['screen_name'] for mention in entities.get('user_mentions', [])])
+    return pa.table(columnas, schema=ESQUEMA)
+
+
+def guardar_parte(tweets, ruta, numero, formato='parquet'):
+    # Escribe la parte `numero` del dataset; las partes se leen en orden de
+    # número. `numero` también puede ser una tupla, como (rank, archivo).
+    validar_formato(formato)
+    tabla = tabla_de_tweets(tweets)
+    numeros = numero if isinstance(numero, tuple) else (numero,)
+    archivo = os.path.join(ruta, f"part-{'-'.join(f'{n:06d}' for n in numeros)}{EXTENSIONES[formato]}")
+    if formato == 'parquet':
+        pq.write_table(tabla, archivo, row_group_size=FILAS_POR_GRUPO)
+    else:
+        # Sin compresión, para poder leerlo directamente del memory map
+        with pa.OSFile(archivo, 'wb') as salida, pa.ipc.new_file(salida, ESQUEMA) as escritor:
+            escritor.write_table(tabla, max_chunksize=FILAS_POR_GRUPO)
+
+
+def es_dataset(ruta):
+    return os.path.isdir(ruta) and os.path.splitext(ruta)[1] in EXTENSIONES.values()
+
+
+def leer_lotes(ruta, columnas=None):
+    # Entrega los datos por lotes (RecordBatch) con solo las columnas pedidas
+    if pa is None:
+        raise ValueError("Reading the columnar output requires pyarrow")
+    for nombre in sorted(os.listdir(ruta)):
+        archivo = os.path.join(ruta, nombre)
+        if nombre.endswith('.parquet'):
+            yield from pq.ParquetFile(archivo, memory_map=True).iter_batches(columns=columnas)
+        elif nombre.endswith('.arrow'):
+            with pa.memory_map(archivo) as mapa:
+                lector = pa.ipc.open_file(mapa)
+                for i in range(lector.num_record_batches):
+                    lote = lector.get_batch(i)
+                    yield lote.select(columnas) if columnas else lote
+
+
+def tweets_columnares(ruta, columnas=None):
+    # Reconstruye tweets con la forma de merged_output.json (solo los campos
+    # de las columnas leídas) para agregar_retweets y agregar_menciones
+    for lote in leer_lotes(ruta, columnas):
+        datos = lote.to_pydict()
+        for i in range(lote.num_rows):
+            tweet = {'user': {}, 'entities': {}}
+            for nombre, valores in datos.items():
+                valor = valores[i]
+                if nombre.startswith('user_'):
+                    tweet['user'][nombre[5:]] = valor
+                elif nombre == 'hashtags':
+                    tweet['entities']['hashtags'] = [{'text': hashtag} for hashtag in valor]
+                elif nombre == 'mention_screen_names':
+                    tweet['entities']['user_mentions'] = [{'screen_name': mention} for mention in valor]
+                else:
+                    tweet[nombre] = valor
+            yield tweet
@@ -0,0 +1,176 @@
+import heapq
+import zlib
+from twitter_data_utils import reducir_en_arbol
+from twitter_data_aggregates import Recorrido
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+MOTORES_CRT = ('auto', 'pares', 'sparse', 'indice')
+
+
+# Todos los motores reciben `autores_propios`: los índices (en orden
+# ascendente dentro de all_users) de los autores que hacen de user1. Por
+# defecto son todos; en MPI cada proceso recibe solo su parte.
+
+def pares_coretweet(retweets_dict, all_users, autores_propios=None):
+    # Algoritmo original: intersecta los retweeters de cada par ordenado de
+    # autores, así que el costo crece con el cuadrado de la cantidad de autores
+    usuarios = list(all_users)
+    if autores_propios is None:
+        autores_propios = range(len(usuarios))
+    for i in autores_propios:
+        user1 = usuarios[i]
+        for user2 in usuarios:
+            if user1 != user2:
+                common_retweeters = retweets_dict[user1].intersection(retweets_dict[user2])
+                if len(common_retweeters) > 0:
+                    yield (user1, user2), list(common_retweeters)
+
+
+def pares_coretweet_sparse(retweets_dict, all_users, autores_propios=None, filas_por_bloque=2048):
+    # Matriz de incidencia autor x retweeter: A @ A.T tiene en (i, j) la
+    # cantidad de retweeters en común, así que solo se recorren los pares con
+    # coretweets. Los pares salen en el mismo orden que en pares_coretweet
+    # (fila por fila y columnas ascendentes) y los retweeters se calculan con
+    # la misma intersección de conjuntos, por lo que el resultado es idéntico.
+    usuarios = list(all_users)
+    if autores_propios is None:
+        autores_propios = range(len(usuarios))
+    autores_propios = list(autores_propios)
+    indice_retweeter = {}
+    filas = []
+    columnas = []
+    for i, user in enumerate(usuarios):
+        for retweeter in retweets_dict[user]:
+            filas.append(i)
+            columnas.append(indice_retweeter.setdefault(retweeter, len(indice_retweeter)))
+    A = sparse.csr_matrix((np.ones(len(filas), dtype=np.int32), (filas, columnas)),
+                          shape=(len(usuarios), len(indice_retweeter)))
+    At = A.T.tocsr()
+    # Se multiplica por bloques de filas para acotar la memoria del producto
+    for inicio in range(0, len(autores_propios), filas_por_bloque):
+        filas_bloque = autores_propios[inicio:inicio + filas_por_bloque]
+        bloque = (A[filas_bloque] @ At).tocsr()
+        bloque.sort_indices()
+        indptr = bloque.indptr.tolist()
+        indices = bloque.indices.tolist()
+        for k, i in enumerate(filas_bloque):
+            user1 = usuarios[i]
+            retweeters1 = retweets_dict[user1]
+            for j in indices[indptr[k]:indptr[k + 1]]:
+                if j != i:
+                    user2 = usuarios[j]
+                    yield (user1, user2), list(retweeters1.intersection(retweets_dict[user2]))
+
+
+def pares_coretweet_indice(retweets_dict, all_users, autores_propios=None):
+    # Índice invertido retweeter -> autores: solo se generan los pares de
+    # autores que comparten algún retweeter, con un costo proporcional a la
+    # suma de los cuadrados de la cantidad de autores de cada retweeter.
+    # El orden de salida es el mismo que en pares_coretweet.
+    usuarios = list(all_users)
+    if autores_propios is None:
+        autores_propios = range(len(usuarios))
+    vecinos = {i: set() for i in autores_propios}
+    autores_por_retweeter = {}
+    for i, user in enumerate(usuarios):
+        for retweeter in retweets_dict[user]:
+            autores_por_retweeter.setdefault(retweeter, []).append(i)
+    for autores in autores_por_retweeter.values():
+        if len(autores) > 1:
+            for autor in autores:
+                if autor in vecinos:
+                    vecinos[autor].update(autores)
+    del autores_por_retweeter
+    for i in autores_propios:
+        user1 = usuarios[i]
+        retweeters1 = retweets_dict[user1]
+        vecinos[i].discard(i)
+        for j in sorted(vecinos.pop(i)):
+            user2 = usuarios[j]
+            yield (user1, user2), list(retweeters1.intersection(retweets_dict[user2]))
+
+
+def limitar_fanout(retweets_dict, max_fanout):
+    # Descarta los retweeters que retuitearon a más de `max_fanout` autores
+    # (bots, cuentas de difusión), que generan una cantidad cuadrática de pares
+    autores_por_retweeter = {}
+    for retweeters in retweets_dict.values():
+        for retweeter in retweeters:
+            autores_por_retweeter[retweeter] = autores_por_retweeter.get(retweeter, 0) + 1
+    excluidos = {retweeter for retweeter, total in autores_por_retweeter.items() if total > max_fanout}
+    if not excluidos:
+        return retweets_dict
+    return {user: retweeters - excluidos for user, retweeters in retweets_dict.items()}
+
+
+def calcular_coretweets(retweets_dict, all_users, motor='auto', max_fanout=None, autores_propios=None):
+    if motor not in MOTORES_CRT:
+        raise ValueError(f"Unknown coretweet engine: {motor} (expected one of {', '.join(MOTORES_CRT)})")
+    if max_fanout:
+        retweets_dict = limitar_fanout(retweets_dict, max_fanout)
+    if motor == 'auto':
+        motor = 'sparse' if sparse is not None else 'pares'
+    if motor == 'sparse':
+        if sparse is None:
+            raise ValueError("The sparse coretweet engine requires numpy and scipy")
+        return pares_coretweet_sparse(retweets_dict, all_users, autores_propios)
+    if motor == 'indice':
+        return pares_coretweet_indice(retweets_dict, all_users, autores_propios)
+    return pares_coretweet(retweets_dict, all_users, autores_propios)
+
+
+def coretweets_distribuidos(comm, retweets_dict, usuarios, motor='auto', top=None):
+    # Cada proceso calcula los pares cuyo user1 le toca según un hash estable
+    # del nombre y ordena su parte; luego las partes se mezclan en árbol. La
+    # clave (-total, i, j) reproduce el orden estable del algoritmo secuencial.
+    # Dentro de cada par los retweeters quedan en el orden de iteración del
+    # conjunto recibido por cada proceso, que puede variar respecto al del
+    # proceso 0 (igual que varía entre corridas). retweets_dict y usuarios solo
+    # hacen falta en el proceso 0.
+    retweets_dict = comm.bcast(retweets_dict, root=0)
+    usuarios = comm.bcast(usuarios, root=0)
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    posicion = {user: i for i, user in enumerate(usuarios)}
+    autores_propios = [i for i, user in enumerate(usuarios) if zlib.crc32(user.encode('utf-8')) % size == rank]
+
+    def clave(par):
+        return -len(par[1]), posicion[par[0][0]], posicion[par[0][1]]
+
+    pares = calcular_coretweets(retweets_dict, usuarios, motor, autores_propios=autores_propios)
+    if top:
+        pares_propios = heapq.nsmallest(top, pares, key=clave)
+    else:
+        pares_propios = sorted(pares, key=clave)
+    # k-way merge en paralelo: heapq.merge es estable y deja primero los pares
+    # de los procesos de rank menor
+    pares_ordenados = reducir_en_arbol(comm, pares_propios, lambda a, b: list(heapq.merge(a, b, key=clave)))
+    if pares_ordenados is not None and top:
+        pares_ordenados = pares_ordenados[:top]
+    return pares_ordenados
+
+
+def coretweets_en_orden(pares_ordenados):
+    # Elementos de 'coretweets' en corrtw.json, uno por uno
+    for usuarios, retweeters in pares_ordenados:
+        yield {
+            "authors": {
+                "u1": usuarios[0],
+                "u2": usuarios[1]
+            },
+            "totalCoretweets": len(retweeters),
+            "retweeters": retweeters
+        }
+
+
+def estructura_coretweets(pares):
+    # Estructura de corrtw.json, de mayor a menor cantidad de retweeters. Se
+    # ordenan los pares y cada elemento se arma al recorrer la lista.
+    pares_ordenados = sorted(dict(pares).items(), key=lambda par: len(par[1]), reverse=True)
+    return {"coretweets": Recorrido(coretweets_en_orden, pares_ordenados)}
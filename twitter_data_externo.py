@@ -0,0 +1,189 @@
+# Agregación externa de retweets y menciones, para ventanas de tiempo cuyos
+# agregados no entran en memoria. Los agregados parciales (de un archivo o de
+# un proceso) se combinan en memoria hasta un presupuesto y entonces se
+# vuelcan a disco como un run ordenado por usuario. Al final los runs se
+# mezclan por usuario (k-way merge), juntando las partes de cada uno en el
+# orden de los runs, y el resultado se vuelve a ordenar externamente por su
+# posición de salida: primera aparición del usuario en rt.json, y cantidad de
+# menciones y primera aparición en mencion.json. La salida es la misma que con
+# los diccionarios en memoria; la memoria queda acotada por el presupuesto más
+# los datos del usuario más grande.
+import heapq
+import os
+import pickle
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+from twitter_data_aggregates import combinar_retweets, combinar_menciones
+
+MEMORIA_POR_DEFECTO = 512   # MB por agregado
+# Estimación del tamaño de los agregados en memoria (medida con tracemalloc
+# sobre tweets sintéticos): cada retweet o mención agrega una referencia a una
+# lista y, en general, un id de tweet nuevo
+BYTES_POR_EVENTO = 200
+BYTES_POR_USUARIO = 200
+# Con más runs se mezclan primero de a grupos, para no abrir demasiados archivos
+MAXIMO_RUNS_POR_MEZCLA = 64
+REGISTROS_POR_BLOQUE = 1000
+
+TIPOS = {
+    'retweets': {'combinar': combinar_retweets, 'contador': 'receivedRetweets'},
+    'menciones': {'combinar': combinar_menciones, 'contador': 'receivedMentions'},
+}
+
+
+def _clave_salida(tipo, contador, orden, datos):
+    if tipo == 'menciones':
+        # Los más mencionados primero; entre iguales, el que apareció antes
+        return -datos[contador], orden
+    return orden
+
+
+class AgregadoExterno:
+    # Agregado de retweets o de menciones ('retweets' o 'menciones') con la
+    # misma interfaz de lectura que el diccionario (items()). Los runs se
+    # escriben en `directorio`, que administra quien crea el agregado; con MPI
+    # tiene que ser compartido por todos los procesos. `orden` ubica los runs
+    # de este agregado entre los de otros (el rank o el número de archivo).
+    def __init__(self, tipo, directorio, memoria_mb=MEMORIA_POR_DEFECTO, orden=()):
+        if tipo not in TIPOS:
+            raise ValueError(f"Unknown aggregate type: {tipo} (expected one of {', '.join(TIPOS)})")
+        self.tipo = tipo
+        self._combinar = TIPOS[tipo]['combinar']
+        self._contador = TIPOS[tipo]['contador']
+        self._directorio = directorio
+        self._presupuesto = memoria_mb * 1024 ** 2
+        self._orden = tuple(orden)
+        self._datos = {}
+        self._eventos = 0
+        self._volcados = 0
+        self._runs = []
+        # Runs ordenados por la posición de salida (o la lista en memoria si
+        # entró completa en el presupuesto)
+        self._salida = None
+        self._salida_en_memoria = None
+
+    @classmethod
+    def desde_runs(cls, tipo, runs, directorio, memoria_mb=MEMORIA_POR_DEFECTO):
+        # Agregado formado por los runs de otros (por ejemplo, los de cada
+        # proceso MPI, juntados en el proceso 0)
+        agregado = cls(tipo, directorio, memoria_mb)
+        agregado._runs = sorted(runs)
+        return agregado
+
+    def _estimacion(self, eventos, usuarios):
+        return eventos * BYTES_POR_EVENTO + usuarios * BYTES_POR_USUARIO
+
+    def combinar(self, parcial):
+        # Suma un agregado parcial en diccionario, como combinar_retweets o
+        # combinar_menciones. Los datos de `parcial` pasan a ser del agregado.
+        if self._salida is not None or self._salida_en_memoria is not None:
+            raise ValueError("Cannot add data to an aggregate that was already read")
+        self._combinar(self._datos, parcial)
+        self._eventos += sum(datos[self._contador] for datos in parcial.values())
+        if self._estimacion(self._eventos, len(self._datos)) > self._presupuesto:
+            self._volcar()
+        return self
+
+    def _volcar(self):
+        if not self._datos:
+            return
+        orden = self._orden + (self._volcados,)
+        registros = sorted(((user, orden + (posicion,), datos)
+                            for posicion, (user, datos) in enumerate(self._datos.items())), key=itemgetter(0))
+        self._runs.append((orden, self._escribir(registros)))
+        self._volcados += 1
+        self._datos = {}
+        self._eventos = 0
+
+    def terminar(self):
+        # Vuelca lo que queda en memoria y devuelve los runs, para juntarlos
+        # con desde_runs en otro proceso
+        self._volcar()
+        return list(self._runs)
+
+    def _escribir(self, registros):
+        descriptor, ruta = tempfile.mkstemp(prefix=f"{self.tipo}-", suffix='.run', dir=self._directorio)
+        with os.fdopen(descriptor, 'wb') as archivo:
+            bloque = []
+            for registro in registros:
+                bloque.append(registro)
+                if len(bloque) >= REGISTROS_POR_BLOQUE:
+                    pickle.dump(bloque, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+                    bloque = []
+            if bloque:
+                pickle.dump(bloque, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+        return ruta
+
+    def _leer(self, ruta):
+        with open(ruta, 'rb') as archivo:
+            while True:
+                try:
+                    bloque = pickle.load(archivo)
+                except EOFError:
+                    return
+                yield from bloque
+
+    def _mezclar_por_usuario(self, runs):
+        # heapq.merge es estable: las partes de un usuario llegan en el orden
+        # de los runs y se combinan como en memoria. La posición del usuario es
+        # la de su primera aparición.
+        flujo = heapq.merge(*(self._leer(ruta) for _, ruta in runs), key=itemgetter(0))
+        for user, partes in groupby(flujo, key=itemgetter(0)):
+            _, orden, datos = next(partes)
+            acumulado = {user: datos}
+            for _, _, otros in partes:
+                self._combinar(acumulado, {user: otros})
+            yield user, orden, acumulado[user]
+
+    def _preparar_salida(self):
+        self._volcar()
+        runs = self._runs
+        while len(runs) > MAXIMO_RUNS_POR_MEZCLA:
+            # Los grupos son de runs consecutivos, así se mantiene su orden
+            agrupados = []
+            for inicio in range(0, len(runs), MAXIMO_RUNS_POR_MEZCLA):
+                grupo = runs[inicio:inicio + MAXIMO_RUNS_POR_MEZCLA]
+                agrupados.append((grupo[0][0], self._escribir(self._mezclar_por_usuario(grupo))))
+                for _, ruta in grupo:
+                    os.remove(ruta)
+            runs = agrupados
+        # Segunda pasada: ordenar por la posición de salida
+        self._salida = []
+        bloque = []
+        eventos = 0
+        for user, orden, datos in self._mezclar_por_usuario(runs):
+            bloque.append((_clave_salida(self.tipo, self._contador, orden, datos), user, datos))
+            eventos += datos[self._contador]
+            if self._estimacion(eventos, len(bloque)) > self._presupuesto:
+                bloque.sort(key=itemgetter(0))
+                self._salida.append(self._escribir(bloque))
+                bloque = []
+                eventos = 0
+        bloque.sort(key=itemgetter(0))
+        if self._salida:
+            if bloque:
+                self._salida.append(self._escribir(bloque))
+        else:
+            self._salida_en_memoria = bloque
+        for _, ruta in runs:
+            os.remove(ruta)
+        self._runs = []
+
+    def items(self):
+        # (usuario, datos) en el orden de salida. Si nunca se superó el
+        # presupuesto todo sigue en memoria y no se escribe nada.
+        if not self._runs and self._salida is None and self._salida_en_memoria is None:
+            if self.tipo == 'menciones':
+                yield from sorted(self._datos.items(), key=lambda x: x[1][self._contador], reverse=True)
+            else:
+                yield from self._datos.items()
+            return
+        if self._salida is None:
+            self._preparar_salida()
+        if self._salida_en_memoria is not None:
+            registros = self._salida_en_memoria
+        else:
+            registros = heapq.merge(*(self._leer(ruta) for ruta in self._salida), key=itemgetter(0))
+        for _, user, datos in registros:
+            yield user, datos
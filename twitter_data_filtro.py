@@ -0,0 +1,229 @@
+# Filtrado de un archivo .json.bz2: devuelve los tweets que tienen alguno de
+# los hashtags buscados y caen en el rango de fechas, reducidos a los campos
+# que usan las etapas siguientes. Lo usan los dos scripts.
+import json
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import closing
+from itertools import islice
+from twitter_data_utils import fecha_created_at
+from twitter_data_bz2 import leer_lineas_bz2_paralelo
+from twitter_data_cache import cargar_o_calcular
+from twitter_data_aggregates import agregar_tweets
+from twitter_data_metricas import sumar
+import twitter_data_json as json_backend
+
+# --pipeline: bytes (de líneas ya descomprimidas) por lote enviado a los
+# procesos y lotes por proceso que puede haber en la cola del lector y en
+# vuelo. Con lotes de 4 MB un proceso con 2 trabajadores tiene a lo sumo unos
+# 32 MB de líneas entre la cola y los lotes en vuelo, sea cual sea el tamaño
+# de los tweets.
+BYTES_POR_LOTE = 4 * 1024 * 1024
+LOTES_POR_TRABAJADOR = 2
+# merged_output lee de a este número de líneas para medir por separado la
+# descompresión y el parseo (pocos MB por lote)
+LINEAS_POR_MEDICION = 1000
+
+
+def merged_output(archivo, hashtags_a_buscar, fecha_inicial, fecha_final, ejecutor_bz2=None, trabajadores_bz2=1, prefiltro=None, lineas_por_archivo=None):
+    # Si se pasa `lineas_por_archivo`, se anota cuántas líneas tenía el archivo
+    tweets_data = []
+    cantidad_lineas = 0
+    with closing(leer_lineas_bz2_paralelo(archivo, ejecutor_bz2, trabajadores_bz2)) as lineas:
+        # Se lee por lotes en lugar de descomprimir todo el archivo en memoria;
+        # así se mide por separado el tiempo de descompresión y el de parseo
+        while True:
+            inicio = time.perf_counter()
+            lote = list(islice(lineas, LINEAS_POR_MEDICION))
+            leido = time.perf_counter()
+            if not lote:
+                break
+            filtrados, cantidad = filtrar_lineas(lote, hashtags_a_buscar, fecha_inicial, fecha_final, prefiltro, archivo)
+            sumar('descompresion', leido - inicio, cantidad, sum(map(len, lote)))
+            sumar('parseo', time.perf_counter() - leido, cantidad)
+            tweets_data.extend(filtrados)
+            cantidad_lineas += cantidad
+    if lineas_por_archivo is not None:
+        lineas_por_archivo[archivo] = cantidad_lineas
+    return tweets_data
+
+
+def filtrar_lineas(lineas, hashtags_a_buscar, fecha_inicial, fecha_final, prefiltro=None, archivo=None):
+    # Filtra las líneas (bytes) de `archivo`; devuelve los tweets y cuántas líneas había
+    tweets_data = []
+    cantidad_lineas = 0
+    for tweet in lineas:
+        cantidad_lineas += 1
+        if prefiltro and not prefiltro.search(tweet):
+            continue
+        try:
+            datos_tweet = json_backend.loads(tweet)
+            fecha_tweet_str = datos_tweet.get("created_at", "")
+            if fecha_tweet_str:
+                fecha_tweet = fecha_created_at(fecha_tweet_str)
+            hashtags_del_tweet = [hashtag['text'].lower() for hashtag in datos_tweet.get("entities", {}).get("hashtags", [])]
+            if hashtags_a_buscar:
+                tweet_contiene_hashtag = any(hashtag in hashtags_a_buscar for hashtag in hashtags_del_tweet)
+                if not tweet_contiene_hashtag:
+                    continue
+            if fecha_inicial and fecha_final:
+                if not (fecha_inicial <= fecha_tweet <= fecha_final):
+                    continue
+            tweet_filtrado = {
+                "created_at": datos_tweet.get("created_at", None),
+                "id_str": datos_tweet.get("id_str", None),
+                "text": datos_tweet.get("text", None),
+                "user": {
+                    "id": datos_tweet.get("user", {}).get("id", None),
+                    "name": datos_tweet.get("user", {}).get("name", None),
+                    "screen_name": datos_tweet.get("user", {}).get("screen_name", None),
+                    "location": datos_tweet.get("user", {}).get("location", None),
+                    "url": datos_tweet.get("user", {}).get("url", None),
+                    "description": datos_tweet.get("user", {}).get("description", None),
+                },
+                "place": {},
+                "entities": {
+                    "hashtags": [],
+                    "urls": [],
+                    "user_mentions": []
+                }
+            }
+            if "urls" in datos_tweet.get("entities", {}):
+                for url_info in datos_tweet["entities"]["urls"]:
+                    url_entry = {
+                        "url": url_info.get("url", None),
+                        "unwound": {
+                            "url": url_info.get("unwound", {}).get("url", None),
+                            "title": url_info.get("unwound", {}).get("title", None),
+                        }
+                    }
+                    tweet_filtrado["entities"]["urls"].append(url_entry)
+            if "user_mentions" in datos_tweet.get("entities", {}):
+                for mention_info in datos_tweet["entities"]["user_mentions"]:
+                    mention_entry = {
+                        "id": mention_info.get("id", None),
+                        "name": mention_info.get("name", None),
+                        "screen_name": mention_info.get("screen_name", None),
+                    }
+                    tweet_filtrado["entities"]["user_mentions"].append(mention_entry)
+            if "hashtags" in datos_tweet.get("entities", {}):
+                for hashtag_info in datos_tweet["entities"]["hashtags"]:
+                    hashtag_entry = {
+                        "text": hashtag_info.get("text", None),
+                    }
+                    tweet_filtrado["entities"]["hashtags"].append(hashtag_entry)
+            tweets_data.append(tweet_filtrado)
+        except json.JSONDecodeError as e:
+            print(f"Error decoding JSON in file {archivo}: {e}")
+    return tweets_data, cantidad_lineas
+
+
+def filtrar_archivo(archivo, original, hashtags_a_buscar, fecha_inicial, fecha_final, prefiltro=None, cache=None, devolver_tweets=True):
+    # Tarea de --workers: filtra un archivo (o lo toma de la caché) y arma sus
+    # agregados en el proceso del pool. Devuelve (tweets o None, retweet_data,
+    # mention_data, líneas leídas o None si salió de la caché)
+    lineas_por_archivo = {}
+    tweets = cargar_o_calcular(
+        cache, original, hashtags_a_buscar, fecha_inicial, fecha_final,
+        lambda: merged_output(archivo, hashtags_a_buscar, fecha_inicial, fecha_final,
+                              prefiltro=prefiltro, lineas_por_archivo=lineas_por_archivo))
+    retweet_data, mention_data = agregar_tweets(tweets)
+    return (tweets if devolver_tweets else None), retweet_data, mention_data, lineas_por_archivo.get(archivo)
+
+
+def filtrar_en_orden(ejecutor, tareas, en_vuelo):
+    # Entrega el resultado de filtrar_archivo para cada tarea (tupla de sus
+    # argumentos) en el orden de las tareas, con como máximo `en_vuelo`
+    # archivos pendientes para no acumular resultados en memoria
+    pendientes = deque()
+    tareas = iter(tareas)
+    for tarea in tareas:
+        pendientes.append(ejecutor.submit(filtrar_archivo, *tarea))
+        if len(pendientes) >= en_vuelo:
+            break
+    while pendientes:
+        resultado = pendientes.popleft().result()
+        for tarea in tareas:
+            pendientes.append(ejecutor.submit(filtrar_archivo, *tarea))
+            break
+        yield resultado
+
+
+def _filtrar_lote(lote, hashtags_a_buscar, fecha_inicial, fecha_final, prefiltro, archivo):
+    return filtrar_lineas(lote, hashtags_a_buscar, fecha_inicial, fecha_final, prefiltro, archivo)[0]
+
+
+def _lote(lineas, limite):
+    # Siguientes líneas hasta juntar `limite` bytes (al menos una línea)
+    lote = []
+    tamano = 0
+    for linea in lineas:
+        lote.append(linea)
+        tamano += len(linea)
+        if tamano >= limite:
+            break
+    return lote, tamano
+
+
+def _leer_lotes(archivo, cola, detener):
+    # Hilo lector: descomprime el archivo (bz2 libera el GIL mientras tanto) y
+    # deja lotes de líneas en la cola; al final deja None, o la excepción
+    def poner(elemento):
+        while not detener.is_set():
+            try:
+                cola.put(elemento, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        with closing(leer_lineas_bz2_paralelo(archivo)) as lineas:
+            while True:
+                inicio = time.perf_counter()
+                lote, tamano = _lote(lineas, BYTES_POR_LOTE)
+                if not lote:
+                    break
+                sumar('descompresion', time.perf_counter() - inicio, len(lote), tamano)
+                if not poner(lote):
+                    return
+        poner(None)
+    except BaseException as e:
+        poner(e)
+
+
+def merged_output_pipeline(archivo, hashtags_a_buscar, fecha_inicial, fecha_final, ejecutor, trabajadores, prefiltro=None, lineas_por_archivo=None):
+    # Igual que merged_output, pero un hilo descomprime mientras los procesos
+    # de `ejecutor` filtran los lotes ya leídos. La cola y los lotes en vuelo
+    # están acotados, así la memoria no depende del tamaño del archivo.
+    en_vuelo = LOTES_POR_TRABAJADOR * trabajadores
+    cola = queue.Queue(maxsize=en_vuelo)
+    detener = threading.Event()
+    lector = threading.Thread(target=_leer_lotes, args=(archivo, cola, detener), daemon=True)
+    lector.start()
+    tweets_data = []
+    cantidad_lineas = 0
+    pendientes = deque()
+    try:
+        while True:
+            lote = cola.get()
+            if lote is None:
+                break
+            if isinstance(lote, BaseException):
+                raise lote
+            cantidad_lineas += len(lote)
+            pendientes.append(ejecutor.submit(_filtrar_lote, lote, hashtags_a_buscar, fecha_inicial, fecha_final, prefiltro, archivo))
+            if len(pendientes) >= en_vuelo:
+                tweets_data.extend(pendientes.popleft().result())
+        while pendientes:
+            tweets_data.extend(pendientes.popleft().result())
+    finally:
+        detener.set()
+        for futuro in pendientes:
+            futuro.cancel()
+        lector.join()
+    if lineas_por_archivo is not None:
+        lineas_por_archivo[archivo] = cantidad_lineas
+    return tweets_data
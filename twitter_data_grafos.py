@@ -0,0 +1,229 @@
+# Grafos de retweets, menciones y coretweets como listas de aristas compactas.
+# Cada usuario se interna a un entero denso, en orden de primera aparición, y
+# las aristas se guardan en dos array('I') (origen y destino) en lugar de un
+# diccionario de networkx por nodo y por arista. Los nombres se recuperan
+# solo al exportar: el GEXF se escribe directamente, en el mismo orden y
+# formato que nx.write_gexf, sin armar un nx.DiGraph.
+import gzip
+import time
+from array import array
+from xml.sax.saxutils import escape
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TAMANO_BUFFER = 1024 * 1024
+LINEAS_POR_ESCRITURA = 10000
+
+
+def nuevo_grafo(pesos=False):
+    return {
+        'indices': {},                              # nombre -> entero
+        'nombres': [],                              # entero -> nombre
+        'atributos': {},                            # entero -> {atributo: valor}
+        'origenes': array('I'),
+        'destinos': array('I'),
+        'pesos': array('Q') if pesos else None,
+    }
+
+
+def internar(grafo, nombre):
+    indice = grafo['indices'].get(nombre)
+    if indice is None:
+        indice = grafo['indices'][nombre] = len(grafo['nombres'])
+        grafo['nombres'].append(nombre)
+    return indice
+
+
+def agregar_nodo(grafo, nombre, **atributos):
+    indice = internar(grafo, nombre)
+    if atributos:
+        grafo['atributos'].setdefault(indice, {}).update(atributos)
+    return indice
+
+
+def agregar_arista(grafo, origen, destino, peso=None):
+    # Las aristas repetidas se guardan igual y se descartan al exportar
+    grafo['origenes'].append(internar(grafo, origen))
+    grafo['destinos'].append(internar(grafo, destino))
+    if grafo['pesos'] is not None:
+        grafo['pesos'].append(peso)
+
+
+def aristas_unicas(grafo):
+    # Posición de cada arista distinta y de su última aparición (de donde
+    # networkx tomaría el peso), agrupadas por nodo de origen en orden de
+    # aparición y, para cada origen, en orden de primera aparición: el orden
+    # en que networkx recorre las aristas de un DiGraph
+    cantidad = len(grafo['origenes'])
+    if np is not None and cantidad:
+        origenes = np.frombuffer(grafo['origenes'], dtype=np.uint32)
+        claves = (origenes.astype(np.uint64) << np.uint64(32)) \
+            | np.frombuffer(grafo['destinos'], dtype=np.uint32).astype(np.uint64)
+        _, primeras, inversa = np.unique(claves, return_index=True, return_inverse=True)
+        ultimas = np.zeros(len(primeras), dtype=np.int64)
+        # Con índices repetidos se queda el último valor asignado
+        ultimas[inversa] = np.arange(cantidad)
+        orden = np.argsort(primeras, kind='stable')
+        primeras = primeras[orden]
+        ultimas = ultimas[orden]
+        orden = np.argsort(origenes[primeras], kind='stable')
+        return primeras[orden].tolist(), ultimas[orden].tolist()
+    vistas = {}
+    for posicion, clave in enumerate(zip(grafo['origenes'], grafo['destinos'])):
+        if clave in vistas:
+            vistas[clave][1] = posicion
+        else:
+            vistas[clave] = [posicion, posicion]
+    # sorted es estable: dentro de cada origen se mantiene la primera aparición
+    posiciones = sorted(vistas.values(), key=lambda par: grafo['origenes'][par[0]])
+    return [primera for primera, _ in posiciones], [ultima for _, ultima in posiciones]
+
+
+def quitar_aislados(grafo):
+    # Los nodos sin aristas se marcan como eliminados; las aristas no cambian
+    con_aristas = set(grafo['origenes'])
+    con_aristas.update(grafo['destinos'])
+    grafo['eliminados'] = set(range(len(grafo['nombres']))) - con_aristas
+
+
+def _escapar(valor):
+    # Igual que ElementTree en los atributos XML
+    return escape(str(valor), {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#09;'})
+
+
+def _tipo_gexf(valor):
+    if isinstance(valor, bool):
+        return 'boolean'
+    if isinstance(valor, int):
+        return 'long'
+    if isinstance(valor, float):
+        return 'double'
+    return 'string'
+
+
+def _valor_gexf(valor):
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    return _escapar(valor)
+
+
+def escribir_gexf(grafo, salida):
+    # Escribe el grafo en GEXF 1.2 (dirigido) línea por línea, con el mismo
+    # formato que nx.write_gexf, sin construir un nx.DiGraph
+    nombres = grafo['nombres']
+    eliminados = grafo.get('eliminados', ())
+    atributos = grafo['atributos']
+    pendientes = []
+
+    def escribir(linea):
+        pendientes.append(linea)
+        if len(pendientes) >= LINEAS_POR_ESCRITURA:
+            salida.write('\n'.join(pendientes).encode('utf-8') + b'\n')
+            pendientes.clear()
+
+    escribir("<?xml version='1.0' encoding='utf-8'?>")
+    escribir('<gexf xmlns="http://www.gexf.net/1.2draft" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+             'xsi:schemaLocation="http://www.gexf.net/1.2draft http://www.gexf.net/1.2draft/gexf.xsd" version="1.2">')
+    escribir(f'  <meta lastmodifieddate="{time.strftime("%Y-%m-%d")}">')
+    escribir('    <creator>twitter-data-network-analysis</creator>')
+    escribir('  </meta>')
+    escribir('  <graph defaultedgetype="directed" mode="static" name="">')
+    # Declaración de los atributos de nodo, en orden de primera aparición
+    columnas = {}
+    for indice, valores in atributos.items():
+        if indice in eliminados:
+            continue
+        for nombre, valor in valores.items():
+            if nombre not in columnas:
+                columnas[nombre] = (str(len(columnas)), _tipo_gexf(valor))
+    if columnas:
+        escribir('    <attributes mode="static" class="node">')
+        for nombre, (identificador, tipo) in columnas.items():
+            escribir(f'      <attribute id="{identificador}" title="{_escapar(nombre)}" type="{tipo}" />')
+        escribir('    </attributes>')
+    if len(nombres) > len(eliminados):
+        escribir('    <nodes>')
+        for indice, nombre in enumerate(nombres):
+            if indice in eliminados:
+                continue
+            nombre = _escapar(nombre)
+            valores = atributos.get(indice)
+            if not valores:
+                escribir(f'      <node id="{nombre}" label="{nombre}" />')
+                continue
+            escribir(f'      <node id="{nombre}" label="{nombre}">')
+            escribir('        <attvalues>')
+            for atributo, valor in valores.items():
+                escribir(f'          <attvalue for="{columnas[atributo][0]}" value="{_valor_gexf(valor)}" />')
+            escribir('        </attvalues>')
+            escribir('      </node>')
+        escribir('    </nodes>')
+    else:
+        escribir('    <nodes />')
+    origenes = grafo['origenes']
+    destinos = grafo['destinos']
+    pesos = grafo['pesos']
+    primeras, ultimas = aristas_unicas(grafo)
+    if primeras:
+        escribir('    <edges>')
+        for numero, (primera, ultima) in enumerate(zip(primeras, ultimas)):
+            peso = f' weight="{pesos[ultima]}"' if pesos is not None else ''
+            escribir(f'      <edge source="{_escapar(nombres[origenes[primera]])}" '
+                     f'target="{_escapar(nombres[destinos[primera]])}" id="{numero}"{peso} />')
+        escribir('    </edges>')
+    else:
+        escribir('    <edges />')
+    escribir('  </graph>')
+    escribir('</gexf>')
+    salida.write('\n'.join(pendientes).encode('utf-8') + b'\n')
+
+
+def guardar_gexf(grafo, ruta, comprimir=False):
+    # Con comprimir se escribe ruta + '.gz'; nx.read_gexf y Gephi lo leen igual
+    if comprimir:
+        with gzip.open(ruta + '.gz', 'wb', compresslevel=6) as salida:
+            escribir_gexf(grafo, salida)
+    else:
+        with open(ruta, 'wb', buffering=TAMANO_BUFFER) as salida:
+            escribir_gexf(grafo, salida)
+
+
+def grafo_rt(rt_data):
+    # Arista de cada retweeter al usuario retuiteado (estructura de rt.json)
+    grafo = nuevo_grafo()
+    for user_info in rt_data['retweets']:
+        username = user_info['username']
+        agregar_nodo(grafo, username, received_retweets=user_info['receivedRetweets'])
+        tweets = user_info.get('tweets', ())
+        if isinstance(tweets, dict):
+            # rt.json de versiones anteriores: {id del tweet: {'retweetedBy': [...]}}
+            tweets = tweets.values()
+        for tweet in tweets:
+            for retweeter in tweet['retweetedBy']:
+                agregar_arista(grafo, retweeter, username)
+    return grafo
+
+
+def grafo_menciones(mention_data):
+    # Arista de quien menciona al usuario mencionado (estructura de
+    # mencion.json), sin los usuarios que quedan aislados
+    grafo = nuevo_grafo()
+    for user_mention in mention_data['mentions']:
+        username = user_mention['username']
+        agregar_nodo(grafo, username)
+        for mention in user_mention['mentions']:
+            agregar_arista(grafo, mention['mentionBy'], username)
+    quitar_aislados(grafo)
+    return grafo
+
+
+def grafo_coretweets(coretweets_data):
+    # Arista entre cada par de autores con la cantidad de retweeters en común
+    grafo = nuevo_grafo(pesos=True)
+    for coretweet in coretweets_data['coretweets']:
+        agregar_arista(grafo, coretweet['authors']['u1'], coretweet['authors']['u2'],
+                       len(coretweet['retweeters']))
+    return grafo
@@ -0,0 +1,164 @@
+import os
+import re
+import sqlite3
+
+# Índice persistente de los archivos .json.bz2: ruta, fecha, tamaño y cantidad
+# de tweets (líneas) de cada uno. Se actualiza de forma incremental: solo se
+# vuelven a listar los directorios cuyo mtime cambió desde la última vez. Los
+# archivos se consideran inmutables (un archivo reescrito en su lugar sin
+# cambiar de nombre no cambia el mtime del directorio).
+INDICE_POR_DEFECTO = 'indice_archivos.sqlite'
+
+# Versión del contenido del índice (PRAGMA user_version). En la versión 0 la
+# fecha se calculaba sobre la ruta relativa al primer directorio indexado; en
+# la 1 se entraba en los enlaces simbólicos a directorios.
+VERSION_INDICE = 2
+
+# Fecha a partir de la ruta: año, mes y día en los directorios
+# (2016/06/01/10/30.json.bz2) o en el nombre (2016-06-01-10.json.bz2), o
+# día, mes y año en el nombre (01-06-2016.json.bz2). Los patrones van dentro
+# de un lookahead para encontrar también las coincidencias superpuestas.
+_FECHA_AMD = re.compile(r'(?=(?<!\d)(\d{4})[/_-]?(\d{2})[/_-]?(\d{2})(?!\d))')
+_FECHA_DMA = re.compile(r'(?=(?<!\d)(\d{2})[_-](\d{2})[_-](\d{4})(?!\d))')
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS directorios (
+    ruta TEXT PRIMARY KEY,
+    padre TEXT,
+    mtime INTEGER
+);
+CREATE INDEX IF NOT EXISTS directorios_padre ON directorios (padre);
+CREATE TABLE IF NOT EXISTS archivos (
+    ruta TEXT PRIMARY KEY,
+    directorio TEXT,
+    fecha TEXT,
+    tamano INTEGER,
+    tweets INTEGER
+);
+CREATE INDEX IF NOT EXISTS archivos_directorio ON archivos (directorio);
+CREATE INDEX IF NOT EXISTS archivos_fecha ON archivos (fecha);
+"""
+
+
+def fecha_desde_ruta(ruta):
+    # Devuelve la fecha como 'aaaa-mm-dd' o None si la ruta no tiene una fecha
+    # válida. Si hay varias gana la que termina más cerca del final (la del
+    # nombre o la de los directorios más internos), así la fecha de un
+    # archivo no depende de qué directorio se indexó primero.
+    fecha = None
+    fin = -1
+    for patron, orden in ((_FECHA_AMD, (0, 1, 2)), (_FECHA_DMA, (2, 1, 0))):
+        for coincidencia in patron.finditer(ruta):
+            anio, mes, dia = (coincidencia.group(i + 1) for i in orden)
+            if 1 <= int(mes) <= 12 and 1 <= int(dia) <= 31 and coincidencia.end(3) > fin:
+                fecha = f"{anio}-{mes}-{dia}"
+                fin = coincidencia.end(3)
+    return fecha
+
+
+def abrir_indice(ruta=INDICE_POR_DEFECTO):
+    conexion = sqlite3.connect(ruta)
+    conexion.executescript(_ESQUEMA)
+    version, = conexion.execute("PRAGMA user_version").fetchone()
+    if version < 1:
+        # Las fechas de un índice anterior se recalculan sobre la ruta completa
+        filas = conexion.execute("SELECT ruta FROM archivos").fetchall()
+        conexion.executemany("UPDATE archivos SET fecha = ? WHERE ruta = ?",
+                             [(fecha_desde_ruta(ruta), ruta) for (ruta,) in filas])
+    if version < 2:
+        # Todos los directorios se vuelven a listar, así los que estaban
+        # detrás de un enlace simbólico salen del índice
+        conexion.execute("UPDATE directorios SET mtime = NULL")
+    if version < VERSION_INDICE:
+        conexion.execute(f"PRAGMA user_version = {VERSION_INDICE}")
+        conexion.commit()
+    return conexion
+
+
+def _debajo_de(columna):
+    # Condición SQL para rutas dentro de un directorio (sin LIKE, que trata
+    # '_' y '%' como comodines)
+    return f"({columna} = ? OR substr({columna}, 1, ?) = ?)"
+
+
+def _parametros_debajo_de(directorio):
+    prefijo = os.path.join(directorio, '')
+    return (directorio, len(prefijo), prefijo)
+
+
+def actualizar_indice(conexion, directorio):
+    directorio = os.path.abspath(directorio)
+    conocidos = dict(conexion.execute(
+        f"SELECT ruta, mtime FROM directorios WHERE {_debajo_de('ruta')}", _parametros_debajo_de(directorio)))
+    vistos = set()
+    pendientes = [directorio]
+    while pendientes:
+        actual = pendientes.pop()
+        vistos.add(actual)
+        mtime = os.stat(actual).st_mtime_ns
+        if conocidos.get(actual) == mtime:
+            # Sin cambios: los archivos y subdirectorios salen del índice
+            pendientes.extend(ruta for (ruta,) in conexion.execute(
+                "SELECT ruta FROM directorios WHERE padre = ?", (actual,)))
+            continue
+        archivos = {}
+        subdirectorios = []
+        with os.scandir(actual) as entradas:
+            for entrada in entradas:
+                # Como os.walk, no se entra en los enlaces simbólicos a
+                # directorios (un enlace a un directorio padre no termina)
+                if entrada.is_dir(follow_symlinks=False):
+                    subdirectorios.append(entrada.path)
+                elif entrada.name.endswith('.json.bz2'):
+                    archivos[entrada.path] = entrada.stat().st_size
+        anteriores = dict(conexion.execute(
+            "SELECT ruta, tamano FROM archivos WHERE directorio = ?", (actual,)))
+        conexion.executemany("DELETE FROM archivos WHERE ruta = ?",
+                             [(ruta,) for ruta in anteriores if ruta not in archivos])
+        # Los archivos nuevos o que cambiaron de tamaño pierden la cantidad de tweets
+        conexion.executemany(
+            "INSERT OR REPLACE INTO archivos (ruta, directorio, fecha, tamano, tweets) VALUES (?, ?, ?, ?, NULL)",
+            [(ruta, actual, fecha_desde_ruta(ruta), tamano)
+             for ruta, tamano in archivos.items() if anteriores.get(ruta) != tamano])
+        conexion.execute("INSERT OR REPLACE INTO directorios (ruta, padre, mtime) VALUES (?, ?, ?)",
+                         (actual, os.path.dirname(actual) if actual != directorio else None, mtime))
+        pendientes.extend(subdirectorios)
+    # Directorios que ya no existen
+    borrados = [(ruta,) for ruta in conocidos if ruta not in vistos]
+    conexion.executemany("DELETE FROM directorios WHERE ruta = ?", borrados)
+    conexion.executemany("DELETE FROM archivos WHERE directorio = ?", borrados)
+    conexion.commit()
+
+
+def buscar_archivos(conexion, directorio, fecha_inicial=None, fecha_final=None):
+    # Archivos dentro de `directorio` con fecha en [fecha_inicial, fecha_final]
+    # ('aaaa-mm-dd'), ordenados por fecha y ruta. Los que no tienen fecha en
+    # la ruta se incluyen siempre. Como el filtro de fechas de los tweets, el
+    # rango solo se aplica si están las dos fechas. Devuelve tuplas (ruta,
+    # tamaño, tweets).
+    directorio = os.path.abspath(directorio)
+    condiciones = [_debajo_de('ruta')]
+    parametros = list(_parametros_debajo_de(directorio))
+    if fecha_inicial and fecha_final:
+        condiciones.append("(fecha IS NULL OR (fecha >= ? AND fecha <= ?))")
+        parametros.extend([fecha_inicial, fecha_final])
+    return conexion.execute(
+        f"SELECT ruta, tamano, tweets FROM archivos WHERE {' AND '.join(condiciones)} ORDER BY fecha, ruta",
+        parametros).fetchall()
+
+
+def registrar_tweets(conexion, cantidades):
+    # Guarda la cantidad de tweets leídos de cada archivo, {ruta: cantidad}
+    conexion.executemany("UPDATE archivos SET tweets = ? WHERE ruta = ?",
+                         [(cantidad, os.path.abspath(ruta)) for ruta, cantidad in cantidades.items()])
+    conexion.commit()
+
+
+def tamanos_indexados(conexion, rutas):
+    # {ruta: tamaño} de las rutas que están en el índice
+    tamanos = {}
+    for ruta in rutas:
+        fila = conexion.execute("SELECT tamano FROM archivos WHERE ruta = ?", (os.path.abspath(ruta),)).fetchone()
+        if fila is not None:
+            tamanos[ruta] = fila[0]
+    return tamanos
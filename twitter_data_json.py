@@ -0,0 +1,345 @@
+import codecs
+import gzip
+import json
+import os
+import re
+import shutil
+from contextlib import contextmanager
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BACKENDS = ('auto', 'json', 'orjson', 'simdjson')
+COMPRESIONES = ('gz', 'zst')
+TAMANO_ESCRITURA = 1024 * 1024
+TAMANO_LECTURA = 1024 * 1024
+
+# Backend en uso. En modo compatible los archivos escritos son idénticos byte
+# a byte a los que produce el módulo json estándar siempre que los datos no
+# tengan floats (los de este proyecto tienen solo strings, enteros, booleanos
+# y None). Con orjson los floats pueden salir con otro formato (1e+20 en vez
+# de 1e20) y NaN o Infinity salen como null.
+_backend = {'nombre': 'json', 'compatible': True}
+
+
+def usar_backend(nombre='auto', compatible=True):
+    if nombre not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {nombre} (expected one of {', '.join(BACKENDS)})")
+    if nombre == 'auto':
+        nombre = 'orjson' if orjson else 'simdjson' if simdjson else 'json'
+    elif nombre == 'orjson' and orjson is None or nombre == 'simdjson' and simdjson is None:
+        raise ValueError(f"JSON backend {nombre} is not installed")
+    _backend['nombre'] = nombre
+    _backend['compatible'] = compatible
+    return nombre
+
+
+def loads(datos):
+    nombre = _backend['nombre']
+    if nombre == 'orjson':
+        # orjson.JSONDecodeError ya es subclase de json.JSONDecodeError
+        return orjson.loads(datos)
+    if nombre == 'simdjson':
+        try:
+            return simdjson.loads(datos)
+        except ValueError as e:
+            raise json.JSONDecodeError(str(e), datos if isinstance(datos, str) else repr(datos), 0)
+    return json.loads(datos)
+
+
+def _indentar(datos, indent):
+    # orjson solo sabe indentar con 2 espacios. Los strings JSON no tienen
+    # saltos de línea crudos, así que cada "\n" va seguido solo de sangría:
+    # se pasa cada nivel a un tabulador (del más profundo al menos profundo)
+    # y después cada tabulador al ancho pedido.
+    profundidad = 0
+    while b'\n' + b'  ' * (profundidad + 1) in datos:
+        profundidad += 1
+    for nivel in range(profundidad, 0, -1):
+        datos = datos.replace(b'\n' + b'  ' * nivel, b'\n' + b'\t' * nivel)
+    return datos.replace(b'\t', b' ' * indent)
+
+
+def _escapar(coincidencia):
+    texto = coincidencia.group(0).decode('utf-8')
+    return json.dumps(texto)[1:-1].encode('ascii')
+
+
+def _a_ascii(datos):
+    # Igual que ensure_ascii=True: todo lo que no sea ASCII imprimible va como \uXXXX
+    if datos.isascii() and b'\x7f' not in datos:
+        return datos
+    return re.sub(rb'[\x7f-\xff]+', _escapar, datos)
+
+
+def _dumps_compacto(datos, ensure_ascii):
+    # Sin espacios después de ',' y ':' (no tiene que coincidir con el
+    # módulo json, así que con orjson no se corrige nada salvo el ASCII)
+    if _backend['nombre'] != 'json' and orjson is not None:
+        try:
+            salida = orjson.dumps(datos)
+        except (TypeError, orjson.JSONEncodeError):
+            return json.dumps(datos, separators=(',', ':'), ensure_ascii=ensure_ascii).encode('utf-8')
+        return _a_ascii(salida) if ensure_ascii else salida
+    return json.dumps(datos, separators=(',', ':'), ensure_ascii=ensure_ascii).encode('utf-8')
+
+
+def dumps(datos, indent=None, ensure_ascii=True, compacto=False):
+    if compacto:
+        return _dumps_compacto(datos, ensure_ascii)
+    if _backend['nombre'] == 'json' or orjson is None:
+        return json.dumps(datos, indent=indent, ensure_ascii=ensure_ascii).encode('utf-8')
+    compatible = _backend['compatible']
+    if compatible and indent is None:
+        # Sin indentación json usa ", " y ": ", que orjson no produce
+        return json.dumps(datos, ensure_ascii=ensure_ascii).encode('utf-8')
+    try:
+        salida = orjson.dumps(datos, option=orjson.OPT_INDENT_2 if indent else 0)
+    except (TypeError, orjson.JSONEncodeError):
+        return json.dumps(datos, indent=indent, ensure_ascii=ensure_ascii).encode('utf-8')
+    if compatible:
+        if indent != 2:
+            salida = _indentar(salida, indent)
+        if ensure_ascii:
+            salida = _a_ascii(salida)
+    return salida
+
+
+def guardar_json(datos, ruta, indent=None, ensure_ascii=True):
+    with open(ruta, 'wb') as archivo:
+        archivo.write(dumps(datos, indent=indent, ensure_ascii=ensure_ascii))
+
+
+def _fragmento(lista, indent=None, ensure_ascii=True):
+    # Los elementos de `lista` tal como quedarían dentro del arreglo completo,
+    # sin los corchetes
+    if not lista:
+        return b''
+    salida = dumps(lista, indent=indent, ensure_ascii=ensure_ascii)
+    return salida[2:-2] if indent is not None else salida[1:-1]
+
+
+def guardar_fragmento_json(lista, ruta, indent=None, ensure_ascii=True):
+    # Escribe el fragmento de `lista`, para unir después las partes de cada proceso
+    with open(ruta, 'wb') as archivo:
+        archivo.write(_fragmento(lista, indent, ensure_ascii))
+
+
+class EscritorListaJson:
+    # Escribe un arreglo JSON a medida que llegan sus partes (por ejemplo, los
+    # tweets de cada archivo), sin juntarlas en memoria. El resultado es el
+    # mismo que guardar_json sobre la lista concatenada; con `fragmento` se
+    # escribe sin corchetes, como guardar_fragmento_json.
+    def __init__(self, ruta, indent=None, ensure_ascii=True, fragmento=False):
+        self._indent = indent
+        self._ensure_ascii = ensure_ascii
+        self._fragmento = fragmento
+        self._escritos = 0
+        self._archivo = open(ruta, 'wb')
+        if not fragmento:
+            self._archivo.write(b'[')
+
+    def agregar(self, lista):
+        datos = _fragmento(lista, self._indent, self._ensure_ascii)
+        if not datos:
+            return
+        if self._escritos:
+            self._archivo.write(b',\n' if self._indent is not None else b', ')
+        elif not self._fragmento and self._indent is not None:
+            self._archivo.write(b'\n')
+        self._archivo.write(datos)
+        self._escritos += 1
+
+    def cerrar(self):
+        if not self._fragmento:
+            if self._escritos and self._indent is not None:
+                self._archivo.write(b'\n')
+            self._archivo.write(b']')
+        self._archivo.close()
+
+
+def unir_fragmentos_json(rutas, ruta_salida, indent=None):
+    # Une los fragmentos en orden en un único arreglo JSON, idéntico al que se
+    # obtendría guardando la lista concatenada de una sola vez
+    separador = b',\n' if indent is not None else b', '
+    escritos = 0
+    with open(ruta_salida, 'wb') as salida:
+        salida.write(b'[')
+        for ruta in rutas:
+            if os.path.getsize(ruta) == 0:
+                continue
+            salida.write(separador if escritos else b'\n' if indent is not None else b'')
+            with open(ruta, 'rb') as fragmento:
+                shutil.copyfileobj(fragmento, salida)
+            escritos += 1
+        if escritos and indent is not None:
+            salida.write(b'\n')
+        salida.write(b']')
+
+
+def validar_compresion(compresion):
+    if compresion not in COMPRESIONES:
+        raise ValueError(f"Unknown compression: {compresion} (expected one of {', '.join(COMPRESIONES)})")
+    if compresion == 'zst' and zstandard is None:
+        raise ValueError("Compression zst requires the zstandard package")
+    return compresion
+
+
+def ruta_salida(ruta, compresion=None):
+    # Con compresión se agrega la extensión: rt.json.gz, rt.json.zst
+    return f"{ruta}.{compresion}" if compresion else ruta
+
+
+@contextmanager
+def abrir_salida(ruta, compresion=None):
+    # Archivo binario para escribir, comprimido con gzip o zstd si se pide
+    if compresion == 'gz':
+        with gzip.open(ruta, 'wb', compresslevel=6) as salida:
+            yield salida
+    elif compresion:
+        validar_compresion(compresion)
+        with open(ruta, 'wb') as archivo, zstandard.ZstdCompressor().stream_writer(archivo) as salida:
+            yield salida
+    else:
+        with open(ruta, 'wb') as salida:
+            yield salida
+
+
+def guardar_json_en_partes(clave, elementos, ruta, indent=None, ensure_ascii=True, compacto=False, compresion=None):
+    # Escribe {clave: [elementos]} de a un elemento, sin armar la lista ni el
+    # texto completo. Sin `compacto` el resultado es el mismo que guardar_json
+    # sobre el objeto completo; con `compacto` no lleva sangría ni espacios.
+    # Con `compresion` se escribe ruta + '.gz' o '.zst'. Los separadores y la
+    # sangría salen de serializar un objeto de ejemplo.
+    if compacto:
+        indent = None
+    plantilla = dumps({clave: [0, 0]}, indent=indent, ensure_ascii=ensure_ascii, compacto=compacto)
+    segundo = plantilla.rindex(b'0')
+    primero = plantilla.rindex(b'0', 0, segundo)
+    inicio, separador, fin = plantilla[:primero], plantilla[primero + 1:segundo], plantilla[segundo + 1:]
+    # Los strings JSON no tienen saltos de línea crudos: cada "\n" de un
+    # elemento lleva la sangría del nivel del arreglo
+    sangria = separador[separador.index(b'\n'):] if indent is not None else None
+    escritos = 0
+    pendientes = []
+    tamano = 0
+    with abrir_salida(ruta_salida(ruta, compresion), compresion) as archivo:
+        for elemento in elementos:
+            datos = dumps(elemento, indent=indent, ensure_ascii=ensure_ascii, compacto=compacto)
+            if sangria:
+                datos = datos.replace(b'\n', sangria)
+            pendientes.append(separador if escritos else inicio)
+            pendientes.append(datos)
+            escritos += 1
+            tamano += len(datos)
+            # Se escribe de a bloques: muchas escrituras chicas son lentas con gzip
+            if tamano >= TAMANO_ESCRITURA:
+                archivo.write(b''.join(pendientes))
+                pendientes = []
+                tamano = 0
+        pendientes.append(fin if escritos else dumps({clave: []}, indent=indent, ensure_ascii=ensure_ascii, compacto=compacto))
+        archivo.write(b''.join(pendientes))
+
+
+def abrir_entrada(ruta):
+    # Archivo binario para leer; los .gz y .zst se descomprimen al leer
+    if ruta.endswith('.gz'):
+        return gzip.open(ruta, 'rb')
+    if ruta.endswith('.zst'):
+        validar_compresion('zst')
+        return zstandard.ZstdDecompressor().stream_reader(open(ruta, 'rb'), closefd=True)
+    return open(ruta, 'rb')
+
+
+_decodificador = json.JSONDecoder()
+_espacios = re.compile(r'[ \t\n\r]*')
+_DELIMITADORES = (' ', '\t', '\n', '\r', ',', ':', ']', '}')
+
+
+def leer_elementos(ruta, clave=None):
+    # Entrega de a uno los elementos del arreglo `clave` del objeto de nivel
+    # superior ({"retweets": [...]}), o del arreglo de nivel superior si
+    # `clave` es None (merged_output.json), sin cargar el archivo completo.
+    # Cada elemento se decodifica con raw_decode sobre un buffer que se
+    # agranda mientras el elemento esté incompleto, así sirve para cualquier
+    # sangría y para los JSON de corridas anteriores.
+    with abrir_entrada(ruta) as archivo:
+        utf8 = codecs.getincrementaldecoder('utf-8-sig')()
+        estado = {'texto': '', 'pos': 0, 'fin': False}
+
+        def leer_mas():
+            # Lo ya consumido se descarta; se lee al menos lo que quedaba en
+            # el buffer, así un elemento grande no se decodifica una vez por bloque
+            pendiente = estado['texto'][estado['pos']:]
+            datos = archivo.read(max(TAMANO_LECTURA, len(pendiente)))
+            estado['texto'] = pendiente + utf8.decode(datos, final=not datos)
+            estado['pos'] = 0
+            estado['fin'] = not datos
+
+        def siguiente():
+            # Primer carácter que no es espacio ('' al final del archivo)
+            while True:
+                estado['pos'] = _espacios.match(estado['texto'], estado['pos']).end()
+                if estado['pos'] < len(estado['texto']):
+                    return estado['texto'][estado['pos']]
+                if estado['fin']:
+                    return ''
+                leer_mas()
+
+        def valor():
+            while True:
+                siguiente()
+                try:
+                    objeto, final = _decodificador.raw_decode(estado['texto'], estado['pos'])
+                    # Un número cortado por el fin del bloque se decodifica
+                    # igual ("-3." de "-3.5"): solo se acepta el valor si lo
+                    # sigue un delimitador
+                    if estado['fin'] or estado['texto'][final:final + 1] in _DELIMITADORES:
+                        estado['pos'] = final
+                        return objeto
+                except json.JSONDecodeError:
+                    if estado['fin']:
+                        raise
+                leer_mas()
+
+        def esperar(caracter, contexto):
+            if siguiente() != caracter:
+                raise ValueError(f"Expected '{caracter}' {contexto} in {ruta}")
+            estado['pos'] += 1
+
+        if clave is not None:
+            esperar('{', 'at the start')
+            while True:
+                if siguiente() == '}':
+                    raise ValueError(f"Key {clave} not found in {ruta}")
+                nombre = valor()
+                esperar(':', f"after key {nombre}")
+                if nombre == clave:
+                    break
+                # Los demás valores se decodifican y se descartan
+                valor()
+                if siguiente() == ',':
+                    estado['pos'] += 1
+        esperar('[', 'at the start of the array' if clave is None else f"after key {clave}")
+        if siguiente() == ']':
+            return
+        while True:
+            yield valor()
+            caracter = siguiente()
+            estado['pos'] += 1
+            if caracter == ']':
+                return
+            if caracter != ',':
+                raise ValueError(f"Expected ',' or ']' between elements in {ruta}")
@@ -0,0 +1,282 @@
+# Métricas por etapa: tiempo de pared, tiempo de CPU (del proceso y de sus
+# hijos ya terminados, como los pools de --pbz2 y --workers), RSS máximo del
+# proceso durante la etapa y tweets y bytes procesados. Las etapas que se
+# repiten (por ejemplo una vez por archivo) se acumulan. Con MPI cada proceso
+# mide las suyas y el tiempo de cada operación de comunicación.
+import cProfile
+import json
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+PERFILADORES = ('cprofile', 'pyinstrument')
+DIRECTORIO_PERFILES = 'perfiles'
+OPERACIONES_MPI = ('bcast', 'scatter', 'gather', 'allgather', 'reduce', 'allreduce', 'send', 'recv', 'Barrier')
+
+_estado = {
+    'etapas': {},
+    'mpi': {},
+    'perfilador': None,
+    'perfiles': {},
+    'sufijo': '',
+    'profundidad': 0,
+    # Pico de RSS (MB) de cada etapa abierta, de la más externa a la actual;
+    # None si no se puede medir
+    'picos': [],
+}
+
+
+def activar_perfiles(perfilador='cprofile', sufijo=''):
+    # Con --profile cada etapa de primer nivel se perfila por separado;
+    # `sufijo` distingue los archivos de cada proceso MPI
+    if perfilador not in PERFILADORES:
+        raise ValueError(f"Unknown profiler: {perfilador} (expected one of {', '.join(PERFILADORES)})")
+    if perfilador == 'pyinstrument' and pyinstrument is None:
+        raise ValueError("Profiler pyinstrument is not installed")
+    _estado['perfilador'] = perfilador
+    _estado['sufijo'] = sufijo
+
+
+def _pico_rss_mb():
+    # VmHWM: el RSS máximo desde que arrancó el proceso o desde el último
+    # reinicio. Solo existe en Linux.
+    try:
+        with open('/proc/self/status') as archivo:
+            for linea in archivo:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reiniciar_pico_rss():
+    # Escribir 5 en clear_refs lleva VmHWM al RSS actual (Linux 4.0 o posterior)
+    try:
+        with open('/proc/self/clear_refs', 'w') as archivo:
+            archivo.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _abrir_pico():
+    # ru_maxrss nunca baja, así que cada etapa reinicia VmHWM. Antes se anota
+    # en las etapas abiertas el pico que alcanzaron hasta ahora.
+    pico = _pico_rss_mb()
+    if pico is None or not _reiniciar_pico_rss():
+        _estado['picos'].append(None)
+        return
+    _estado['picos'] = [max(valor, pico) if valor is not None else None for valor in _estado['picos']]
+    _estado['picos'].append(_pico_rss_mb())
+
+
+def _cerrar_pico():
+    # Pico de la etapa que termina. Las etapas que la contienen lo ven al
+    # leer VmHWM, que no se reinicia aquí.
+    pico = _estado['picos'].pop()
+    if pico is None:
+        return None
+    return max(pico, _pico_rss_mb())
+
+
+def _cpu_hijos():
+    if resource is None:
+        return 0.0
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+
+def _registro(nombre):
+    if nombre not in _estado['etapas']:
+        # El CPU y el RSS quedan en None en las partes medidas con sumar
+        _estado['etapas'][nombre] = {'llamadas': 0, 'pared': 0.0, 'cpu': None, 'cpu_hijos': None,
+                                     'rss_max_mb': None, 'tweets': 0, 'bytes': 0}
+    return _estado['etapas'][nombre]
+
+
+def _perfil(nombre):
+    if nombre not in _estado['perfiles']:
+        if _estado['perfilador'] == 'pyinstrument':
+            _estado['perfiles'][nombre] = pyinstrument.Profiler()
+        else:
+            _estado['perfiles'][nombre] = cProfile.Profile()
+    return _estado['perfiles'][nombre]
+
+
+@contextmanager
+def etapa(nombre):
+    # Mide el bloque. Entrega el registro de la etapa para que el bloque sume
+    # registro['tweets'] y registro['bytes'].
+    registro = _registro(nombre)
+    perfil = None
+    if _estado['perfilador'] and _estado['profundidad'] == 0:
+        # Solo un perfilador puede estar activo a la vez
+        perfil = _perfil(nombre)
+        if _estado['perfilador'] == 'pyinstrument':
+            perfil.start()
+        else:
+            perfil.enable()
+    _estado['profundidad'] += 1
+    _abrir_pico()
+    inicio_pared = time.perf_counter()
+    inicio_cpu = time.process_time()
+    inicio_hijos = _cpu_hijos()
+    try:
+        yield registro
+    finally:
+        registro['pared'] += time.perf_counter() - inicio_pared
+        registro['cpu'] = (registro['cpu'] or 0.0) + time.process_time() - inicio_cpu
+        registro['cpu_hijos'] = (registro['cpu_hijos'] or 0.0) + _cpu_hijos() - inicio_hijos
+        pico = _cerrar_pico()
+        if pico is not None:
+            registro['rss_max_mb'] = max(registro['rss_max_mb'] or 0, pico)
+        registro['llamadas'] += 1
+        _estado['profundidad'] -= 1
+        if perfil is not None and _estado['perfilador'] == 'pyinstrument':
+            perfil.stop()
+        elif perfil is not None:
+            perfil.disable()
+
+
+def sumar(nombre, segundos, tweets=0, tamano=0):
+    # Para partes medidas dentro de un bucle, como la descompresión y el
+    # parseo de cada lote de líneas
+    registro = _registro(nombre)
+    registro['pared'] += segundos
+    registro['tweets'] += tweets
+    registro['bytes'] += tamano
+    registro['llamadas'] += 1
+
+
+def _sumar_mpi(operacion, segundos):
+    registro = _estado['mpi'].setdefault(operacion, {'llamadas': 0, 'segundos': 0.0})
+    registro['llamadas'] += 1
+    registro['segundos'] += segundos
+
+
+class ComunicadorMedido:
+    # Envuelve un comunicador de mpi4py y mide el tiempo de cada operación de
+    # OPERACIONES_MPI (incluida la espera a los demás procesos)
+    def __init__(self, comm):
+        self._comm = comm
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._comm, nombre)
+        if nombre not in OPERACIONES_MPI:
+            return atributo
+
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return atributo(*args, **kwargs)
+            finally:
+                _sumar_mpi(nombre, time.perf_counter() - inicio)
+        return medida
+
+
+def _con_tasas(registro):
+    registro = dict(registro)
+    pared = registro.get('pared', 0.0)
+    registro['tweets_por_segundo'] = registro['tweets'] / pared if pared and registro['tweets'] else None
+    registro['mb_por_segundo'] = registro['bytes'] / 1e6 / pared if pared and registro['bytes'] else None
+    return registro
+
+
+def metricas():
+    # Métricas del proceso actual, con las tasas ya calculadas
+    return {
+        'etapas': {nombre: _con_tasas(registro) for nombre, registro in _estado['etapas'].items()},
+        'mpi': {operacion: dict(registro) for operacion, registro in _estado['mpi'].items()},
+    }
+
+
+def combinar_ranks(por_rank):
+    # Totales de todos los procesos: el tiempo de pared es el del más lento y
+    # el resto se suma (el RSS es el máximo de un proceso)
+    etapas = {}
+    for datos in por_rank:
+        for nombre, registro in datos['etapas'].items():
+            total = etapas.setdefault(nombre, {'llamadas': 0, 'pared': 0.0, 'cpu': None, 'cpu_hijos': None,
+                                               'rss_max_mb': None, 'tweets': 0, 'bytes': 0})
+            total['pared'] = max(total['pared'], registro['pared'])
+            for campo in ('llamadas', 'tweets', 'bytes'):
+                total[campo] += registro[campo]
+            for campo in ('cpu', 'cpu_hijos'):
+                if registro[campo] is not None:
+                    total[campo] = (total[campo] or 0.0) + registro[campo]
+            if registro['rss_max_mb'] is not None:
+                total['rss_max_mb'] = max(total['rss_max_mb'] or 0, registro['rss_max_mb'])
+    return {nombre: _con_tasas(registro) for nombre, registro in etapas.items()}
+
+
+def _columna(valor, formato, ancho):
+    # '-' cuando el valor no se midió (el CPU y el RSS de las partes medidas
+    # con sumar, o el RSS fuera de Linux) o no corresponde (tasas sin tweets
+    # o sin bytes)
+    return f"{'-' if valor is None else format(valor, formato):>{ancho}}"
+
+
+def _fila(nombre, registro):
+    return ' '.join([
+        f"{nombre:<22}",
+        _columna(registro['pared'], '.3f', 9),
+        _columna(registro['cpu'] + registro['cpu_hijos'] if registro['cpu'] is not None else None, '.3f', 9),
+        _columna(registro['rss_max_mb'], '.1f', 9),
+        _columna(registro['tweets'] or None, 'd', 11),
+        _columna(registro['bytes'] / 1e6 if registro['bytes'] else None, '.1f', 9),
+        _columna(registro['tweets_por_segundo'], '.0f', 11),
+        _columna(registro['mb_por_segundo'], '.1f', 8),
+    ])
+
+
+def mostrar_metricas(por_rank):
+    # Tabla por etapa y, con varios procesos, el detalle de cada uno y el
+    # tiempo en las operaciones MPI
+    print(f"{'Stage':<22} {'wall s':>9} {'cpu s':>9} {'peak MB':>9} {'tweets':>11} {'MB':>9} {'tweets/s':>11} {'MB/s':>8}")
+    totales = combinar_ranks(por_rank)
+    for nombre, registro in totales.items():
+        print(_fila(nombre, registro))
+        if len(por_rank) > 1:
+            for rank, datos in enumerate(por_rank):
+                if nombre in datos['etapas']:
+                    print(_fila(f"  rank {rank}", datos['etapas'][nombre]))
+    if len(por_rank) > 1:
+        for rank, datos in enumerate(por_rank):
+            operaciones = ', '.join(f"{operacion} {registro['segundos']:.3f} s ({registro['llamadas']})"
+                                    for operacion, registro in sorted(datos['mpi'].items()))
+            print(f"Rank {rank} MPI: {operaciones or 'none'}")
+
+
+def guardar_metricas(ruta, por_rank, **contexto):
+    # Archivo JSON con el contexto de la corrida, los totales y el detalle por proceso
+    datos = dict(contexto)
+    datos['etapas'] = combinar_ranks(por_rank)
+    datos['por_rank'] = por_rank
+    with open(ruta, 'w') as archivo:
+        json.dump(datos, archivo, indent=2)
+
+
+def guardar_perfiles():
+    # Un archivo por etapa en DIRECTORIO_PERFILES: .prof (pstats, para
+    # snakeviz o python -m pstats) con cProfile y .html con pyinstrument
+    if not _estado['perfiles']:
+        return
+    os.makedirs(DIRECTORIO_PERFILES, exist_ok=True)
+    for nombre, perfil in _estado['perfiles'].items():
+        base = os.path.join(DIRECTORIO_PERFILES, f"{nombre}{_estado['sufijo']}")
+        if _estado['perfilador'] == 'pyinstrument':
+            with open(base + '.html', 'w') as archivo:
+                archivo.write(perfil.output_html())
+        else:
+            perfil.dump_stats(base + '.prof')
@@ -0,0 +1,151 @@
+import bz2
+import json
+import os
+import random
+import sys
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate
+from twitter_data_utils import parsear_opciones
+
+# Generador determinista de archivos horarios .json.bz2 con tweets
+# sintéticos, con la misma forma que los del dataset original
+# (aaaa-mm-dd-hh.json.bz2). Cada archivo depende solo de la semilla y de su
+# número, así se puede regenerar cualquiera por separado. La popularidad de
+# los usuarios (a quién se retuitea y a quién se menciona) sigue una ley de
+# Zipf; quien publica sale de forma uniforme.
+#
+# python twitter_data_sintetico.py -o <directorio> [-a 24] [-t 10000]
+#     [--hashtags 0.3] [--retweets 0.4] [--menciones 0.3] [-u 100000] [-s 1.1]
+#     [--semilla 0] [--inicio 2016-06-01]
+
+PARAMETROS_POR_DEFECTO = {
+    'archivos': 24,             # archivos horarios
+    'tweets': 10000,            # tweets por archivo
+    'hashtags': 0.3,            # fracción de tweets con algún hashtag buscado
+    'retweets': 0.4,            # fracción de retweets
+    'menciones': 0.3,           # fracción de tweets con menciones (sin contar retweets)
+    'usuarios': 100000,
+    'sesgo': 1.1,               # exponente de la ley de Zipf de popularidad
+    'semilla': 0,
+    'inicio': '2016-06-01',
+}
+
+HASHTAGS_BUSCADOS = ['eleccion', 'debate', 'votacion', 'candidato', 'encuesta']
+HASHTAGS_OTROS = ['futbol', 'musica', 'clima', 'viernes', 'noticias', 'cine', 'tecnologia', 'viajes']
+PALABRAS = ['hoy', 'gran', 'noticia', 'para', 'todos', 'mañana', 'país', 'gente', 'nuevo', 'ver',
+            'ahora', 'mejor', 'año', 'vida', 'siempre', 'más', 'nunca', 'semana', 'ciudad', 'voto']
+
+
+def _pesos_acumulados(usuarios, sesgo):
+    return list(accumulate(1 / (rango + 1) ** sesgo for rango in range(usuarios)))
+
+
+def _popular(generador, acumulados):
+    # Usuario según la ley de Zipf (búsqueda binaria sobre los pesos acumulados)
+    return bisect(acumulados, generador.random() * acumulados[-1])
+
+
+def _usuario(numero):
+    return {
+        'id': numero + 1,
+        'name': f"User {numero}",
+        'screen_name': f"user{numero}",
+        'location': None,
+        'url': None,
+        'description': None,
+    }
+
+
+def generar_tweets(numero_archivo, parametros, acumulados=None):
+    # Tweets (diccionarios) del archivo `numero_archivo`
+    p = {**PARAMETROS_POR_DEFECTO, **parametros}
+    if acumulados is None:
+        acumulados = _pesos_acumulados(p['usuarios'], p['sesgo'])
+    generador = random.Random(f"{p['semilla']}-{numero_archivo}")
+    hora = datetime.strptime(p['inicio'], '%Y-%m-%d') + timedelta(hours=numero_archivo)
+    for numero in range(p['tweets']):
+        autor = generador.randrange(p['usuarios'])
+        instante = hora + timedelta(seconds=generador.randrange(3600))
+        id_str = str((numero_archivo * p['tweets'] + numero) * 10 + 7)
+        palabras = ' '.join(generador.choices(PALABRAS, k=generador.randint(3, 10)))
+        hashtags = [generador.choice(HASHTAGS_BUSCADOS if generador.random() < p['hashtags'] else HASHTAGS_OTROS)]
+        if generador.random() < 0.2:
+            hashtags.append(generador.choice(HASHTAGS_OTROS))
+        menciones = []
+        tweet = {
+            'created_at': instante.strftime('%a %b %d %H:%M:%S +0000 %Y'),
+            'id_str': id_str,
+            'user': _usuario(autor),
+            'place': None,
+        }
+        if generador.random() < p['retweets']:
+            # Retweet de uno de los 20 tweets del usuario retuiteado
+            retuiteado = _popular(generador, acumulados)
+            original = str(retuiteado * 20 + generador.randrange(20))
+            menciones.append(retuiteado)
+            tweet['text'] = f"RT @user{retuiteado}: {palabras} " + ' '.join('#' + h for h in hashtags)
+            tweet['retweeted_status'] = {'id_str': original}
+        else:
+            if generador.random() < p['menciones']:
+                menciones.extend(_popular(generador, acumulados) for _ in range(generador.randint(1, 3)))
+            tweet['text'] = ' '.join([f"@user{m}" for m in menciones] + [palabras] + ['#' + h for h in hashtags])
+        tweet['entities'] = {
+            'hashtags': [{'text': h, 'indices': [0, 0]} for h in hashtags],
+            'urls': [],
+            'user_mentions': [{'id': m + 1, 'name': f"User {m}", 'screen_name': f"user{m}"} for m in menciones],
+        }
+        yield tweet
+
+
+def nombre_archivo(numero_archivo, parametros):
+    p = {**PARAMETROS_POR_DEFECTO, **parametros}
+    hora = datetime.strptime(p['inicio'], '%Y-%m-%d') + timedelta(hours=numero_archivo)
+    return hora.strftime('%Y-%m-%d-%H.json.bz2')
+
+
+def generar_archivos(directorio, parametros=None):
+    # Escribe los archivos y hashtags.txt (los hashtags buscados) en
+    # `directorio`; devuelve la ruta de hashtags.txt
+    p = {**PARAMETROS_POR_DEFECTO, **(parametros or {})}
+    os.makedirs(directorio, exist_ok=True)
+    acumulados = _pesos_acumulados(p['usuarios'], p['sesgo'])
+    for numero_archivo in range(p['archivos']):
+        ruta = os.path.join(directorio, nombre_archivo(numero_archivo, p))
+        with bz2.open(ruta, 'wb') as salida:
+            for tweet in generar_tweets(numero_archivo, p, acumulados):
+                salida.write(json.dumps(tweet, ensure_ascii=False).encode('utf-8') + b'\n')
+    ruta_hashtags = os.path.join(directorio, 'hashtags.txt')
+    with open(ruta_hashtags, 'w') as archivo:
+        archivo.write('\n'.join(HASHTAGS_BUSCADOS) + '\n')
+    return ruta_hashtags
+
+
+def main(argv):
+    directorio = ''
+    parametros = {}
+    for opt, arg in parsear_opciones(argv):
+        if opt == '-o':
+            directorio = arg
+        if opt == '-a':
+            parametros['archivos'] = int(arg)
+        if opt == '-t':
+            parametros['tweets'] = int(arg)
+        if opt == '-u':
+            parametros['usuarios'] = int(arg)
+        if opt == '-s':
+            parametros['sesgo'] = float(arg)
+        if opt in ('--hashtags', '--retweets', '--menciones'):
+            parametros[opt[2:]] = float(arg)
+        if opt == '--semilla':
+            parametros['semilla'] = int(arg)
+        if opt == '--inicio':
+            parametros['inicio'] = arg
+    if not directorio:
+        raise ValueError("An output directory is required (-o)")
+    generar_archivos(directorio, parametros)
+    print(f"Generated {parametros.get('archivos', PARAMETROS_POR_DEFECTO['archivos'])} files in {directorio}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,144 @@
+import itertools
+import re
+from datetime import datetime
+
+
+def leer_lineas(archivo_comprimido):
+    # Generador que entrega una línea (en bytes) a la vez del archivo ya abierto,
+    # así la memoria usada no depende del tamaño del archivo descomprimido
+    for linea in archivo_comprimido:
+        linea = linea.strip()
+        if linea:
+            yield linea
+
+
+# Fechas ya convertidas, por "Mon DD" + año (hay pocas distintas por corrida)
+_fechas_created_at = {}
+
+
+def fecha_created_at(fecha_tweet_str):
+    # created_at siempre tiene la forma "Wed Jun 01 10:23:45 +0000 2016" y solo
+    # se usa la fecha, así que strptime se llama una vez por día distinto
+    if len(fecha_tweet_str) != 30 or fecha_tweet_str[19:26] != ' +0000 ':
+        return datetime.strptime(fecha_tweet_str, "%a %b %d %H:%M:%S +0000 %Y").date()
+    clave = fecha_tweet_str[4:10] + fecha_tweet_str[26:]
+    fecha = _fechas_created_at.get(clave)
+    if fecha is None:
+        fecha = datetime.strptime(fecha_tweet_str, "%a %b %d %H:%M:%S +0000 %Y").date()
+        _fechas_created_at[clave] = fecha
+    return fecha
+
+
+def parsear_opciones(argv):
+    # Devuelve la lista de (opción, valor). Las opciones "-x" necesitan un valor;
+    # las opciones "--x" son banderas, aunque también aceptan un valor opcional
+    opts = []
+    i = 0
+    while i < len(argv):
+        argumento = argv[i]
+        valor = argv[i + 1] if i + 1 < len(argv) else ''
+        if argumento.startswith('-') and valor and not valor.startswith('-'):
+            opts.append((argumento, valor))
+            i += 2
+            continue
+        if argumento.startswith('--'):
+            opts.append((argumento, ''))
+        i += 1
+    return opts
+
+
+# Todos los caracteres (salvo 'İ', que da dos) y su versión en minúsculas,
+# alineados posición a posición (solo se calcula si hace falta)
+_tabla_minusculas = None
+
+
+def _variantes_caracter(caracter):
+    # Todos los caracteres que al pasar a minúsculas quedan como `caracter`
+    global _tabla_minusculas
+    if caracter.isascii():
+        variantes = {caracter, caracter.upper()}
+        if caracter == 'k':
+            variantes.add('\u212a')  # Signo Kelvin
+        return {v for v in variantes if v.lower() == caracter}
+    if _tabla_minusculas is None:
+        originales = ''.join(map(chr, itertools.chain(range(0x130), range(0x131, 0x110000))))
+        _tabla_minusculas = (originales, originales.lower())
+    originales, minusculas = _tabla_minusculas
+    variantes = set()
+    indice = minusculas.find(caracter)
+    while indice != -1:
+        variantes.add(originales[indice])
+        indice = minusculas.find(caracter, indice + 1)
+    return variantes
+
+
+def _escapes_json(letra):
+    # Formas en que `letra` puede aparecer dentro de un string JSON crudo
+    formas = [re.escape(letra.encode('utf-8'))]
+    codigo = ord(letra)
+    if codigo > 0xFFFF:
+        codigo -= 0x10000
+        unidades = [0xD800 + (codigo >> 10), 0xDC00 + (codigo & 0x3FF)]
+    else:
+        unidades = [codigo]
+    escape = b''
+    for unidad in unidades:
+        escape += b'\\\\u' + b''.join(b'[' + bytes({d, ord(chr(d).upper())}) + b']' for d in b'%04x' % unidad)
+    formas.append(escape)
+    if letra in '"\\/':
+        formas.append(re.escape(b'\\' + letra.encode('ascii')))
+    return formas
+
+
+def compilar_prefiltro(hashtags_a_buscar):
+    # Expresión regular sobre los bytes crudos de cada línea que descarta los
+    # tweets que no pueden tener ninguno de los hashtags buscados, sin hacer
+    # json.loads. Es conservadora: cubre mayúsculas y escapes JSON, y los
+    # tweets que pasan se siguen revisando igual que antes.
+    if not hashtags_a_buscar:
+        return None
+    alternativas = []
+    for hashtag in set(hashtags_a_buscar):
+        if '\u0307' in hashtag:
+            # 'İ'.lower() da dos caracteres; no se intenta prefiltrar
+            return None
+        partes = []
+        for caracter in hashtag:
+            formas = []
+            for variante in sorted(_variantes_caracter(caracter)):
+                formas.extend(_escapes_json(variante))
+            if not formas:
+                break
+            partes.append(b'(?:' + b'|'.join(formas) + b')')
+        else:
+            alternativas.append(b''.join(partes))
+    if not alternativas:
+        return re.compile(b'(?!)')
+    return re.compile(b'"text"\\s*:\\s*"(?:' + b'|'.join(alternativas) + b')"')
+
+
+# Etiqueta MPI de la primera ronda de reducir_en_arbol; cada ronda usa la
+# siguiente. Las demás etiquetas punto a punto (como las del planificador de
+# --dinamico) tienen que quedar por debajo para no confundirse con estas.
+TAG_REDUCCION = 1000
+
+
+def reducir_en_arbol(comm, valor, combinar, etiqueta=TAG_REDUCCION):
+    # Reducción en árbol binomial: en cada ronda la mitad de los procesos
+    # envía su valor a un compañero de rank menor, que hace
+    # combinar(propio, recibido). Así el proceso 0 termina con los valores
+    # combinados en orden de rank, aunque `combinar` no sea conmutativa.
+    # Los demás procesos devuelven None.
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    paso = 1
+    ronda = 0
+    while paso < size:
+        if rank % (2 * paso) == paso:
+            comm.send(valor, dest=rank - paso, tag=etiqueta + ronda)
+            return None
+        if rank % (2 * paso) == 0 and rank + paso < size:
+            valor = combinar(valor, comm.recv(source=rank + paso, tag=etiqueta + ronda))
+        paso *= 2
+        ronda += 1
+    return valor